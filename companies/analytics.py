@@ -0,0 +1,434 @@
+import math
+from collections import Counter, defaultdict, namedtuple
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from companies.cache import get_names
+from companies.models import Profession, Company, Employee, EmployeeSummary
+
+# what a summary needs to know about one employee
+EmployeeFacts = namedtuple(
+    "EmployeeFacts", ("company_id", "profession_id", "gender", "salary", "age")
+)
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90, 99)
+
+
+def employee_facts(employee):
+    """
+	Return facts of an employee instance or None if some of them are deferred
+	"""
+
+    # __dict__ is used so that deferred fields are not loaded
+    values = [employee.__dict__.get(field) for field in EmployeeFacts._fields]
+    if None in values:
+        return None
+    return EmployeeFacts(*values)
+
+
+class SalarySketch:
+    """
+	Mergeable histogram of salaries with logarithmic buckets
+
+	A bucket spans values within relative_accuracy of its representative
+	value, so percentiles are off by at most that ratio. Sketches of groups
+	merge and unmerge by adding and subtracting counts of buckets, which makes
+	removal of employees exact. Buckets are stored as {str(index): count}.
+	"""
+
+    relative_accuracy = 0.01
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+    def __init__(self, buckets=None):
+        self.buckets = Counter(buckets or {})
+
+    @classmethod
+    def index(cls, value):
+        # bucket 0 is for zero, bucket i > 0 spans (gamma^(i-2), gamma^(i-1)]
+        if value <= 0:
+            return 0
+        return math.ceil(math.log(value, cls.gamma)) + 1
+
+    @classmethod
+    def bounds(cls, index):
+        """
+		Return lowest and highest integer which can fall into the bucket
+		"""
+
+        if index == 0:
+            return 0, 0
+        return (
+            math.floor(cls.gamma ** (index - 2)),
+            math.ceil(cls.gamma ** (index - 1)),
+        )
+
+    @classmethod
+    def estimate(cls, index):
+        if index == 0:
+            return 0
+        return 2 * cls.gamma ** (index - 1) / (cls.gamma + 1)
+
+    def add(self, value, count=1):
+        key = str(self.index(value))
+        self.buckets[key] += count
+        if self.buckets[key] <= 0:
+            del self.buckets[key]
+
+    def merge(self, other, sign=1):
+        for key, count in other.buckets.items():
+            self.buckets[key] += sign * count
+            if self.buckets[key] <= 0:
+                del self.buckets[key]
+
+    def sorted_buckets(self):
+        return sorted((int(key), count) for key, count in self.buckets.items())
+
+    def percentile(self, percent, low=None, high=None):
+        """
+		Estimate the value below which percent of salaries fall, clamped to the
+		known minimum and maximum
+		"""
+
+        buckets = self.sorted_buckets()
+        total = sum(count for _, count in buckets)
+        if not total:
+            return None
+
+        rank = percent / 100 * (total - 1)
+        seen = 0
+        for index, count in buckets:
+            seen += count
+            if seen > rank:
+                break
+        value = self.estimate(index)
+        if low is not None:
+            value = max(value, low)
+        if high is not None:
+            value = min(value, high)
+        return round(value, 2)
+
+    def to_json(self):
+        return dict(self.buckets)
+
+
+def merge_counts(counts, other, sign=1):
+    counts = Counter(counts)
+    for key, count in other.items():
+        counts[key] += sign * count
+        if counts[key] <= 0:
+            del counts[key]
+    return dict(counts)
+
+
+def group_keys(facts, countries):
+    """
+	Return (dimension, key) of every summary the employee is counted in
+	"""
+
+    # totals of all employees are merged from gender groups when read, so
+    # that every write does not lock one row
+    return (
+        (EmployeeSummary.PROFESSION, str(facts.profession_id)),
+        (EmployeeSummary.COMPANY, str(facts.company_id)),
+        (EmployeeSummary.COUNTRY, countries.get(facts.company_id, "")),
+        (EmployeeSummary.GENDER, facts.gender),
+    )
+
+
+def group_filter(dimension, key):
+    return {
+        EmployeeSummary.ALL: {},
+        EmployeeSummary.PROFESSION: {"profession_id": key},
+        EmployeeSummary.COMPANY: {"company_id": key},
+        EmployeeSummary.COUNTRY: {"company__country": key},
+        EmployeeSummary.GENDER: {"gender": key},
+    }[dimension]
+
+
+def lock_summaries(keys, create=False):
+    """
+	Return {(dimension, key): summary} of rows locked for update, with create
+	missing rows are inserted empty first, so every key has one
+	"""
+
+    keys = set(keys)
+    if not keys:
+        return {}
+    condition = reduce(
+        or_, (Q(dimension=dimension, key=key) for dimension, key in keys)
+    )
+    # rows are locked in one order, so concurrent writes do not deadlock
+    rows = (
+        EmployeeSummary.objects.select_for_update()
+        .filter(condition)
+        .order_by("dimension", "key")
+    )
+    summaries = {(summary.dimension, summary.key): summary for summary in rows}
+    while create and len(summaries) < len(keys):
+        # of concurrent inserts of a group one row is kept and locked by all,
+        # a row emptied and deleted in between is inserted again
+        EmployeeSummary.objects.bulk_create(
+            [
+                EmployeeSummary(dimension=dimension, key=key)
+                for dimension, key in keys - summaries.keys()
+            ],
+            ignore_conflicts=True,
+        )
+        summaries = {
+            (summary.dimension, summary.key): summary for summary in rows.all()
+        }
+    return summaries
+
+
+def refresh_extremes(summary):
+    """
+	Find exact minimum and maximum after the employee holding one was removed
+
+	Only employees of the group within the lowest and highest bucket of the
+	sketch are read, which the salary indexes narrow down.
+	"""
+
+    buckets = SalarySketch(summary.salary_sketch).sorted_buckets()
+    if not buckets:
+        summary.salary_min = summary.salary_max = None
+        return
+
+    employees = Employee.objects.filter(**group_filter(summary.dimension, summary.key))
+    low, _ = SalarySketch.bounds(buckets[0][0])
+    _, high = SalarySketch.bounds(buckets[-1][0])
+    summary.salary_min = employees.filter(salary__lte=high).aggregate(
+        value=Min("salary")
+    )["value"]
+    summary.salary_max = employees.filter(salary__gte=low).aggregate(
+        value=Max("salary")
+    )["value"]
+
+
+def apply_change(summary, facts, sign):
+    """
+	Add (sign 1) or remove (sign -1) an employee, return whether the stored
+	minimum or maximum may be gone
+	"""
+
+    summary.headcount += sign
+    summary.salary_sum += sign * facts.salary
+    sketch = SalarySketch(summary.salary_sketch)
+    sketch.add(facts.salary, sign)
+    summary.salary_sketch = sketch.to_json()
+    summary.ages = merge_counts(summary.ages, {str(facts.age): 1}, sign)
+
+    if sign > 0:
+        summary.salary_min = min(
+            facts.salary,
+            facts.salary if summary.salary_min is None else summary.salary_min,
+        )
+        summary.salary_max = max(facts.salary, summary.salary_max or 0)
+        return False
+    return facts.salary in (summary.salary_min, summary.salary_max)
+
+
+def save_summaries(summaries):
+    """
+	Save rows of lock_summaries, rows of groups left empty are deleted
+	"""
+
+    updated, empty = [], []
+    for summary in summaries:
+        if summary.headcount <= 0:
+            empty.append(summary.pk)
+        else:
+            updated.append(summary)
+
+    EmployeeSummary.objects.bulk_update(
+        updated,
+        (
+            "headcount",
+            "salary_sum",
+            "salary_min",
+            "salary_max",
+            "salary_sketch",
+            "ages",
+        ),
+    )
+    EmployeeSummary.objects.filter(pk__in=empty).delete()
+
+
+def change_summaries(removed=(), added=()):
+    """
+	Move facts of employees out of and into the summaries of their groups
+
+	Must be called after the rows of employees were written, so that a lost
+	minimum or maximum can be read from the table.
+	"""
+
+    changes = [(facts, -1) for facts in removed if facts] + [
+        (facts, 1) for facts in added if facts
+    ]
+    if not changes:
+        return
+
+    countries = dict(
+        Company.objects.filter(
+            pk__in={facts.company_id for facts, _ in changes}
+        ).values_list("pk", "country")
+    )
+    grouped = defaultdict(list)
+    for facts, sign in changes:
+        for group in group_keys(facts, countries):
+            grouped[group].append((facts, sign))
+
+    with transaction.atomic():
+        summaries = lock_summaries(grouped, create=True)
+        for group, group_changes in grouped.items():
+            summary = summaries[group]
+            stale = False
+            for facts, sign in group_changes:
+                stale = apply_change(summary, facts, sign) or stale
+            if stale:
+                refresh_extremes(summary)
+        save_summaries(summaries.values())
+
+
+def move_company(company_id, old_country, new_country):
+    """
+	Move summary of a company's employees from one country to another
+	"""
+
+    with transaction.atomic():
+        company = lock_summaries([(EmployeeSummary.COMPANY, str(company_id))]).get(
+            (EmployeeSummary.COMPANY, str(company_id))
+        )
+        if company is None:
+            return
+
+        countries = lock_summaries(
+            [
+                (EmployeeSummary.COUNTRY, old_country),
+                (EmployeeSummary.COUNTRY, new_country),
+            ],
+            create=True,
+        )
+        for country, sign in ((old_country, -1), (new_country, 1)):
+            summary = countries[(EmployeeSummary.COUNTRY, country)]
+            summary.headcount += sign * company.headcount
+            summary.salary_sum += sign * company.salary_sum
+            sketch = SalarySketch(summary.salary_sketch)
+            sketch.merge(SalarySketch(company.salary_sketch), sign)
+            summary.salary_sketch = sketch.to_json()
+            summary.ages = merge_counts(summary.ages, company.ages, sign)
+            refresh_extremes(summary)
+        save_summaries(countries.values())
+
+
+def rebuild_summaries():
+    """
+	Recompute every summary from the employee table, return number of groups
+	"""
+
+    summaries = {}
+    rows = Employee.objects.order_by().values_list(
+        *EmployeeFacts._fields, "company__country"
+    )
+    for *values, country in rows.iterator(chunk_size=2000):
+        facts = EmployeeFacts(*values)
+        for dimension, key in group_keys(facts, {facts.company_id: country}):
+            summary = summaries.setdefault(
+                (dimension, key), EmployeeSummary(dimension=dimension, key=key)
+            )
+            apply_change(summary, facts, 1)
+
+    with transaction.atomic():
+        EmployeeSummary.objects.all().delete()
+        EmployeeSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+    return len(summaries)
+
+
+def represent_summary(summary, percentiles=DEFAULT_PERCENTILES):
+    sketch = SalarySketch(summary.salary_sketch)
+    return {
+        "headcount": summary.headcount,
+        "salary": {
+            "min": summary.salary_min,
+            "max": summary.salary_max,
+            "mean": round(summary.salary_sum / summary.headcount, 2),
+            "percentiles": {
+                f"{percent:g}": sketch.percentile(
+                    percent, summary.salary_min, summary.salary_max
+                )
+                for percent in percentiles
+            },
+        },
+        # number of employees of every age
+        "age": {
+            age: count
+            for age, count in sorted(
+                summary.ages.items(), key=lambda item: int(item[0])
+            )
+        },
+    }
+
+
+def group_names(dimension):
+    """
+	Return {key: name of group} for dimensions whose keys are primary keys
+	"""
+
+    model = {
+        EmployeeSummary.PROFESSION: Profession,
+        EmployeeSummary.COMPANY: Company,
+    }.get(dimension)
+    if model is None:
+        return {}
+    return {str(pk): name for name, pk in get_names(model).items()}
+
+
+def merge_summaries(summaries):
+    """
+	Return a summary of all employees of summaries of disjoint groups
+	"""
+
+    merged = EmployeeSummary(dimension=EmployeeSummary.ALL, key="")
+    sketch = SalarySketch()
+    for summary in summaries:
+        merged.headcount += summary.headcount
+        merged.salary_sum += summary.salary_sum
+        merged.salary_min = min(
+            summary.salary_min,
+            summary.salary_min if merged.salary_min is None else merged.salary_min,
+        )
+        merged.salary_max = max(merged.salary_max or 0, summary.salary_max)
+        sketch.merge(SalarySketch(summary.salary_sketch))
+        merged.ages = merge_counts(merged.ages, summary.ages)
+    merged.salary_sketch = sketch.to_json()
+    return merged
+
+
+def summarize(dimension, percentiles=DEFAULT_PERCENTILES):
+    """
+	Return representations of all groups of a dimension ordered by group
+
+	Only the summary rows of the dimension are read, one per group, the group
+	of all employees is merged from the rows of genders.
+	"""
+
+    if dimension == EmployeeSummary.ALL:
+        merged = merge_summaries(
+            EmployeeSummary.objects.filter(
+                dimension=EmployeeSummary.GENDER, headcount__gt=0
+            )
+        )
+        if not merged.headcount:
+            return []
+        return [{"group": "", **represent_summary(merged, percentiles)}]
+
+    names = group_names(dimension)
+    results = []
+    for summary in EmployeeSummary.objects.filter(dimension=dimension, headcount__gt=0):
+        results.append(
+            {
+                "group": names.get(summary.key, summary.key),
+                **represent_summary(summary, percentiles),
+            }
+        )
+    return sorted(results, key=lambda result: result["group"])
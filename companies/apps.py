@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class CompaniesConfig(AppConfig):
     name = "companies"
+
+    def ready(self):
+        # connect receivers which maintain denormalized counters
+        from companies import signals  # noqa: F401
+
+        # time queries of every connection for PerformanceMiddleware
+        from companies import instrumentation  # noqa: F401
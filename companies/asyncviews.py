@@ -0,0 +1,76 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+from django.utils.decorators import classonlymethod
+
+
+class AsyncViewSetMixin:
+    """
+	Serves chosen actions of the viewset as native async views for ASGI
+
+	Django runs sync views under ASGI one at a time on a single shared thread.
+	Async actions run each request on its own thread of the pool instead, so
+	concurrent requests wait on the database in parallel while the event loop
+	keeps serving slow clients. Django 3.1 has no async ORM, so querysets,
+	filters and pagination still run synchronously inside that thread. Other
+	actions of a route keep running on the shared thread.
+	"""
+
+    async_actions = ("list", "retrieve")
+
+    @classonlymethod
+    def as_async_view(cls, actions, **initkwargs):
+        view = cls.as_view(actions, **initkwargs)
+
+        def handle(request, *args, **kwargs):
+            # connections belong to pool threads, which outlive requests
+            close_old_connections()
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, "render"):
+                    response.render()
+                return response
+            finally:
+                close_old_connections()
+
+        async def async_view(request, *args, **kwargs):
+            method = request.method.lower()
+            if method == "head":
+                method = "get"
+            action = actions.get(method)
+            return await sync_to_async(
+                handle, thread_sensitive=action not in cls.async_actions
+            )(request, *args, **kwargs)
+
+        async_view.cls = cls
+        async_view.initkwargs = view.initkwargs
+        async_view.actions = actions
+        async_view.csrf_exempt = True
+        return async_view
+
+
+def asynchronous_patterns(urlpatterns):
+    """
+	Return urlpatterns with routes of async actions pointing to async views
+	"""
+
+    patterns = []
+    for pattern in urlpatterns:
+        callback = getattr(pattern, "callback", None)
+        cls = getattr(callback, "cls", None)
+        actions = getattr(callback, "actions", None)
+        if (
+            isinstance(pattern, URLPattern)
+            and cls is not None
+            and issubclass(cls, AsyncViewSetMixin)
+            and actions
+            and set(actions.values()) & set(cls.async_actions)
+        ):
+            pattern = URLPattern(
+                pattern.pattern,
+                cls.as_async_view(actions, **callback.initkwargs),
+                pattern.default_args,
+                pattern.name,
+            )
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,332 @@
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
+from django.core.handlers.wsgi import WSGIHandler
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from companies.graph import PartnerGraph
+from companies.models import Employee, PartnerShip
+from companies.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from companies.serializers import FormattedDateTimeField
+from companies.values import get_columns, represent_rows
+from companies.views import (
+    ProfessionViewSet,
+    EmployeeViewSet,
+    CompanyViewSet,
+    PartnerShipView,
+)
+from crm.settings import DATETIME_FORMAT
+
+LIST_VIEWSETS = {
+    "profession": ProfessionViewSet,
+    "employee": EmployeeViewSet,
+    "company": CompanyViewSet,
+    "partnership": PartnerShipView,
+}
+
+# rows per second of the current implementation and of the one it replaces
+BenchmarkResult = namedtuple(
+    "BenchmarkResult", ("suite", "name", "rows", "baseline", "optimized")
+)
+
+
+def best_time(func, repeat):
+    """
+	Return the shortest of repeat wall clock durations of func in seconds
+	"""
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def rate(rows, seconds):
+    return rows / seconds if seconds else float("inf")
+
+
+def list_view(basename, path="/"):
+    """
+	Return viewset instance set up as for a GET of its list
+	"""
+
+    view = LIST_VIEWSETS[basename](
+        action_map={"get": "list"}, action="list", basename=basename
+    )
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    view.request = view.initialize_request(APIRequestFactory().get(path))
+    view.headers = {}
+    return view
+
+
+def benchmark_serialization(rows=2000, repeat=3):
+    """
+	Compare list serializers with rows read by values() for every list view
+	"""
+
+    results = []
+    for basename in LIST_VIEWSETS:
+        view = list_view(basename)
+        queryset = view.filter_queryset(view.get_queryset())
+        columns = get_columns(view.get_serializer(), view.values_lookups)
+        values = view.get_values_queryset(queryset, columns)
+        count = len(queryset[:rows])
+
+        def serialize():
+            return view.get_serializer(queryset[:rows], many=True).data
+
+        def represent():
+            return represent_rows(values[:rows], columns)
+
+        if [dict(row) for row in serialize()] != represent():
+            raise AssertionError(f"Outputs of {basename} list differ")
+
+        results.append(
+            BenchmarkResult(
+                "serialization",
+                basename,
+                count,
+                rate(count, best_time(serialize, repeat)),
+                rate(count, best_time(represent, repeat)),
+            )
+        )
+    return results
+
+
+def query_neighbourhood(node, hops, limit):
+    """
+	Find {company: distance} like PartnerGraph.neighbourhood with a query per hop
+	"""
+
+    distances = {node: 0}
+    frontier = {node}
+    for distance in range(1, hops + 1):
+        rows = (
+            PartnerShip.objects.order_by()
+            .filter(company__in=frontier)
+            .values_list("company_inviter_id", flat=True)
+            .union(
+                PartnerShip.objects.order_by()
+                .filter(company_inviter__in=frontier)
+                .values_list("company_id", flat=True)
+            )
+        )
+        frontier = set(rows) - distances.keys()
+        for partner in sorted(frontier)[: limit + 1 - len(distances)]:
+            distances[partner] = distance
+        if len(distances) > limit:
+            break
+    del distances[node]
+    return distances
+
+
+def benchmark_graph(rows=2000, repeat=3):
+    """
+	Compare neighbourhoods of best connected companies read from the snapshot
+	with a query per hop, rows are companies found
+	"""
+
+    graph = PartnerGraph.from_database()
+    starts = [pk for pk, _ in graph.degree_ranking(10)]
+    results = []
+    for hops in (1, 2, 3):
+        found = [graph.neighbourhood(start, hops, rows) for start in starts]
+        count = sum(len(distances) for distances in found)
+        for start, distances in zip(starts, found):
+            if len(distances) < rows and distances != query_neighbourhood(
+                start, hops, rows
+            ):
+                raise AssertionError(f"Neighbourhoods of {start} differ")
+
+        results.append(
+            BenchmarkResult(
+                "graph",
+                f"{hops} hops",
+                count,
+                rate(
+                    count,
+                    best_time(
+                        lambda: [query_neighbourhood(s, hops, rows) for s in starts],
+                        repeat,
+                    ),
+                ),
+                rate(
+                    count,
+                    best_time(
+                        lambda: [graph.neighbourhood(s, hops, rows) for s in starts],
+                        repeat,
+                    ),
+                ),
+            )
+        )
+    return results
+
+
+CONCURRENT_CLIENTS = 100
+CLIENT_DELAY = 0.1  # seconds a slow client takes to read a response
+WSGI_THREADS = 8  # worker threads of a sync server
+
+
+def benchmark_paths(count):
+    paths = [
+        f"/api/v1/{prefix}/"
+        for prefix in ("professions", "employees", "companies", "partnerships")
+    ]
+    return list(islice(cycle(paths), count))
+
+
+def serve_wsgi(paths):
+    """
+	Serve GETs of paths by a threaded WSGI server to slow clients
+	"""
+
+    handler = WSGIHandler()
+
+    def serve(path):
+        environ = {"PATH_INFO": path, "SERVER_NAME": "localhost"}
+        setup_testing_defaults(environ)
+        body = handler(environ, lambda status, headers, exc_info=None: None)
+        # the worker thread is held while the client reads
+        for _ in body:
+            time.sleep(CLIENT_DELAY)
+        body.close()
+
+    with ThreadPoolExecutor(WSGI_THREADS) as pool:
+        list(pool.map(serve, paths))
+
+
+def serve_asgi(paths):
+    """
+	Serve GETs of paths by the ASGI application to concurrent slow clients
+	"""
+
+    from crm.asgi import application
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            await asyncio.sleep(CLIENT_DELAY)
+
+    async def serve(path, clients):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "server": ("localhost", 80),
+        }
+        async with clients:
+            await application(scope, receive, send)
+
+    async def serve_all():
+        clients = asyncio.Semaphore(CONCURRENT_CLIENTS)
+        await asyncio.gather(*(serve(path, clients) for path in paths))
+
+    asyncio.run(serve_all())
+
+
+def benchmark_concurrency(rows=2000, repeat=3):
+    """
+	Compare a threaded WSGI server with async views under ASGI, rows are
+	requests of many concurrent clients which read responses slowly
+	"""
+
+    paths = benchmark_paths(max(rows // 10, 1))
+    # anonymous throttling would answer most requests with 429
+    with mock.patch.object(APIView, "throttle_classes", ()):
+        return [
+            BenchmarkResult(
+                "concurrency",
+                "lists",
+                len(paths),
+                rate(len(paths), best_time(lambda: serve_wsgi(paths), repeat)),
+                rate(len(paths), best_time(lambda: serve_asgi(paths), repeat)),
+            )
+        ]
+
+
+def benchmark_rendering(rows=2000, repeat=3):
+    """
+	Compare JSONRenderer with FastJSONRenderer, and with MessagePackRenderer
+	when msgpack is installed, on representations of every list view, and
+	formatting of dates by DateTimeField with FormattedDateTimeField
+	"""
+
+    results = []
+    baseline, optimized = JSONRenderer(), FastJSONRenderer()
+    for basename in LIST_VIEWSETS:
+        view = list_view(basename)
+        queryset = view.filter_queryset(view.get_queryset())[:rows]
+        data = view.get_serializer(queryset, many=True).data
+        if baseline.render(data) != optimized.render(data):
+            raise AssertionError(f"Rendered {basename} list differs")
+
+        results.append(
+            BenchmarkResult(
+                "rendering",
+                basename,
+                len(data),
+                rate(len(data), best_time(lambda: baseline.render(data), repeat)),
+                rate(len(data), best_time(lambda: optimized.render(data), repeat)),
+            )
+        )
+        if msgpack is not None:
+            packed = MessagePackRenderer()
+            results.append(
+                BenchmarkResult(
+                    "rendering",
+                    f"{basename} msgpack",
+                    len(data),
+                    rate(len(data), best_time(lambda: baseline.render(data), repeat)),
+                    rate(len(data), best_time(lambda: packed.render(data), repeat)),
+                )
+            )
+
+    dates = list(
+        Employee.objects.order_by("pk").values_list("promotion_date", flat=True)[:rows]
+    )
+
+    def format_dates(field_class):
+        field = field_class(format=DATETIME_FORMAT)
+        return [field.to_representation(value) for value in dates]
+
+    if format_dates(serializers.DateTimeField) != format_dates(FormattedDateTimeField):
+        raise AssertionError("Formatted dates differ")
+    results.append(
+        BenchmarkResult(
+            "rendering",
+            "dates",
+            len(dates),
+            rate(
+                len(dates),
+                best_time(lambda: format_dates(serializers.DateTimeField), repeat),
+            ),
+            rate(
+                len(dates),
+                best_time(lambda: format_dates(FormattedDateTimeField), repeat),
+            ),
+        )
+    )
+    return results
+
+
+SUITES = {
+    "serialization": benchmark_serialization,
+    "graph": benchmark_graph,
+    "concurrency": benchmark_concurrency,
+    "rendering": benchmark_rendering,
+}
@@ -0,0 +1,361 @@
+import json
+import math
+import os
+import statistics
+import time
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from unittest import mock
+from django.db import connection
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from companies import values
+from companies.cache import CachedResponseMixin
+from companies.generate import DataGenerator
+from companies.graph import snapshot as graph_snapshot
+from companies.models import Profession, Company, Employee, PartnerShip
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+METRICS = ("queries", "db_ms", "serialization_ms", "p50_ms", "p99_ms")
+
+# name of case: (url name, url kwargs, query parameters), strings in braces are
+# filled from facts about the seeded data, see seeded_context
+CASES = {
+    "api-root": ("api-root", {}, {}),
+    "profession-list": ("profession-list", {}, {}),
+    "profession-list-filtered": (
+        "profession-list",
+        {},
+        {"min_number_of_employees": "1", "search": "Profession", "ordering": "-name"},
+    ),
+    "profession-detail": ("profession-detail", {"pk": "{profession}"}, {}),
+    "profession-detail-embed": (
+        "profession-detail",
+        {"pk": "{profession}"},
+        {"embed": "employees"},
+    ),
+    "profession-employees": (
+        "profession-employees",
+        {"profession_pk": "{profession}"},
+        {},
+    ),
+    "employee-list": ("employee-list", {}, {}),
+    "employee-list-filtered": (
+        "employee-list",
+        {},
+        {"company_name": "{company_name}", "min_salary": "2000", "ordering": "-salary"},
+    ),
+    "employee-list-search": (
+        "employee-list",
+        {},
+        {"search": "Employee 1", "fields": "name,url"},
+    ),
+    "employee-list-expand": (
+        "employee-list",
+        {},
+        {"expand": "company,profession", "limit": "50"},
+    ),
+    "employee-list-keyset": (
+        "employee-list",
+        {},
+        {"cursor": "", "ordering": "salary", "limit": "50"},
+    ),
+    "employee-detail": ("employee-detail", {"pk": "{employee}"}, {}),
+    "employee-export": ("employee-export", {}, {"company_id": "{company}"}),
+    "employee-bulk": ("employee-bulk", {}, {}),  # posts bulk_body
+    "company-list": ("company-list", {}, {}),
+    "company-list-filtered": (
+        "company-list",
+        {},
+        {
+            "country": "{country}",
+            "min_number_of_employees": "1",
+            "ordering": "-year_of_foundation",
+        },
+    ),
+    "company-list-search": ("company-list", {}, {"search": "Company 1"}),
+    "company-list-text": ("company-list", {}, {"text": "logistics"}),
+    "company-detail": ("company-detail", {"pk": "{company}"}, {}),
+    "company-detail-embed": (
+        "company-detail",
+        {"pk": "{company}"},
+        {"embed": "employees,partnerships"},
+    ),
+    "company-employees": ("company-employees", {"company_pk": "{company}"}, {}),
+    "company-partnerships": (
+        "company-partnerships",
+        {"company_pk": "{company}"},
+        {},
+    ),
+    "company-export": ("company-export", {}, {"country": "{country}"}),
+    "partnership-list": ("partnership-list", {}, {}),
+    "partnership-list-filtered": (
+        "partnership-list",
+        {},
+        {"company_inviter_name": "{company_name}", "ordering": "year_partnership"},
+    ),
+    "partnership-detail": ("partnership-detail", {"pk": "{partnership}"}, {}),
+    "analytics-list": ("analytics-list", {}, {"group_by": "company"}),
+    "graph-list": ("graph-list", {}, {}),
+    "graph-neighbours": ("graph-neighbours", {}, {"company": "{company}", "hops": "2"}),
+    "graph-path": (
+        "graph-path",
+        {},
+        {"source": "{company}", "target": "{other_company}", "max_hops": "10"},
+    ),
+    "graph-components": ("graph-components", {}, {}),
+    "graph-degrees": ("graph-degrees", {}, {}),
+    "change-feed": ("change-list", {}, {"cursor": "0-0", "models": "employee"}),
+    "change-head": ("change-head", {}, {}),
+}
+
+Measurement = namedtuple("Measurement", ("case", *METRICS))
+
+
+def seed_data(companies=200, professions=30, employees=10000, partnerships=1000):
+    """
+	Create a reproducible dataset with bulk inserts and rebuild everything
+	that signals maintain for single writes
+	"""
+
+    DataGenerator(seed=0).generate(companies, professions, employees, partnerships)
+
+
+def seeded_context():
+    """
+	Return facts about the data which parameters of CASES refer to
+	"""
+
+    company = Company.objects.order_by("-employees_count", "pk").first()
+    with graph_snapshot.locked() as graph:
+        # partnerships are clustered, paths exist only within a component
+        distances = graph.neighbourhood(
+            company.pk, hops=10, limit=len(graph.all_nodes())
+        )
+    other_company = max(distances, key=lambda pk: (distances[pk], pk))
+    employees = Employee.objects.select_related("company", "profession")[:100]
+    bulk_body = "\n".join(
+        json.dumps(
+            {
+                "name": employee.name,
+                "age": employee.age,
+                "gender": employee.gender,
+                "company": employee.company.name,
+                "profession": employee.profession.name,
+                "salary": employee.salary + 1,
+                "promotion_date": employee.promotion_date.isoformat(),
+                "phone_number": employee.phone_number,
+                "email": employee.email,
+            }
+        )
+        for employee in employees
+    )
+    return {
+        "company": company.pk,
+        "company_name": company.name,
+        "country": company.country,
+        "other_company": other_company,
+        "profession": Profession.objects.order_by("-employees_count").first().pk,
+        "employee": Employee.objects.filter(company=company).first().pk,
+        "partnership": PartnerShip.objects.first().pk,
+        "bulk_body": bulk_body,
+    }
+
+
+class Profile:
+    """
+	Counts queries and times them and serialization during requests
+
+	Serialization is the time spent in the outermost to_representation or
+	represent_rows and in rendering, less the queries run inside them.
+	"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialization = 0.0
+        self.depth = 0
+        self.nested_db = 0.0  # time of queries run during serialization
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db += elapsed
+            if self.depth:
+                self.nested_db += elapsed
+
+    def timed(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.depth:
+                return func(*args, **kwargs)
+            self.depth += 1
+            start, nested_db = time.perf_counter(), self.nested_db
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.depth -= 1
+                self.serialization += (
+                    time.perf_counter() - start - (self.nested_db - nested_db)
+                )
+
+        return wrapper
+
+    @contextmanager
+    def patched(self):
+        with ExitStack() as stack:
+            stack.enter_context(connection.execute_wrapper(self))
+            for owner in (serializers.ListSerializer, serializers.Serializer):
+                stack.enter_context(
+                    mock.patch.object(
+                        owner, "to_representation", self.timed(owner.to_representation)
+                    )
+                )
+            stack.enter_context(
+                mock.patch.object(
+                    values, "represent_rows", self.timed(values.represent_rows)
+                )
+            )
+            stack.enter_context(
+                mock.patch.object(
+                    Response,
+                    "rendered_content",
+                    property(self.timed(Response.rendered_content.fget)),
+                )
+            )
+            # budgets are for the uncached path and requests are not throttled
+            stack.enter_context(
+                mock.patch.object(
+                    CachedResponseMixin,
+                    "get_cached_response",
+                    lambda view, handler, request, *args, **kwargs: handler(
+                        request, *args, **kwargs
+                    ),
+                )
+            )
+            stack.enter_context(mock.patch.object(APIView, "throttle_classes", ()))
+            yield self
+
+
+def fill(value, context):
+    return value.format(**context) if isinstance(value, str) else value
+
+
+def percentile(values, percent):
+    """
+	Return the nearest-rank percentile of values
+	"""
+
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def measure_case(client, profile, name, context, repeat):
+    url_name, kwargs, params = CASES[name]
+    url = reverse(
+        f"companies:{url_name}",
+        kwargs={key: fill(value, context) for key, value in kwargs.items()},
+    )
+    params = {key: fill(value, context) for key, value in params.items()}
+
+    runs = []
+    # the first run warms up caches of names and the graph snapshot
+    for _ in range(repeat + 1):
+        profile.reset()
+        start = time.perf_counter()
+        if name == "employee-bulk":
+            response = client.post(
+                url, context["bulk_body"], content_type="application/x-ndjson"
+            )
+        else:
+            response = client.get(url, params)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        latency = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise AssertionError(f"{name} answered {response.status_code}")
+        runs.append((profile.queries, profile.db, profile.serialization, latency))
+
+    queries, db, serialization, latencies = zip(*runs[1:])
+    return Measurement(
+        name,
+        max(queries),
+        round(statistics.median(db) * 1000, 3),
+        round(statistics.median(serialization) * 1000, 3),
+        round(percentile(latencies, 50) * 1000, 3),
+        round(percentile(latencies, 99) * 1000, 3),
+    )
+
+
+def measure(cases=None, repeat=20):
+    """
+	Request every case repeat times on the current database, return
+	Measurement of each
+	"""
+
+    context = seeded_context()
+    client = APIClient()
+    profile = Profile()
+    with profile.patched():
+        return [
+            measure_case(client, profile, name, context, repeat)
+            for name in cases or CASES
+        ]
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as budgets:
+        return json.load(budgets)
+
+
+def save_budgets(measurements, path=BUDGETS_PATH, headroom=3):
+    """
+	Store measurements as budgets, times get headroom for slower machines
+	"""
+
+    budgets = {
+        measurement.case: {
+            metric: (
+                getattr(measurement, metric)
+                if metric == "queries"
+                else math.ceil(getattr(measurement, metric) * headroom) or 1
+            )
+            for metric in METRICS
+        }
+        for measurement in measurements
+    }
+    with open(path, "w") as file:
+        json.dump(budgets, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def check_budgets(measurements, budgets, metrics=METRICS):
+    """
+	Return descriptions of measurements over their budget, cases without a
+	budget are violations too
+	"""
+
+    violations = []
+    for measurement in measurements:
+        budget = budgets.get(measurement.case)
+        if budget is None:
+            violations.append(f"{measurement.case}: no budget")
+            continue
+        for metric in metrics:
+            if metric in budget and getattr(measurement, metric) > budget[metric]:
+                violations.append(
+                    f"{measurement.case}: {metric} {getattr(measurement, metric)} "
+                    f"over budget {budget[metric]}"
+                )
+    return violations
@@ -0,0 +1,312 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import UnsupportedMediaType
+from companies.analytics import employee_facts
+from companies.models import Profession, Company, Employee
+from companies.renditions import file_digest, queue as rendition_queue
+from companies.signals import employees_bulk_saved
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_MEDIA_TYPES = ("text/csv",)
+
+
+def iter_lines(stream):
+    """
+	Decode a binary stream into text lines without reading it whole
+	"""
+
+    if stream is None:
+        return iter(())
+    return codecs.iterdecode(iter(stream.readline, b""), "utf-8")
+
+
+def read_ndjson(lines):
+    """
+	Yield one dict per non-empty line, a line which is not an object yields
+	the ValueError that explains the problem
+	"""
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield ValueError(f"Invalid JSON: {error}")
+            continue
+        if not isinstance(row, dict):
+            yield ValueError("Each line must be a JSON object")
+            continue
+        yield row
+
+
+def read_csv(lines):
+    """
+	Yield one dict per CSV record, the first record names the columns
+	"""
+
+    for row in csv.DictReader(lines):
+        # columns missing in a short record are not sent at all
+        yield {name: value for name, value in row.items() if value is not None}
+
+
+def read_rows(request):
+    """
+	Choose the reader by the content type of a streamed upload
+	"""
+
+    media_type = request.content_type.split(";")[0].strip()
+    lines = iter_lines(request.stream)
+
+    if media_type in NDJSON_MEDIA_TYPES:
+        return read_ndjson(lines)
+    if media_type in CSV_MEDIA_TYPES:
+        return read_csv(lines)
+    raise UnsupportedMediaType(media_type)
+
+
+class BulkEmployeeSerializer(serializers.ModelSerializer):
+    """
+	Serializer for validation of employees uploaded in bulk
+
+	Company and profession are given by name and resolved per chunk, the name of
+	employee identifies a row to update, so no per-row queries are made here.
+	"""
+
+    company = serializers.CharField(max_length=100)  # name of related company
+    profession = serializers.CharField(max_length=50)  # name of related profession
+    photo = serializers.CharField(max_length=100, required=False, default="")
+
+    class Meta:
+        model = Employee
+        fields = (
+            "name",
+            "age",
+            "gender",
+            "photo",
+            "company",
+            "profession",
+            "salary",
+            "promotion_date",
+            "phone_number",
+            "email",
+        )
+        extra_kwargs = {"name": {"validators": []}}
+
+
+class EmployeeBulkLoader:
+    """
+	Create or update employees from an iterable of rows in bounded chunks
+
+	Every chunk is validated at once, resolves names of companies, professions
+	and existing employees with one query each and is written in its own
+	transaction, so memory does not depend on the number of rows. Photos which
+	are new or changed are digested and rendered as a single save does.
+	"""
+
+    serializer_class = BulkEmployeeSerializer
+    update_fields = (
+        "age",
+        "gender",
+        "photo",
+        "company",
+        "profession",
+        "salary",
+        "promotion_date",
+        "phone_number",
+        "email",
+        "photo_digest",
+        "updated_at",
+    )
+
+    def __init__(self, chunk_size=1000, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def load(self, rows):
+        rows = iter(rows)
+        start = 1
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.load_chunk(chunk, start)
+            start += len(chunk)
+
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def validate_chunk(self, chunk, start):
+        """
+		Return {employee name: (row number, validated data)} of valid rows
+		"""
+
+        numbered = []
+        for row_number, row in enumerate(chunk, start):
+            if isinstance(row, Exception):
+                self.add_error(row_number, {"non_field_errors": [str(row)]})
+            else:
+                numbered.append((row_number, row))
+
+        serializer = self.serializer_class()
+        valid = {}
+        for row_number, row in numbered:
+            try:
+                data = serializer.run_validation(row)
+            except serializers.ValidationError as error:
+                self.add_error(row_number, error.detail)
+                continue
+            # the last occurrence of a name in the chunk wins
+            valid.pop(data["name"], None)
+            valid[data["name"]] = (row_number, data)
+        return valid
+
+    def resolve_names(self, valid):
+        companies = dict(
+            Company.objects.filter(
+                name__in={data["company"] for _, data in valid.values()}
+            ).values_list("name", "pk")
+        )
+        professions = dict(
+            Profession.objects.filter(
+                name__in={data["profession"] for _, data in valid.values()}
+            ).values_list("name", "pk")
+        )
+
+        resolved = {}
+        for name, (row_number, data) in valid.items():
+            errors = {}
+            if data["company"] not in companies:
+                errors["company"] = [f"Company {data['company']} does not exist."]
+            if data["profession"] not in professions:
+                errors["profession"] = [
+                    f"Profession {data['profession']} does not exist."
+                ]
+            if errors:
+                self.add_error(row_number, errors)
+                continue
+
+            data = dict(data)
+            data["company_id"] = companies[data.pop("company")]
+            data["profession_id"] = professions[data.pop("profession")]
+            resolved[name] = (row_number, data)
+        return resolved
+
+    def digest_photos(self, resolved):
+        """
+		Return {photo name: digest of its content} of photos of the chunk
+		"""
+
+        names = {data["photo"] for _, data in resolved.values() if data["photo"]}
+        # files are read before the transaction, it locks the employees
+        return {name: file_digest(Employee(photo=name).photo) for name in names}
+
+    def load_chunk(self, chunk, start):
+        resolved = self.resolve_names(self.validate_chunk(chunk, start))
+        if not resolved:
+            return
+
+        digests = self.digest_photos(resolved)
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                existing = {
+                    employee.name: employee
+                    for employee in Employee.objects.select_for_update()
+                    .filter(name__in=resolved.keys())
+                    .only(
+                        "pk",
+                        "name",
+                        "photo",
+                        "photo_digest",
+                        "company_id",
+                        "profession_id",
+                        "gender",
+                        "salary",
+                        "age",
+                    )
+                }
+                touched_companies = {e.company_id for e in existing.values()}
+                touched_professions = {e.profession_id for e in existing.values()}
+
+                created, updated, previous, new_photos = [], [], [], []
+                for name, (_, data) in resolved.items():
+                    employee = existing.get(name)
+                    if employee is None:
+                        employee = Employee(**data)
+                        created.append(employee)
+                    else:
+                        previous.append(employee_facts(employee))
+                        stored_photo = employee.photo.name
+                        for field, value in data.items():
+                            setattr(employee, field, value)
+                        employee.updated_at = now
+                        updated.append(employee)
+                        if employee.photo.name == stored_photo:
+                            continue  # its digest is still right
+                    employee.photo_digest = digests.get(employee.photo.name, "")
+                    if employee.photo_digest:
+                        new_photos.append(employee.photo)
+
+                Employee.objects.bulk_create(created, batch_size=self.chunk_size)
+                Employee.objects.bulk_update(
+                    updated,
+                    self.update_fields,
+                    batch_size=self.chunk_size,
+                )
+
+                created_ids = [employee.pk for employee in created]
+                if None in created_ids:
+                    # inserts of this database return no ids
+                    created_ids = list(
+                        Employee.objects.filter(
+                            name__in=[employee.name for employee in created]
+                        ).values_list("pk", flat=True)
+                    )
+
+                touched_companies.update(
+                    data["company_id"] for _, data in resolved.values()
+                )
+                touched_professions.update(
+                    data["profession_id"] for _, data in resolved.values()
+                )
+                employees_bulk_saved.send(
+                    sender=Employee,
+                    company_ids=touched_companies,
+                    profession_ids=touched_professions,
+                    created_ids=created_ids,
+                    updated_ids=[employee.pk for employee in updated],
+                    previous=previous,
+                    saved=[employee_facts(employee) for employee in created + updated],
+                )
+                for photo in new_photos:
+                    transaction.on_commit(
+                        lambda photo=photo: rendition_queue.submit(
+                            digests[photo.name], photo
+                        )
+                    )
+        except DatabaseError as error:
+            for row_number, _ in resolved.values():
+                self.add_error(row_number, {"non_field_errors": [str(error)]})
+            return
+
+        self.created += len(created)
+        self.updated += len(updated)
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+from companies.models import Profession, Company, Employee, PartnerShip
+from companies.replicas import current_replica, get_config as get_replica_config
+
+# models whose cached responses become stale when a row of the key model is
+# written, e.g. an employee is embedded into company and profession details
+# and the company list shows counters of employees
+DEPENDENT_MODELS = {
+    Profession: (Profession, Employee, Company),
+    Company: (Company, Employee, PartnerShip),
+    Employee: (Employee, Company, Profession),
+    PartnerShip: (PartnerShip, Company),
+}
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def version_key(model):
+    return f"version:{model._meta.label_lower}"
+
+
+def get_version(model):
+    """
+	Return current version of cached responses of the model
+	"""
+
+    cache = get_cache()
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # an evicted counter must not restart from a value used before
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_versions(model):
+    """
+	Invalidate cached responses of the model and of models that embed it
+	"""
+
+    cache = get_cache()
+    for dependent in DEPENDENT_MODELS.get(model, (model,)):
+        try:
+            cache.incr(version_key(dependent))
+        except ValueError:
+            cache.add(version_key(dependent), time.time_ns(), timeout=None)
+
+
+def names_key(model):
+    return f"names:{model._meta.label_lower}"
+
+
+def get_names(model):
+    """
+	Return cached {name: pk} of all rows of the model in default ordering
+	"""
+
+    cache = get_cache()
+    names = cache.get(names_key(model))
+    if names is None:
+        names = dict(model._default_manager.values_list("name", "pk"))
+        # a timeout bounds staleness if a write races with this load
+        cache.set(names_key(model), names, settings.API_CACHE_TIMEOUT)
+    return names
+
+
+def forget_names(model):
+    get_cache().delete(names_key(model))
+
+
+class CacheMetrics:
+    """
+	Thread-safe hit and miss counters of the response cache per resource
+	"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, resource, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[resource] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                resource: {
+                    "hits": self.hits[resource],
+                    "misses": self.misses[resource],
+                }
+                for resource in self.hits.keys() | self.misses.keys()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+metrics = CacheMetrics()
+
+
+class CachedResponseMixin:
+    """
+	Serve list and retrieve from a cache keyed by the normalized request and
+	the version of the viewset's model, which writes bump through signals
+	"""
+
+    cache_timeout = None  # None means API_CACHE_TIMEOUT from settings
+    # validators are replayed on hits, so conditional requests stay cheap
+    cached_headers = ("ETag", "Last-Modified")
+
+    def get_cache_key(self, request):
+        model = self.queryset.model
+        query = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        )
+        # hyperlinks of responses depend on scheme and host, their content on
+        # the negotiated renderer and parameters of its media type, e.g. indent
+        normalized = repr(
+            (
+                request.scheme,
+                request.get_host(),
+                request.path,
+                query,
+                request.accepted_renderer.format,
+                request.accepted_media_type,
+            )
+        )
+        digest = hashlib.md5(normalized.encode()).hexdigest()
+        return f"response:{model._meta.label_lower}:{get_version(model)}:{digest}"
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        metrics.record(self.basename, hit=cached is not None)
+
+        if cached is not None:
+            data, headers = cached
+            response = Response(data)
+            for name, value in headers.items():
+                response[name] = value
+            response["X-Cache"] = "HIT"
+            return get_conditional_response(
+                request,
+                etag=headers.get("ETag"),
+                last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+                response=response,
+            )
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {
+                name: response[name]
+                for name in self.cached_headers
+                if response.has_header(name)
+            }
+            timeout = self.cache_timeout or settings.API_CACHE_TIMEOUT
+            if current_replica.get() is not None:
+                # a lagging replica may have missed the write of this version
+                timeout = min(timeout, get_replica_config()["STICKY_SECONDS"])
+            cache.set(key, (response.data, headers), timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
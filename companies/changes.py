@@ -0,0 +1,102 @@
+from itertools import islice
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max, Q
+from django.db.models.expressions import RawSQL
+from companies.models import Change
+
+# position of changes of no transaction, before the first one
+START = (0, 0)
+
+
+def current_txid(using=DEFAULT_DB_ALIAS):
+    """
+	Return the value of Change.txid for a change written in the current
+	transaction, an expression evaluated by the insert on PostgreSQL
+	"""
+
+    if connections[using].vendor == "postgresql":
+        return RawSQL("txid_current()", ())
+    return 0
+
+
+def record_changes(model, pks, action, using=DEFAULT_DB_ALIAS, batch_size=10000):
+    """
+	Append a change of action for each of pks of model to the change log
+	"""
+
+    txid = current_txid(using)
+    label = model._meta.model_name
+    pks = iter(pks)
+    # bulk_create holds all of its objects, so they are made batch by batch
+    while True:
+        batch = [
+            Change(txid=txid, model=label, object_id=pk, action=action)
+            for pk in islice(pks, batch_size)
+        ]
+        if not batch:
+            break
+        Change.objects.using(using).bulk_create(batch)
+
+
+def visible_changes(using=None):
+    """
+	Return changes which no running transaction can precede any more
+
+	On PostgreSQL changes of transactions from the oldest running one on are
+	left out, as it may still commit changes before them in the order of
+	(txid, id). Elsewhere transactions commit one at a time in order of ids.
+	"""
+
+    changes = Change.objects.using(using) if using else Change.objects.all()
+    if connections[changes.db].vendor == "postgresql":
+        changes = changes.filter(
+            txid__lt=RawSQL("txid_snapshot_xmin(txid_current_snapshot())", ())
+        )
+    return changes
+
+
+def encode_cursor(position):
+    return "-".join(str(value) for value in position)
+
+
+def decode_cursor(cursor):
+    """
+	Return the (txid, id) position of a cursor or raise ValueError
+	"""
+
+    txid, pk = (int(value) for value in cursor.split("-"))
+    if txid < 0 or pk < 0:
+        raise ValueError(cursor)
+    return txid, pk
+
+
+def changes_after(position, changes=None):
+    txid, pk = position
+    changes = visible_changes() if changes is None else changes
+    return changes.filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=pk))
+
+
+def head_position(changes=None):
+    """
+	Return position of the last visible change, changes after it are returned
+	to a client which starts at a cursor of it
+	"""
+
+    changes = visible_changes() if changes is None else changes
+    txid = changes.aggregate(txid=Max("txid"))["txid"]
+    if txid is None:
+        return START
+    return txid, changes.filter(txid=txid).aggregate(id=Max("id"))["id"]
+
+
+def latest_changes(changes):
+    """
+	Return the last of changes of each row, in order of the change log, the
+	earlier ones are superseded by it
+	"""
+
+    latest = {}
+    for change in changes:
+        latest.pop((change.model, change.object_id), None)
+        latest[(change.model, change.object_id)] = change
+    return list(latest.values())
@@ -0,0 +1,111 @@
+import hashlib
+from django.db.models import Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from companies.cache import get_version
+from companies.embed import requested_embeds
+
+
+def latest_change(model, path):
+    """
+	Expression with the latest value of path (ending with updated_at) per row
+
+	Reverse relations are aggregated in a correlated subquery, so that several
+	of them in one query do not multiply each other's rows.
+	"""
+
+    relation, _, rest = path.partition("__")
+    field = model._meta.get_field(relation)
+    if not rest or not field.one_to_many:
+        return Max(path)
+
+    remote_name = field.field.name
+    rows = (
+        field.related_model.objects.filter(**{remote_name: OuterRef("pk")})
+        .order_by()
+        .values(remote_name)
+        .annotate(latest=Max(rest))
+        .values("latest")
+    )
+    return Subquery(rows)
+
+
+class ConditionalGetMixin:
+    """
+	Answer list and retrieve with validators and return 304 before any
+	serialization when they match
+
+	Lists are tagged by the cached response version of the model, which every
+	write of rows they show bumps, deletes included, without reading rows.
+	They have no Last-Modified, as no updated_at of theirs moves on deletes.
+	A detail gets ETag and Last-Modified from one aggregate query over the
+	updated_at columns of detail_change_fields, reverse relations allowed.
+	embed_change_fields adds columns of lists requested with ?embed=.
+	"""
+
+    detail_change_fields = ("updated_at",)
+    embed_change_fields = {}  # embedded name: updated_at columns of its rows
+
+    def get_detail_change_fields(self):
+        fields = list(self.detail_change_fields)
+        for name in sorted(requested_embeds(self.request, self.embed_change_fields)):
+            fields.extend(self.embed_change_fields[name])
+        return fields
+
+    def get_list_validators(self):
+        return {"version": get_version(self.queryset.model)}
+
+    def get_detail_validators(self):
+        model = self.queryset.model
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(model._default_manager.all()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        change_fields = self.get_detail_change_fields()
+        return (
+            queryset.order_by()
+            .annotate(
+                **{
+                    f"latest_{index}": latest_change(model, path)
+                    for index, path in enumerate(change_fields)
+                }
+            )
+            .values(*(f"latest_{index}" for index in range(len(change_fields))))
+            .first()
+        )
+
+    def get_conditional_response(self, handler, validators, request, *args, **kwargs):
+        if validators is None:
+            # missing object, the handler answers with 404
+            return handler(request, *args, **kwargs)
+
+        changes = [value for name, value in validators.items() if name != "version"]
+        last_modified = max((value for value in changes if value), default=None)
+        fingerprint = repr(
+            (
+                request.get_full_path(),
+                request.accepted_media_type,
+                sorted(validators.items()),
+            )
+        )
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag, timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, self.get_list_validators(), request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, self.get_detail_validators(), request, *args, **kwargs
+        )
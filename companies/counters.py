@@ -0,0 +1,82 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+from companies.changes import record_changes
+from companies.models import Profession, Company, Employee, PartnerShip, Change
+
+
+def count_subquery(model, field_name):
+    """
+	Correlated COUNT of model rows that point to the outer row through field_name
+	"""
+
+    rows = (
+        model.objects.filter(**{field_name: OuterRef("pk")})
+        .order_by()
+        .values(field_name)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def change_counter(model, pk, counter, delta):
+    """
+	Atomically add delta to the counter column of one row
+	"""
+
+    if pk is None or not delta:
+        return
+    # counters are a part of representation, so the row counts as updated
+    model.objects.filter(pk=pk).update(
+        **{counter: F(counter) + delta}, updated_at=Now()
+    )
+    record_changes(model, [pk], Change.UPDATE)
+
+
+def recount_employees(company_ids=None, profession_ids=None):
+    """
+	Recompute employee counters of the given companies and professions
+	"""
+
+    if company_ids:
+        Company.objects.filter(pk__in=company_ids).update(
+            employees_count=count_subquery(Employee, "company"), updated_at=Now()
+        )
+        record_changes(Company, company_ids, Change.UPDATE)
+    if profession_ids:
+        Profession.objects.filter(pk__in=profession_ids).update(
+            employees_count=count_subquery(Employee, "profession"), updated_at=Now()
+        )
+        record_changes(Profession, profession_ids, Change.UPDATE)
+
+
+def recount_partners(company_ids):
+    """
+	Recompute partner counters of the given companies
+	"""
+
+    if company_ids:
+        Company.objects.filter(pk__in=company_ids).update(
+            partners_count=count_subquery(PartnerShip, "company"), updated_at=Now()
+        )
+        record_changes(Company, company_ids, Change.UPDATE)
+
+
+def rebuild_counters():
+    """
+	Recompute every counter column from scratch, returns number of updated rows
+
+	Rows are not logged as changed, clients of the change feed download the
+	lists again after a repair.
+	"""
+
+    return {
+        "professions": Profession.objects.update(
+            employees_count=count_subquery(Employee, "profession"), updated_at=Now()
+        ),
+        "companies": Company.objects.update(
+            employees_count=count_subquery(Employee, "company"),
+            partners_count=count_subquery(PartnerShip, "company"),
+            updated_at=Now(),
+        ),
+    }
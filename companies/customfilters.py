@@ -1,6 +1,23 @@
-from django_filters import FilterSet, AllValuesFilter, DateTimeFilter, NumberFilter
+from django import forms
+from django_filters import FilterSet, DateTimeFilter, ModelChoiceFilter, NumberFilter
 from companies.models import Profession, Employee, Company, PartnerShip
-from django.db.models import Count
+
+
+class NameFilter(ModelChoiceFilter):
+    """
+	Filter by name of a related profession or company
+
+	The name is looked up through its unique index, so neither building the
+	form nor filtering loads all names or scans the filtered table, the query
+	compares the indexed foreign key only.
+	"""
+
+    def __init__(self, *args, related_model, **kwargs):
+        kwargs.setdefault("queryset", related_model._default_manager.all())
+        kwargs.setdefault("to_field_name", "name")
+        # a select would render every name in the browsable api
+        kwargs.setdefault("widget", forms.TextInput)
+        super().__init__(*args, **kwargs)
 
 
 class ProfessionFilter(FilterSet):
@@ -9,18 +26,17 @@ class ProfessionFilter(FilterSet):
 	"""
 
     number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_exact",
+        field_name="employees_count",
         label="Number of employees",
     )
     min_number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_gte",
+        field_name="employees_count",
+        lookup_expr="gte",
         label="Number of employees is great than or equal to",
     )
     max_number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_lte",
+        field_name="employees_count",
+        lookup_expr="lte",
         label="Number of employees is less than or equal to",
     )
 
@@ -33,21 +49,6 @@ class ProfessionFilter(FilterSet):
             "max_number_of_employees",
         )
 
-    def filter_number_of_employee_exact(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees=value
-        )
-
-    def filter_number_of_employee_gte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees__gte=value
-        )
-
-    def filter_number_of_employee_lte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees__lte=value
-        )
-
 
 class EmployeeFilter(FilterSet):
     """
@@ -62,8 +63,10 @@ class EmployeeFilter(FilterSet):
     max_salary = NumberFilter(field_name="salary", lookup_expr="lte")
     min_age = NumberFilter(field_name="age", lookup_expr="gte")
     max_age = NumberFilter(field_name="age", lookup_expr="lte")
-    profession_name = AllValuesFilter(field_name="profession__name")
-    company_name = AllValuesFilter(field_name="company__name")
+    profession_name = NameFilter(field_name="profession", related_model=Profession)
+    company_name = NameFilter(field_name="company", related_model=Company)
+    profession_id = NumberFilter(field_name="profession")
+    company_id = NumberFilter(field_name="company")
 
     class Meta:
         model = Employee
@@ -86,6 +89,8 @@ class EmployeeFilter(FilterSet):
             "profession_name",
             # company__name will be accessed as company_name
             "company_name",
+            "profession_id",
+            "company_id",
         )
 
 
@@ -101,33 +106,31 @@ class CompanyFilter(FilterSet):
         field_name="year_of_foundation", lookup_expr="lte"
     )
     number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_exact",
+        field_name="employees_count",
         label="Number of employees",
     )
     min_number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_gte",
+        field_name="employees_count",
+        lookup_expr="gte",
         label="Number of employees is great than or equal to",
     )
     max_number_of_employees = NumberFilter(
-        field_name="number_of_employees",
-        method="filter_number_of_employee_lte",
+        field_name="employees_count",
+        lookup_expr="lte",
         label="Number of employees is less than or equal to",
     )
     number_of_partners = NumberFilter(
-        field_name="number_of_partners",
-        method="filter_number_of_partner_exact",
+        field_name="partners_count",
         label="Number of partners",
     )
     min_number_of_partners = NumberFilter(
-        field_name="number_of_partners",
-        method="filter_number_of_partner_gte",
+        field_name="partners_count",
+        lookup_expr="gte",
         label="Number of partners is great than or equal to",
     )
     max_number_of_partners = NumberFilter(
-        field_name="number_of_partners",
-        method="filter_number_of_partner_lte",
+        field_name="partners_count",
+        lookup_expr="lte",
         label="Number of partners is less than or equal to",
     )
 
@@ -148,36 +151,6 @@ class CompanyFilter(FilterSet):
             "to_year_of_foundation",
         )
 
-    def filter_number_of_employee_exact(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees=value
-        )
-
-    def filter_number_of_employee_gte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees__gte=value
-        )
-
-    def filter_number_of_employee_lte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_employees=Count("employees")).filter(
-            number_of_employees__lte=value
-        )
-
-    def filter_number_of_partner_exact(self, queryset, field_name, value):
-        return queryset.annotate(number_of_partners=Count("partners")).filter(
-            number_of_partners=value
-        )
-
-    def filter_number_of_partner_gte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_partners=Count("partners")).filter(
-            number_of_partners__gte=value
-        )
-
-    def filter_number_of_partner_lte(self, queryset, field_name, value):
-        return queryset.annotate(number_of_partners=Count("partners")).filter(
-            number_of_partners__lte=value
-        )
-
 
 class PartnerShipFilter(FilterSet):
     """
@@ -190,13 +163,17 @@ class PartnerShipFilter(FilterSet):
     to_year_partnership = DateTimeFilter(
         field_name="year_partnership", lookup_expr="lte"
     )
-    company_inviter_name = AllValuesFilter(field_name="company_inviter__name")
+    company_inviter_name = NameFilter(
+        field_name="company_inviter", related_model=Company
+    )
+    company_inviter_id = NumberFilter(field_name="company_inviter")
 
     class Meta:
         model = PartnerShip
         fields = (
             # company_inviter__name will be accessed as company_inviter_name
             "company_inviter_name",
+            "company_inviter_id",
             "year_partnership",
             "from_year_partnership",
             "to_year_partnership",
@@ -1,5 +1,222 @@
-from rest_framework.pagination import LimitOffsetPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime, time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.template import loader
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+	JSON encoder which keeps full precision of dates stored in cursors
+	"""
+
+    def default(self, o):
+        if isinstance(o, (date, datetime, time)):
+            return o.isoformat()
+        return super().default(o)
 
 
 class LimitOffSetPaginationWithUpperBound(LimitOffsetPagination):
     max_limit = 8
+
+
+class KeysetPagination(BasePagination):
+    """
+	Pagination which continues after the last seen row instead of using OFFSET
+
+	The cursor stores values of ordering fields of the boundary row, so every
+	page is one indexed range query and no COUNT(*) is needed. Ordering comes
+	from the ordering parameter or Meta.ordering, pk is added as a tie-breaker.
+	"""
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    default_limit = LimitOffSetPaginationWithUpperBound.default_limit
+    max_limit = LimitOffSetPaginationWithUpperBound.max_limit
+    invalid_cursor_message = "Invalid cursor"
+    template = "rest_framework/pagination/previous_and_next.html"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.display_page_controls = self.template is not None
+        self.limit = self.get_limit(request)
+        self.ordering = self.get_ordering(queryset)
+        values, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [(field, not descending) for field, descending in ordering]
+
+        queryset = queryset.order_by(
+            *(f"-{field}" if descending else field for field, descending in ordering)
+        )
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, values))
+
+        # one extra row tells whether there is something behind this page
+        results = list(queryset[: self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[: self.limit]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.first, self.last = (results[0], results[-1]) if results else (None, None)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_html_context(self):
+        return {
+            "previous_url": self.get_previous_link(),
+            "next_url": self.get_next_link(),
+        }
+
+    def to_html(self):
+        template = loader.get_template(self.template)
+        return template.render(self.get_html_context())
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def get_ordering(self, queryset):
+        """
+		Return ordering of queryset as list of (field name, is descending) pairs
+		"""
+
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise NotFound("Keyset pagination supports only ordering by fields")
+
+        ordering = [(field.lstrip("-"), field.startswith("-")) for field in ordering]
+        if not any(field in ("pk", "id") for field, _ in ordering):
+            ordering.append(("pk", False))
+        return ordering
+
+    def get_keyset_filter(self, ordering, values):
+        """
+		Build (a > x) OR (a = x AND b > y) OR ... for the boundary row
+		"""
+
+        keyset = Q()
+        equal = Q()
+        for (field, descending), value in zip(ordering, values):
+            lookup = "lt" if descending else "gt"
+            keyset |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return keyset
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # rows read with values() include every field of the ordering
+            return [instance[field] for field, _ in self.ordering]
+
+        position = []
+        for field, _ in self.ordering:
+            value = instance
+            for attr in field.split("__"):
+                value = getattr(value, attr)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, instance, reverse):
+        cursor = json.dumps(
+            {"p": self.get_position(instance), "r": reverse}, cls=CursorEncoder
+        )
+        return urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            values, reverse = cursor["p"], bool(cursor["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_link(self, instance, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(instance, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link(self.first, reverse=True)
+
+
+class LimitOffSetOrKeysetPagination(LimitOffSetPaginationWithUpperBound):
+    """
+	Limit/offset pagination, which switches to keyset pagination on request
+
+	Clients opt in by sending the cursor parameter, an empty one means the first
+	page. Next and previous links then carry the cursor.
+	"""
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            page = self.keyset.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.keyset.display_page_controls
+            return page
+
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
@@ -0,0 +1,93 @@
+from rest_framework.exceptions import NotFound, ValidationError
+
+EMBED_QUERY_PARAM = "embed"
+
+
+def requested_embeds(request, embeddable):
+    """
+	Return names from ?embed= (comma separated), unknown names are rejected
+	"""
+
+    if request is None:
+        return set()
+    value = request.query_params.get(EMBED_QUERY_PARAM, "")
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(embeddable)
+    if unknown:
+        raise ValidationError(
+            {
+                EMBED_QUERY_PARAM: [
+                    f"Unknown {', '.join(sorted(unknown))}, "
+                    f"choose from: {', '.join(embeddable)}."
+                ]
+            }
+        )
+    return names
+
+
+class EmbedSerializerMixin:
+    """
+	Adds related lists requested with ?embed= to the representation
+
+	Each list is read with one query and cut at embed_limit rows, the full list
+	is available from the paginated nested route linked in the payload. Only
+	the top level embeds, representations which are embedded themselves or
+	nested into other payloads (context "embedded") ignore ?embed=.
+	"""
+
+    embed_limit = 100
+    # name in representation: (related manager, serializer class, select_related)
+    embeddable = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get("embedded"):
+            return data
+        for name in requested_embeds(self.context.get("request"), self.embeddable):
+            relation, serializer_class, related = self.embeddable[name]
+            rows = getattr(instance, relation).select_related(*related)
+            data[name] = serializer_class(
+                rows[: self.embed_limit],
+                many=True,
+                context={**self.context, "embedded": True},
+            ).data
+        return data
+
+
+class NestedViewSetMixin:
+    """
+	Lets a list of a viewset be routed under a parent object, e.g.
+	/companies/{company_pk}/employees/ lists employees of one company
+
+	parent_lookups maps url kwargs to the parent model and the lookup which
+	restricts the queryset, routes without the kwarg are not restricted.
+	"""
+
+    parent_lookups = {}  # url kwarg: (model of parent, lookup of queryset)
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                **{
+                    lookup: self.kwargs[kwarg]
+                    for kwarg, (_, lookup) in self.parent_lookups.items()
+                    if kwarg in self.kwargs
+                }
+            )
+        )
+
+    def check_parents(self):
+        for kwarg, (model, _) in self.parent_lookups.items():
+            if kwarg in self.kwargs and not (
+                model._default_manager.filter(pk=self.kwargs[kwarg]).exists()
+            ):
+                raise NotFound
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        # an empty page is the only case where the parent may be missing
+        if not page:
+            self.check_parents()
+        return page
@@ -0,0 +1,277 @@
+import csv
+import io
+import time
+from bisect import bisect_left
+from itertools import accumulate, islice
+from random import Random
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from companies.analytics import rebuild_summaries
+from companies.cache import bump_versions
+from companies.changes import record_changes
+from companies.counters import rebuild_counters
+from companies.graph import bump_graph_version
+from companies.models import Profession, Company, Employee, PartnerShip, Change
+from companies.search import get_search_backend
+
+COUNTRIES = ("Ukraine", "Poland", "Germany", "France", "Spain", "Italy")
+TYPES = ("IT", "Logistics", "Retail", "Finance", "Healthcare")
+
+
+def zipf_weights(count, exponent):
+    """
+	Return cumulative weights of ranks 1..count falling as rank ** -exponent
+	"""
+
+    return list(accumulate(rank**-exponent for rank in range(1, count + 1)))
+
+
+def pick(random, population, cumulative):
+    return population[bisect_left(cumulative, random.random() * cumulative[-1])]
+
+
+class RowWriter:
+    """
+	Inserts rows of a model given as {attname: value} in batches, with COPY on
+	PostgreSQL and bulk_create on other databases
+
+	Fields missing from a row get their default, auto_now fields the time the
+	writer was created.
+	"""
+
+    def __init__(self, model, batch_size=10000):
+        self.model = model
+        self.batch_size = batch_size
+        self.fields = [
+            field for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        now = timezone.now()
+        self.defaults = {
+            field.attname: (
+                now
+                if getattr(field, "auto_now", False)
+                or getattr(field, "auto_now_add", False)
+                else field.get_default()
+            )
+            for field in self.fields
+        }
+        self.rows = 0
+
+    def write(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = [{**self.defaults, **row} for row in islice(rows, self.batch_size)]
+            if not batch:
+                break
+            if connection.vendor == "postgresql":
+                self.copy(batch)
+            else:
+                self.model._default_manager.bulk_create(
+                    self.model(**row) for row in batch
+                )
+            self.rows += len(batch)
+
+    def copy(self, batch):
+        buffer = io.StringIO()
+        # unquoted empty fields are NULL in CSV of COPY, empty strings are quoted
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for row in batch:
+            writer.writerow(
+                field.get_db_prep_save(row[field.attname], connection)
+                for field in self.fields
+            )
+        buffer.seek(0)
+        columns = ", ".join(
+            connection.ops.quote_name(field.column) for field in self.fields
+        )
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f"COPY {connection.ops.quote_name(self.model._meta.db_table)} "
+                f"({columns}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+
+def free_names(model, label, count, batch_size=10000):
+    """
+	Yield count names "{label} {index}" that no row of the model has yet
+	"""
+
+    index = 0
+    while count > 0:
+        names = [f"{label} {index + offset}" for offset in range(batch_size)]
+        index += batch_size
+        taken = set(
+            model._default_manager.filter(name__in=names).values_list("name", flat=True)
+        )
+        for name in names:
+            if name not in taken and count > 0:
+                count -= 1
+                yield name
+
+
+class DataGenerator:
+    """
+	Generates a deterministic dataset for a seed with realistic skew
+
+	Company sizes and professions follow Zipf laws, so a few companies are huge
+	and most professions are rare. Companies form clusters of cluster_size and
+	most partnerships join companies of one cluster, well connected companies
+	take part in more of them.
+	"""
+
+    company_exponent = 1.1
+    profession_exponent = 0.9
+    partner_exponent = 0.8
+    cluster_size = 50
+    cluster_share = 0.9  # of partnerships within a cluster
+
+    def __init__(self, seed=0, batch_size=10000):
+        self.random = Random(seed)
+        self.batch_size = batch_size
+        self.founded = timezone.now().replace(
+            year=2000, month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        self.timings = {}  # name of rows: (rows, seconds)
+        self.new_rows = {}  # model: largest pk before its rows were written
+
+    def write(self, name, model, rows):
+        writer = RowWriter(model, self.batch_size)
+        last = model._default_manager.aggregate(pk=Max("pk"))["pk"] or 0
+        start = time.perf_counter()
+        writer.write(rows)
+        elapsed = time.perf_counter() - start
+        self.timings[name] = (writer.rows, elapsed)
+        self.new_rows[model] = last
+
+    def log_changes(self):
+        """
+		Append creates of the written rows to the change log, which signals of
+		single writes maintain
+		"""
+
+        start, rows = time.perf_counter(), 0
+        for model, last in self.new_rows.items():
+            pks = (
+                model._default_manager.filter(pk__gt=last)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            record_changes(
+                model, pks.iterator(), Change.CREATE, batch_size=self.batch_size
+            )
+            rows += pks.count()
+        self.timings["changes"] = (rows, time.perf_counter() - start)
+
+    def new_pks(self, model, names):
+        pks = dict(
+            model._default_manager.filter(name__in=names).values_list("name", "pk")
+        )
+        return [pks[name] for name in names]
+
+    def professions(self, count):
+        names = list(free_names(Profession, "Profession", count))
+        self.write(
+            "professions",
+            Profession,
+            ({"name": name, "description": f"{name} description"} for name in names),
+        )
+        return self.new_pks(Profession, names)
+
+    def companies(self, count):
+        names = list(free_names(Company, "Company", count))
+        random = self.random
+
+        def rows():
+            for name in names:
+                kind = random.choice(TYPES)
+                yield {
+                    "name": name,
+                    "logo": "companies/logos/logo.png",
+                    "tagline": f"{kind} company",
+                    "type_of_company": kind,
+                    "description": f"{name} works in {kind}",
+                    "year_of_foundation": self.founded.replace(
+                        year=random.randint(1950, 2020)
+                    ),
+                    "country": random.choice(COUNTRIES),
+                    "phone_number": "+380000000000",
+                    "email": "info@example.com",
+                }
+
+        self.write("companies", Company, rows())
+        return self.new_pks(Company, names)
+
+    def employees(self, count, company_ids, profession_ids):
+        names = free_names(Employee, "Employee", count)
+        random = self.random
+        companies = zipf_weights(len(company_ids), self.company_exponent)
+        professions = zipf_weights(len(profession_ids), self.profession_exponent)
+
+        def rows():
+            for name in names:
+                yield {
+                    "name": name,
+                    "age": random.randint(18, 70),
+                    "gender": random.choice((Employee.MALE, Employee.FEMALE)),
+                    "photo": "employees/photos/photo.png",
+                    "company_id": pick(random, company_ids, companies),
+                    "profession_id": pick(random, profession_ids, professions),
+                    "salary": min(int(random.lognormvariate(7.5, 0.6)), 1000000),
+                    "promotion_date": self.founded.replace(
+                        year=random.randint(2000, 2020)
+                    ),
+                    "phone_number": "+380000000000",
+                    "email": "employee@example.com",
+                }
+
+        self.write("employees", Employee, rows())
+
+    def partnerships(self, count, company_ids):
+        random = self.random
+        count = min(count, len(company_ids) * (len(company_ids) - 1) // 2)
+        hubs = zipf_weights(len(company_ids), self.partner_exponent)
+        pairs = set()
+
+        def rows():
+            while len(pairs) < count:
+                index = bisect_left(hubs, random.random() * hubs[-1])
+                start = index - index % self.cluster_size
+                if random.random() < self.cluster_share:
+                    other = random.randrange(
+                        start, min(start + self.cluster_size, len(company_ids))
+                    )
+                else:
+                    other = random.randrange(len(company_ids))
+                pair = (min(index, other), max(index, other))
+                if index == other or pair in pairs:
+                    continue
+                pairs.add(pair)
+                yield {
+                    "company_id": company_ids[pair[1]],
+                    "company_inviter_id": company_ids[pair[0]],
+                }
+
+        self.write("partnerships", PartnerShip, rows())
+
+    def generate(self, companies, professions, employees, partnerships):
+        with transaction.atomic():
+            profession_ids = self.professions(professions)
+            company_ids = self.companies(companies)
+            self.employees(employees, company_ids, profession_ids)
+            self.partnerships(partnerships, company_ids)
+            self.log_changes()
+
+        # bulk writes bypass the signals which maintain these
+        start = time.perf_counter()
+        rebuild_counters()
+        rebuild_summaries()
+        backend = get_search_backend()
+        if backend is not None:
+            backend.rebuild()
+        for model in (Profession, Company, Employee, PartnerShip):
+            bump_versions(model)
+        bump_graph_version()
+        self.timings["derived data"] = (0, time.perf_counter() - start)
+        return self.timings
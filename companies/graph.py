@@ -0,0 +1,371 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import chain
+from django.conf import settings
+from django.db import transaction
+from companies.cache import get_cache
+from companies.models import PartnerShip
+
+GRAPH_VERSION_KEY = "version:partner-graph"
+# ids of companies are packed in pairs into one 64-bit integer while building
+ID_BITS = 32
+
+
+def pair(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+class PartnerGraph:
+    """
+	Undirected graph of partnerships in compressed sparse rows
+
+	Partners of nodes[i] are the sorted targets[offsets[i]:offsets[i + 1]].
+	Changes since the arrays were built are kept in a small overlay of added
+	and removed edges, which is folded into new arrays once it grows.
+	"""
+
+    compact_ratio = 0.1  # overlay size relative to edges which triggers compact
+    compact_minimum = 1000
+    max_ranking = 1000  # longest cached degree ranking
+
+    def __init__(self, edges=()):
+        """
+		Build from iterable of (company, partner) pairs in either direction
+		"""
+
+        codes = []
+        for a, b in edges:
+            if a != b:
+                codes.append(a << ID_BITS | b)
+                codes.append(b << ID_BITS | a)
+        self.build(codes)
+
+    @classmethod
+    def from_database(cls, using="default"):
+        rows = (
+            PartnerShip.objects.using(using)
+            .order_by()
+            .values_list("company_id", "company_inviter_id")
+        )
+        return cls(rows.iterator(chunk_size=10000))
+
+    def build(self, codes):
+        codes.sort()
+        mask = (1 << ID_BITS) - 1
+        self.nodes, self.offsets, self.targets = array("q"), array("q"), array("q")
+        previous = None
+        for code in codes:
+            if code == previous:
+                continue
+            previous = code
+            node = code >> ID_BITS
+            if not self.nodes or self.nodes[-1] != node:
+                self.nodes.append(node)
+                self.offsets.append(len(self.targets))
+            self.targets.append(code & mask)
+        self.offsets.append(len(self.targets))
+
+        self.added = defaultdict(set)
+        self.removed = set()
+        self.overlay_size = 0
+        self.forget_derived()
+
+    def forget_derived(self):
+        self.parents = None
+        self.members = None
+        self.ranking = None
+
+    def base_partners(self, node):
+        index = bisect_left(self.nodes, node)
+        if index == len(self.nodes) or self.nodes[index] != node:
+            return self.targets[0:0]
+        return self.targets[self.offsets[index] : self.offsets[index + 1]]
+
+    def has_base_edge(self, a, b):
+        partners = self.base_partners(a)
+        index = bisect_left(partners, b)
+        return index < len(partners) and partners[index] == b
+
+    def partners(self, node):
+        removed = self.removed
+        result = [
+            partner
+            for partner in self.base_partners(node)
+            if not removed or pair(node, partner) not in removed
+        ]
+        if node in self.added:
+            result.extend(self.added[node])
+        return result
+
+    def degree(self, node):
+        return len(self.partners(node))
+
+    def all_nodes(self):
+        return {*self.nodes, *self.added}
+
+    @property
+    def edge_count(self):
+        added = sum(len(partners) for partners in self.added.values()) // 2
+        return len(self.targets) // 2 - len(self.removed) + added
+
+    def set_edges(self, changes):
+        """
+		Apply {(company, partner): whether they are partners now}
+		"""
+
+        for (a, b), exists in changes.items():
+            key = pair(a, b)
+            if exists:
+                if key in self.removed:
+                    self.removed.discard(key)
+                elif not self.has_base_edge(a, b) and b not in self.added[a]:
+                    self.added[a].add(b)
+                    self.added[b].add(a)
+                else:
+                    continue
+                if self.parents is not None:
+                    self.union(a, b)
+                self.members = None
+            else:
+                if b in self.added.get(a, ()):
+                    self.added[a].discard(b)
+                    self.added[b].discard(a)
+                elif self.has_base_edge(a, b) and key not in self.removed:
+                    self.removed.add(key)
+                else:
+                    continue
+                self.parents = self.members = None
+            self.overlay_size += 1
+            self.ranking = None
+
+        if self.overlay_size > max(
+            self.compact_minimum, self.compact_ratio * len(self.targets)
+        ):
+            self.compact()
+
+    def compact(self):
+        codes = [
+            node << ID_BITS | partner
+            for node in self.all_nodes()
+            for partner in self.partners(node)
+        ]
+        self.build(codes)
+
+    def neighbourhood(self, node, hops=1, limit=100):
+        """
+		Return {company: distance} of up to limit nearest companies within hops
+		"""
+
+        distances = {node: 0}
+        frontier = [node]
+        for distance in range(1, hops + 1):
+            following = []
+            for current in frontier:
+                for partner in self.partners(current):
+                    if partner in distances:
+                        continue
+                    distances[partner] = distance
+                    following.append(partner)
+                    if len(distances) > limit:
+                        del distances[node]
+                        return distances
+            frontier = following
+        del distances[node]
+        return distances
+
+    def shortest_path(self, source, target, max_hops=6):
+        """
+		Return companies on a shortest path from source to target or None
+
+		Searches from both ends and always expands the smaller frontier.
+		"""
+
+        if source == target:
+            return [source]
+
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        for _ in range(max_hops):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            following = []
+            for current in frontiers[side]:
+                for partner in self.partners(current):
+                    if partner in seen:
+                        continue
+                    seen[partner] = current
+                    if partner in other:
+                        return self.join_paths(partner, parents, side)
+                    following.append(partner)
+            if not following:
+                return None
+            frontiers = (
+                (following, frontiers[1]) if side == 0 else (frontiers[0], following)
+            )
+        return None
+
+    @staticmethod
+    def join_paths(meeting, parents, side):
+        halves = []
+        for index in (side, 1 - side):
+            half, node = [], meeting
+            while node is not None:
+                half.append(node)
+                node = parents[index][node]
+            halves.append(half)
+        forward, backward = halves if side == 0 else halves[::-1]
+        return forward[::-1] + backward[1:]
+
+    def find(self, node):
+        parents = self.parents
+        root = node
+        while parents.get(root, root) != root:
+            root = parents[root]
+        while node != root:
+            parents[node], node = root, parents.get(node, node)
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    def components(self):
+        """
+		Return {root company: companies} of connected companies with partners
+		"""
+
+        if self.parents is None:
+            self.parents = {}
+            for node in self.all_nodes():
+                for partner in self.partners(node):
+                    if node < partner:
+                        self.union(node, partner)
+
+        if self.members is None:
+            self.members = defaultdict(list)
+            for node in sorted(self.all_nodes()):
+                if self.degree(node):
+                    self.members[self.find(node)].append(node)
+        return self.members
+
+    def degree_ranking(self, limit=10):
+        """
+		Return (company, number of partners) of best connected companies
+		"""
+
+        if self.ranking is None:
+            touched = {node for key in self.removed for node in key} | set(self.added)
+            offsets = self.offsets
+            degrees = chain(
+                (
+                    (offsets[index + 1] - offsets[index], node)
+                    for index, node in enumerate(self.nodes)
+                    if node not in touched
+                ),
+                ((self.degree(node), node) for node in touched),
+            )
+            # ties go to the older company
+            ranking = heapq.nlargest(
+                self.max_ranking, degrees, key=lambda item: (item[0], -item[1])
+            )
+            self.ranking = [(node, degree) for degree, node in ranking if degree]
+        return self.ranking[:limit]
+
+
+def get_graph_version():
+    cache = get_cache()
+    version = cache.get(GRAPH_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(GRAPH_VERSION_KEY, version, timeout=None):
+            version = cache.get(GRAPH_VERSION_KEY, version)
+    return version
+
+
+def bump_graph_version():
+    cache = get_cache()
+    try:
+        return cache.incr(GRAPH_VERSION_KEY)
+    except ValueError:
+        cache.add(GRAPH_VERSION_KEY, time.time_ns(), timeout=None)
+        return None
+
+
+class GraphSnapshot:
+    """
+	Graph of the process, changed in place by partnership writes of the process
+	and rebuilt when the shared version shows a write of another process
+
+	The version lives in the cache of API_CACHE_ALIAS, which processes share
+	only with a shared backend. Otherwise writes of other processes are seen
+	once the graph is older than PARTNER_GRAPH_MAX_AGE seconds.
+	"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.graph = None
+        self.version = None
+        self.built_at = None
+
+    @contextmanager
+    def locked(self):
+        version = get_graph_version()
+        with self.lock:
+            if (
+                self.graph is None
+                or version != self.version
+                or time.monotonic() - self.built_at > settings.PARTNER_GRAPH_MAX_AGE
+            ):
+                self.graph = PartnerGraph.from_database()
+                self.version = version
+                self.built_at = time.monotonic()
+            yield self.graph
+
+    def record(self, pairs):
+        """
+		Update the graph with partnerships between pairs after commit
+		"""
+
+        # without a graph there is nothing to update, only the version is bumped
+        changes = partner_changes(pairs) if self.graph is not None else None
+        transaction.on_commit(lambda: self.apply(changes))
+
+    def apply(self, changes):
+        version = bump_graph_version()
+        with self.lock:
+            if (
+                changes is not None
+                and self.graph is not None
+                and version == self.version + 1
+            ):
+                self.graph.set_edges(changes)
+                self.version = version
+            else:
+                # another process wrote in between or the graph was built
+                # after the change was recorded, the next query rebuilds it
+                self.graph = None
+
+
+snapshot = GraphSnapshot()
+
+
+def partner_changes(pairs):
+    """
+	Return {(company, partner): whether a partnership row joins them}
+	"""
+
+    pairs = {pair(a, b) for a, b in pairs if a is not None and b is not None}
+    if not pairs:
+        return {}
+    companies = {company for key in pairs for company in key}
+    rows = PartnerShip.objects.filter(
+        company__in=companies, company_inviter__in=companies
+    ).values_list("company_id", "company_inviter_id")
+    existing = {pair(a, b) for a, b in rows}
+    return {key: key in existing for key in pairs}
@@ -0,0 +1,312 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# timings of the request being handled, views of async actions run in pool
+# threads, which get a copy of the context of the request
+current = ContextVar("request_timings", default=None)
+
+DEFAULTS = {"SLOW_REQUEST_MS": 500, "SLOW_QUERIES": 5, "MAX_ROUTES": 200}
+INFINITY = float("inf")
+MS_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, INFINITY)
+# metric: upper bounds of buckets of its histogram
+BUCKETS = {
+    "total_ms": MS_BUCKETS,
+    "view_ms": MS_BUCKETS,
+    "db_ms": MS_BUCKETS,
+    "count_ms": MS_BUCKETS,
+    "serialize_ms": MS_BUCKETS,
+    "throttle_ms": MS_BUCKETS,
+    "queries": (0, 1, 2, 3, 5, 10, 20, 50, 100, INFINITY),
+    "size": (1024, 10240, 102400, 1048576, 10485760, INFINITY),
+}
+OTHER_ROUTE = "other"  # routes beyond MAX_ROUTES
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "PERFORMANCE_INSTRUMENTATION", {})}
+
+
+class RequestTimings:
+    """
+	Queries and times of sections of one request
+	"""
+
+    def __init__(self, slow_queries):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.queries = 0
+        self.db = 0.0
+        self.count_queries = 0
+        self.count_db = 0.0  # of COUNT queries, mostly of pagination
+        self.sections = {}  # name: seconds
+        self.active = set()  # names of sections being timed
+        self.slow_queries = slow_queries
+        self.slowest = []  # heap of (seconds, sql)
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db += seconds
+        if sql.startswith("SELECT COUNT("):
+            self.count_queries += 1
+            self.count_db += seconds
+        if len(self.slowest) < self.slow_queries:
+            heapq.heappush(self.slowest, (seconds, sql))
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, sql))
+
+    def values(self, total, view, size):
+        """
+		Return {metric: value} of the finished request, times in milliseconds
+		"""
+
+        return {
+            "total_ms": total * 1000,
+            "view_ms": view * 1000,
+            "db_ms": self.db * 1000,
+            "count_ms": self.count_db * 1000,
+            "serialize_ms": self.sections.get("serialize", 0) * 1000,
+            "throttle_ms": self.sections.get("throttle", 0) * 1000,
+            "queries": self.queries,
+            "size": size,
+        }
+
+
+class timed:
+    """
+	Adds the time of its block, less queries run within, to a section of the
+	current request, a nested block of the same section counts once
+	"""
+
+    __slots__ = ("name", "timings", "start", "db")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        timings = self.timings = current.get()
+        if timings is None or self.name in timings.active:
+            self.timings = None
+            return
+        timings.active.add(self.name)
+        self.start = time.perf_counter()
+        self.db = timings.db
+
+    def __exit__(self, *exc_info):
+        timings = self.timings
+        if timings is None:
+            return
+        timings.active.discard(self.name)
+        elapsed = time.perf_counter() - self.start - (timings.db - self.db)
+        timings.sections[self.name] = timings.sections.get(self.name, 0) + elapsed
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # wrappers stay on the connection object when it reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """
+		Return the upper bound of the bucket holding the percentile, or the
+		largest value for the last bucket
+		"""
+
+        rank, seen = percent / 100 * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "p50": round(self.percentile(50), 3),
+            "p99": round(self.percentile(99), 3),
+            "buckets": {
+                str(bound): count for bound, count in zip(self.bounds, self.counts)
+            },
+        }
+
+
+class RouteMetrics:
+    """
+	Thread-safe histograms of request metrics per route, for at most
+	MAX_ROUTES routes of this process
+	"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}  # route: {metric: Histogram}
+
+    def record(self, route, values, max_routes):
+        with self.lock:
+            histograms = self.routes.get(route)
+            if histograms is None:
+                if len(self.routes) >= max_routes:
+                    route = OTHER_ROUTE
+                histograms = self.routes.setdefault(
+                    route,
+                    {metric: Histogram(bounds) for metric, bounds in BUCKETS.items()},
+                )
+            for metric, value in values.items():
+                if value is not None:
+                    histograms[metric].add(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: {
+                    metric: histogram.snapshot()
+                    for metric, histogram in histograms.items()
+                }
+                for route, histograms in self.routes.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+metrics = RouteMetrics()
+
+
+def server_timing(values, timings):
+    entries = [
+        f"total;dur={values['total_ms']:.1f}",
+        f"view;dur={values['view_ms']:.1f}",
+        f'db;dur={values["db_ms"]:.1f};desc="{timings.queries} queries"',
+        f'count;dur={values["count_ms"]:.1f};desc="{timings.count_queries} queries"',
+        f"serialize;dur={values['serialize_ms']:.1f}",
+        f"throttle;dur={values['throttle_ms']:.1f}",
+    ]
+    if values["size"] is not None:
+        entries.append(f'size;desc="{values["size"]} bytes"')
+    return ", ".join(entries)
+
+
+class PerformanceMiddleware:
+    """
+	Times SQL queries, the view, serialization and throttling of every request
+
+	The numbers go to the Server-Timing header and to per-route histograms of
+	metrics, requests slower than SLOW_REQUEST_MS of PERFORMANCE_INSTRUMENTATION
+	are logged with their slowest statements. Responses which stream are timed
+	until streaming starts and have no size. Without a request being timed,
+	queries cost one lookup of a context variable.
+	"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # marks instances as coroutine functions for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            # a sync method would run on the thread shared by sync views
+            self.process_view = self.process_view_async
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        config = get_config()
+        timings = RequestTimings(config["SLOW_QUERIES"])
+        token = current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, timings, config)
+        return response
+
+    async def __acall__(self, request):
+        config = get_config()
+        timings = RequestTimings(config["SLOW_QUERIES"])
+        token = current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, timings, config)
+        return response
+
+    @staticmethod
+    def start_view():
+        timings = current.get()
+        if timings is not None:
+            timings.view_start = time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view()
+
+    async def process_view_async(self, request, view_func, view_args, view_kwargs):
+        # self.process_view is this method on the async path
+        self.start_view()
+
+    def finish(self, request, response, timings, config):
+        end = time.perf_counter()
+        total = end - timings.start
+        view = end - timings.view_start if timings.view_start is not None else 0
+        size = None if response.streaming else len(response.content)
+        values = timings.values(total, view, size)
+        response["Server-Timing"] = server_timing(values, timings)
+
+        match = request.resolver_match
+        route = f"{request.method} {match.view_name if match else 'unresolved'}"
+        metrics.record(route, values, config["MAX_ROUTES"])
+
+        if values["total_ms"] >= config["SLOW_REQUEST_MS"]:
+            statements = "".join(
+                f"\n  {seconds * 1000:.1f}ms {sql[:500]}"
+                for seconds, sql in sorted(timings.slowest, reverse=True)
+            )
+            logger.warning(
+                "Slow request %s %s took %.1fms with %s queries in %.1fms%s",
+                request.method,
+                request.get_full_path(),
+                values["total_ms"],
+                timings.queries,
+                values["db_ms"],
+                statements,
+            )
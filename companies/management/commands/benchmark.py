@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from companies.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Measure rows per second of optimized code paths against their baselines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "suites", nargs="*", help=f"Suites to run: {', '.join(SUITES)} (all)"
+        )
+        parser.add_argument("--rows", type=int, default=2000, help="Rows per run")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+
+    def handle(self, *args, **options):
+        unknown = set(options["suites"]) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+        for suite in options["suites"] or SUITES:
+            for result in SUITES[suite](rows=options["rows"], repeat=options["repeat"]):
+                speedup = result.optimized / result.baseline if result.baseline else 0
+                self.stdout.write(
+                    f"{result.suite} {result.name}: {result.rows} rows, "
+                    f"{result.baseline:.0f} -> {result.optimized:.0f} rows/s "
+                    f"(x{speedup:.1f})"
+                )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from companies.renditions import build_renditions
+
+
+class Command(BaseCommand):
+    help = (
+        "Digest logos of companies and photos of employees and render their renditions"
+    )
+
+    def handle(self, *args, **options):
+        for name, rows in build_renditions().items():
+            self.stdout.write(self.style.SUCCESS(f"Updated digests of {rows} {name}"))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from companies.budgets import (
+    BUDGETS_PATH,
+    METRICS,
+    check_budgets,
+    load_budgets,
+    measure,
+    save_budgets,
+    seed_data,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database, measure queries and latency of every API route "
+        "and fail when a stored budget is exceeded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cases", nargs="*", help="Cases to measure (all)")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per case")
+        parser.add_argument("--companies", type=int, default=200)
+        parser.add_argument("--employees", type=int, default=10000)
+        parser.add_argument("--partnerships", type=int, default=1000)
+        parser.add_argument("--budgets", default=BUDGETS_PATH, help="Budgets file")
+        parser.add_argument(
+            "--update", action="store_true", help="Store measurements as budgets"
+        )
+
+    def handle(self, *args, **options):
+        # the test database keeps real data out, SQLite needs no server
+        runner = DiscoverRunner(verbosity=0)
+        runner.setup_test_environment()
+        databases = runner.setup_databases()
+        try:
+            seed_data(
+                companies=options["companies"],
+                employees=options["employees"],
+                partnerships=options["partnerships"],
+            )
+            measurements = measure(options["cases"], options["repeat"])
+        finally:
+            runner.teardown_databases(databases)
+            runner.teardown_test_environment()
+
+        self.stdout.write(f"{'case':<28}" + "".join(f"{m:>18}" for m in METRICS))
+        for measurement in measurements:
+            self.stdout.write(
+                f"{measurement.case:<28}"
+                + "".join(f"{getattr(measurement, m):>18}" for m in METRICS)
+            )
+
+        if options["update"]:
+            save_budgets(measurements, options["budgets"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Stored budgets in {options['budgets']}")
+            )
+            return
+
+        violations = check_budgets(measurements, load_budgets(options["budgets"]))
+        if violations:
+            raise CommandError("Budgets exceeded:\n" + "\n".join(violations))
+        self.stdout.write(self.style.SUCCESS("All cases within budget"))
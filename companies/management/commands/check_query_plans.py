@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from companies.queryplans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN every filter and ordering combination of the API on the current "
+        "database and report sequential scans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default", help="Database alias to explain on"
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print plans of findings"
+        )
+
+    def handle(self, *args, **options):
+        findings = check_query_plans(using=options["database"])
+
+        for finding in findings:
+            self.stdout.write(
+                f"{finding.model}: sequential scan of {finding.table} for "
+                f"{finding.params or 'search'} ordered by {finding.ordering or 'default'}"
+            )
+            if options["verbose_plans"]:
+                self.stdout.write(finding.plan)
+
+        if findings:
+            raise CommandError(f"{len(findings)} query plans use sequential scans")
+        self.stdout.write(self.style.SUCCESS("All query plans use indexes"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from companies.generate import DataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic dataset of professions, companies, employees and "
+        "partnerships with skewed sizes and clustered partnerships"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--companies", type=int, default=10000)
+        parser.add_argument("--professions", type=int, default=500)
+        parser.add_argument("--employees", type=int, default=1000000)
+        parser.add_argument("--partnerships", type=int, default=100000)
+        parser.add_argument(
+            "--batch-size", type=int, default=10000, help="Rows per insert"
+        )
+
+    def handle(self, *args, **options):
+        timings = DataGenerator(options["seed"], options["batch_size"]).generate(
+            options["companies"],
+            options["professions"],
+            options["employees"],
+            options["partnerships"],
+        )
+
+        for name, (rows, seconds) in timings.items():
+            if not rows:
+                self.stdout.write(f"Rebuilt {name} in {seconds:.1f}s")
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Inserted {rows} {name} in {seconds:.1f}s "
+                    f"({rows / max(seconds, 1e-9):.0f} rows/s)"
+                )
+            )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from companies.analytics import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute summary tables of employee analytics from the employee table"
+
+    def handle(self, *args, **options):
+        groups = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summaries of {groups} groups"))
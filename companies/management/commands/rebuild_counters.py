@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from companies.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute stored employee and partner counters of companies and professions"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = rebuild_counters()
+
+        for name, rows in updated.items():
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt counters of {rows} {name}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from companies.cache import bump_versions
+from companies.models import Company
+from companies.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild full-text search documents of all companies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default", help="Database alias to rebuild on"
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options["database"])
+        if backend is None:
+            raise CommandError("Full-text search is not supported by this database")
+
+        with transaction.atomic(using=options["database"]):
+            backend.rebuild()
+        # cached search results may be built from the old documents
+        bump_versions(Company)
+        self.stdout.write(self.style.SUCCESS("Rebuilt full-text search index"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from companies.throttling import SharedRateThrottle, get_throttle_store
+
+
+class Command(BaseCommand):
+    help = "Show rates and numbers of rejected requests of every throttle scope"
+
+    def handle(self, *args, **options):
+        rates = SharedRateThrottle.THROTTLE_RATES
+        rejections = get_throttle_store().rejections(list(rates))
+        for scope, rate in rates.items():
+            self.stdout.write(f"{scope}: {rate}, {rejections[scope]} rejected")
@@ -0,0 +1,156 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Company",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("logo", models.ImageField(upload_to="companies/logos")),
+                ("tagline", models.CharField(max_length=100)),
+                ("type_of_company", models.CharField(max_length=100)),
+                ("description", models.TextField()),
+                ("year_of_foundation", models.DateTimeField()),
+                ("country", models.CharField(max_length=100)),
+                ("phone_number", models.CharField(max_length=13)),
+                ("email", models.EmailField(max_length=100)),
+            ],
+            options={
+                "ordering": ("name",),
+            },
+        ),
+        migrations.CreateModel(
+            name="Profession",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("description", models.TextField()),
+            ],
+            options={
+                "ordering": ("name",),
+            },
+        ),
+        migrations.CreateModel(
+            name="PartnerShip",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "joint_products",
+                    models.CharField(blank=True, default="", max_length=250),
+                ),
+                ("year_partnership", models.DateTimeField(auto_now_add=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="companies.company",
+                    ),
+                ),
+                (
+                    "company_inviter",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="partnerships",
+                        to="companies.company",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-year_partnership",),
+                "unique_together": {("company", "company_inviter")},
+            },
+        ),
+        migrations.CreateModel(
+            name="Employee",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("age", models.PositiveSmallIntegerField()),
+                (
+                    "gender",
+                    models.CharField(
+                        choices=[("M", "Male"), ("F", "Female")],
+                        default="M",
+                        max_length=2,
+                    ),
+                ),
+                ("photo", models.ImageField(upload_to="employees/photos")),
+                ("hired_date", models.DateTimeField(auto_now_add=True)),
+                ("salary", models.PositiveIntegerField()),
+                ("promotion_date", models.DateTimeField()),
+                ("phone_number", models.CharField(max_length=13)),
+                ("email", models.EmailField(max_length=100)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="employees",
+                        to="companies.company",
+                    ),
+                ),
+                (
+                    "profession",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="employees",
+                        to="companies.profession",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("profession__name", "company__name", "name"),
+            },
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="partners",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="_company_partners_+",
+                through="companies.PartnerShip",
+                to="companies.Company",
+            ),
+        ),
+    ]
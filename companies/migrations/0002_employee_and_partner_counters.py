@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:01
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(model, field_name):
+    rows = (
+        model.objects.filter(**{field_name: OuterRef("pk")})
+        .order_by()
+        .values(field_name)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Profession = apps.get_model("companies", "Profession")
+    Company = apps.get_model("companies", "Company")
+    Employee = apps.get_model("companies", "Employee")
+    PartnerShip = apps.get_model("companies", "PartnerShip")
+
+    Profession.objects.update(employees_count=count_rows(Employee, "profession"))
+    Company.objects.update(
+        employees_count=count_rows(Employee, "company"),
+        partners_count=count_rows(PartnerShip, "company"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="employees_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="partners_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="profession",
+            name="employees_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
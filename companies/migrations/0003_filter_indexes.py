@@ -0,0 +1,107 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+# ^field searches of SearchFilter run UPPER("field"::text) LIKE UPPER('x%') on
+# PostgreSQL, which only an expression index with text_pattern_ops can serve
+PREFIX_SEARCH_INDEXES = (
+    ("profession_name_prefix_idx", "companies_profession", "name"),
+    ("employee_name_prefix_idx", "companies_employee", "name"),
+    ("company_name_prefix_idx", "companies_company", "name"),
+    ("company_type_prefix_idx", "companies_company", "type_of_company"),
+    ("company_country_prefix_idx", "companies_company", "country"),
+    ("partnership_products_prefix_idx", "companies_partnership", "joint_products"),
+)
+
+
+def create_prefix_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in PREFIX_SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX "{name}" ON "{table}" '
+            f'(UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in PREFIX_SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0002_employee_and_partner_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(fields=["type_of_company"], name="company_type_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["country", "type_of_company"], name="company_country_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["year_of_foundation"], name="company_foundation_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(fields=["salary"], name="employee_salary_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(fields=["age"], name="employee_age_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(fields=["hired_date"], name="employee_hired_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["promotion_date"], name="employee_promotion_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["company", "salary"], name="employee_company_salary_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["profession", "salary"], name="employee_profession_salary_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["gender", "age"], name="employee_gender_age_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="partnership",
+            index=models.Index(
+                fields=["year_partnership"], name="partnership_year_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="partnership",
+            index=models.Index(
+                fields=["company_inviter", "year_partnership"],
+                name="partnership_inviter_year_idx",
+            ),
+        ),
+        migrations.RunPython(create_prefix_search_indexes, drop_prefix_search_indexes),
+    ]
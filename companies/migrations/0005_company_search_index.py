@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# statements are written out rather than taken from companies.search, so that
+# later changes of the backends do not change what this migration does
+SEARCH_INDEX_SQL = {
+    "postgresql": (
+        (
+            "CREATE TABLE companies_company_search ("
+            "company_id integer PRIMARY KEY REFERENCES companies_company (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)",
+            "CREATE INDEX companies_company_search_document_idx "
+            "ON companies_company_search USING GIN (document)",
+            "INSERT INTO companies_company_search (company_id, document) "
+            "SELECT c.id, "
+            "setweight(to_tsvector('english', c.tagline), 'A') || "
+            "setweight(to_tsvector('english', c.description), 'B') || "
+            "setweight(to_tsvector('english', "
+            "coalesce(string_agg(p.joint_products, ' '), '')), 'C') "
+            "FROM companies_company c LEFT JOIN companies_partnership p "
+            "ON p.company_id = c.id OR p.company_inviter_id = c.id GROUP BY c.id",
+        ),
+        ("DROP TABLE IF EXISTS companies_company_search",),
+    ),
+    "sqlite": (
+        (
+            "CREATE VIRTUAL TABLE companies_company_fts "
+            "USING fts5(tagline, description, joint_products)",
+            "INSERT INTO companies_company_fts "
+            "(rowid, tagline, description, joint_products) "
+            "SELECT c.id, c.tagline, c.description, "
+            "coalesce(group_concat(p.joint_products, ' '), '') "
+            "FROM companies_company c LEFT JOIN companies_partnership p "
+            "ON p.company_id = c.id OR p.company_inviter_id = c.id GROUP BY c.id",
+        ),
+        ("DROP TABLE IF EXISTS companies_company_fts",),
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    create, _ = SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, ((), ()))
+    for sql in create:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    _, drop = SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, ((), ()))
+    for sql in drop:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0004_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
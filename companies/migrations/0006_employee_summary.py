@@ -0,0 +1,57 @@
+from django.db import migrations, models
+from companies.analytics import rebuild_summaries
+
+
+def fill_summaries(apps, schema_editor):
+    rebuild_summaries()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0005_company_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmployeeSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("all", "All employees"),
+                            ("profession", "Profession"),
+                            ("company", "Company"),
+                            ("country", "Country of company"),
+                            ("gender", "Gender"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=100)),
+                ("headcount", models.PositiveIntegerField(default=0)),
+                ("salary_sum", models.BigIntegerField(default=0)),
+                ("salary_min", models.PositiveIntegerField(null=True)),
+                ("salary_max", models.PositiveIntegerField(null=True)),
+                ("salary_sketch", models.JSONField(default=dict)),
+                ("ages", models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="employeesummary",
+            constraint=models.UniqueConstraint(
+                fields=("dimension", "key"), name="employee_summary_group_unique"
+            ),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
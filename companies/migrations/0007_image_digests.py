@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0006_employee_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="logo_digest",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="employee",
+            name="photo_digest",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
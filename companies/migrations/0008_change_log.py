@@ -0,0 +1,55 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0007_image_digests"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("txid", models.BigIntegerField(default=0)),
+                (
+                    "model",
+                    models.CharField(
+                        choices=[
+                            ("profession", "Profession"),
+                            ("company", "Company"),
+                            ("employee", "Employee"),
+                            ("partnership", "Partnership"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("create", "Create"),
+                            ("update", "Update"),
+                            ("delete", "Delete"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ("txid", "id"),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["txid", "id"], name="change_position_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["model", "txid", "id"], name="change_model_idx"),
+        ),
+    ]
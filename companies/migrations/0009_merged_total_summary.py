@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def delete_total_summaries(apps, schema_editor):
+    # totals of all employees are merged from gender groups when read
+    EmployeeSummary = apps.get_model("companies", "EmployeeSummary")
+    EmployeeSummary.objects.filter(dimension="all").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0008_change_log"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_total_summaries, migrations.RunPython.noop),
+    ]
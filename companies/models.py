@@ -1,32 +1,57 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 
 
-class Profession(models.Model):
+class ChangeLoggedModel(models.Model):
+    """
+	Base of models whose writes are appended to the change log
+
+	A save runs in a transaction with the receivers of post_save, which log
+	the change, deletes already run in one with post_delete.
+	"""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class Profession(ChangeLoggedModel):
     """
 	Model for representing profession
 	"""
 
     name = models.CharField(max_length=50, blank=False, unique=True)
     description = models.TextField(blank=False)
+    # kept up to date by companies.signals, rebuilt by rebuild_counters command
+    employees_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("name",)
 
     @property
     def count_employees(self):
-        return self.employees.count
+        return self.employees_count
 
     def __str__(self):
         return self.name
 
 
-class Company(models.Model):
+class Company(ChangeLoggedModel):
     """
 	Model for representing company
 	"""
 
     name = models.CharField(max_length=100, blank=False, unique=True)
     logo = models.ImageField(upload_to="companies/logos")
+    # sha256 of the logo, renditions are stored under it
+    logo_digest = models.CharField(max_length=64, blank=True, editable=False)
     tagline = models.CharField(max_length=100)
     type_of_company = models.CharField(max_length=100, blank=False)
     description = models.TextField()
@@ -37,23 +62,43 @@ class Company(models.Model):
     partners = models.ManyToManyField(
         "self", blank=True, through="PartnerShip"
     )  # 'self' = Company in this case, because partners are others companies
+    # partners.add() leaves its mirrored rows out of the change log, write
+    # partners through companies.partners.add_partners or assign_partners
+    # kept up to date by companies.signals, rebuilt by rebuild_counters command
+    employees_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    partners_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    # also touched when counters change or an embedded partnership is written
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("name",)
+        # indexes for CompanyFilter and ordering_fields of CompanyViewSet,
+        # prefix searches are served by indexes of 0003_filter_indexes
+        indexes = (
+            models.Index(fields=("type_of_company",), name="company_type_idx"),
+            models.Index(
+                fields=("country", "type_of_company"), name="company_country_idx"
+            ),
+            models.Index(fields=("year_of_foundation",), name="company_foundation_idx"),
+        )
 
     @property
     def count_employees(self):
-        return self.employees.count
+        return self.employees_count
 
     @property
     def count_partners(self):
-        return self.partners.count
+        return self.partners_count
 
     def __str__(self):
         return self.name
 
 
-class PartnerShip(models.Model):
+class PartnerShip(ChangeLoggedModel):
     """
 	Model for representing relationship between partners
 	"""
@@ -64,18 +109,29 @@ class PartnerShip(models.Model):
     )
     joint_products = models.CharField(max_length=250, blank=True, default="")
     year_partnership = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("-year_partnership",)
         unique_together = ("company", "company_inviter")
+        # indexes for PartnerShipFilter and the default ordering
+        indexes = (
+            models.Index(fields=("year_partnership",), name="partnership_year_idx"),
+            models.Index(
+                fields=("company_inviter", "year_partnership"),
+                name="partnership_inviter_year_idx",
+            ),
+        )
 
     def __str__(self):
-        return (
-            f"Partnership between {self.company_inviter.name} and {self.company.name}"
-        )
+        return self.describe(self.company_inviter.name, self.company.name)
 
+    @staticmethod
+    def describe(company_inviter_name, company_name):
+        return f"Partnership between {company_inviter_name} and {company_name}"
 
-class Employee(models.Model):
+
+class Employee(ChangeLoggedModel):
     """
 	Model for representing employee
 	"""
@@ -91,6 +147,8 @@ class Employee(models.Model):
         max_length=2, choices=GENDER_CHOICES, default=MALE, blank=False
     )
     photo = models.ImageField(upload_to="employees/photos")
+    # sha256 of the photo, renditions are stored under it
+    photo_digest = models.CharField(max_length=64, blank=True, editable=False)
     hired_date = models.DateTimeField(auto_now_add=True)
     company = models.ForeignKey(
         Company, related_name="employees", on_delete=models.CASCADE
@@ -102,9 +160,110 @@ class Employee(models.Model):
     promotion_date = models.DateTimeField()
     phone_number = models.CharField(max_length=13)
     email = models.EmailField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("profession__name", "company__name", "name")
+        # indexes for range filters of EmployeeFilter and ordering_fields of
+        # EmployeeViewSet, composite ones serve ranges within a company,
+        # a profession or a gender
+        indexes = (
+            models.Index(fields=("salary",), name="employee_salary_idx"),
+            models.Index(fields=("age",), name="employee_age_idx"),
+            models.Index(fields=("hired_date",), name="employee_hired_idx"),
+            models.Index(fields=("promotion_date",), name="employee_promotion_idx"),
+            models.Index(
+                fields=("company", "salary"), name="employee_company_salary_idx"
+            ),
+            models.Index(
+                fields=("profession", "salary"), name="employee_profession_salary_idx"
+            ),
+            models.Index(fields=("gender", "age"), name="employee_gender_age_idx"),
+        )
 
     def __str__(self):
         return self.name
+
+
+class EmployeeSummary(models.Model):
+    """
+	Model for representing salaries, headcount and ages of employees of a group
+
+	Rows are maintained by signals on every write of employees, see
+	companies.analytics, and can be rebuilt with rebuild_analytics command.
+	The group of all employees has no row, it is merged from genders.
+	"""
+
+    # For choice in dimension's attribute
+    ALL = "all"
+    PROFESSION = "profession"
+    COMPANY = "company"
+    COUNTRY = "country"
+    GENDER = "gender"
+    DIMENSION_CHOICES = (
+        (ALL, "All employees"),
+        (PROFESSION, "Profession"),
+        (COMPANY, "Company"),
+        (COUNTRY, "Country of company"),
+        (GENDER, "Gender"),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    # pk of profession or company, name of country or gender
+    key = models.CharField(max_length=100, blank=True)
+    headcount = models.PositiveIntegerField(default=0)
+    salary_sum = models.BigIntegerField(default=0)
+    salary_min = models.PositiveIntegerField(null=True)
+    salary_max = models.PositiveIntegerField(null=True)
+    salary_sketch = models.JSONField(default=dict)  # buckets of SalarySketch
+    ages = models.JSONField(default=dict)  # number of employees per age
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("dimension", "key"), name="employee_summary_group_unique"
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.key}".strip()
+
+
+class Change(models.Model):
+    """
+	Model for representing one write of a row, an entry of the change feed
+
+	Rows are only appended, by companies.changes in the transaction of the
+	write, and are read in order of (txid, id), see ChangeFeedViewSet.
+	"""
+
+    # For choice in action's attribute
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    ACTION_CHOICES = ((CREATE, "Create"), (UPDATE, "Update"), (DELETE, "Delete"))
+    MODEL_CHOICES = (
+        ("profession", "Profession"),
+        ("company", "Company"),
+        ("employee", "Employee"),
+        ("partnership", "Partnership"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    # id of the writing transaction on PostgreSQL, where ids of rows are taken
+    # before commit, 0 on SQLite, which commits one transaction at a time
+    txid = models.BigIntegerField(default=0)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ("txid", "id")
+        indexes = (
+            models.Index(fields=("txid", "id"), name="change_position_idx"),
+            models.Index(fields=("model", "txid", "id"), name="change_model_idx"),
+        )
+
+    def __str__(self):
+        return f"{self.action} of {self.model} {self.object_id}"
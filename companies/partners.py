@@ -0,0 +1,137 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.sql import DeleteQuery
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from companies.models import PartnerShip
+from companies.signals import partnerships_bulk_changed
+
+
+class PartnerLinksField(serializers.ManyRelatedField):
+    """
+	Hyperlinks of many companies resolved to their ids with one query instead
+	of one per hyperlink
+	"""
+
+    def to_internal_value(self, data):
+        values = super().to_internal_value(data)  # lookup values of hyperlinks
+        child = self.child_relation
+        queryset = child.get_queryset()
+        if child.lookup_field == "pk":
+            field = queryset.model._meta.pk
+        else:
+            field = queryset.model._meta.get_field(child.lookup_field)
+        try:
+            values = {field.to_python(value) for value in values}
+        except DjangoValidationError:
+            child.fail("does_not_exist")
+        pks = dict(
+            queryset.filter(**{f"{child.lookup_field}__in": values}).values_list(
+                child.lookup_field, "pk"
+            )
+        )
+        if len(pks) < len(values):
+            child.fail("does_not_exist")
+        return list(pks.values())
+
+
+class PartnerLinkField(serializers.HyperlinkedRelatedField):
+    """
+	Writable hyperlink of a company, PartnerLinksField checks that it exists
+	"""
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        return view_kwargs[self.lookup_url_kwarg]
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return PartnerLinksField(**list_kwargs)
+
+
+def delete_partnerships(pks):
+    """
+	Delete partnerships by ids with one statement and without sending
+	pre_delete and post_delete
+
+	QuerySet.delete() sends both for every row, so queries of their receivers
+	would grow with the number of rows, partnerships_bulk_changed sent by the
+	caller replaces them. Nothing cascades from partnerships.
+	"""
+
+    query = DeleteQuery(PartnerShip)
+    query.add_q(Q(pk__in=list(pks)))
+    return query.do_query(
+        PartnerShip._meta.db_table, query.where, router.db_for_write(PartnerShip)
+    )
+
+
+def assign_partners(company, partner_ids, symmetric=True, keep=False):
+    """
+	Make companies of partner_ids the partners of company, return
+	(company_id, company_inviter_id) pairs of inserted and of deleted rows
+
+	Current partnerships are read with one query, missing ones inserted with
+	one bulk insert and the others removed with one delete. Symmetric mode
+	leaves company with exactly the rows of each partner in both directions,
+	as symmetrical partners.set() writes them, otherwise only rows in which
+	company is the partner change. With keep no rows are removed.
+	"""
+
+    partnerships = PartnerShip.objects.filter(company=company)
+    wanted = {(company.pk, partner_id) for partner_id in partner_ids}
+    if symmetric:
+        partnerships = PartnerShip.objects.filter(
+            Q(company=company) | Q(company_inviter=company)
+        )
+        wanted |= {(partner_id, company.pk) for partner_id in partner_ids}
+    rows = partnerships.values_list("pk", "company_id", "company_inviter_id")
+    current = {(company_id, inviter_id): pk for pk, company_id, inviter_id in rows}
+
+    added = wanted - current.keys()
+    removed = set() if keep else current.keys() - wanted
+    added_ids, removed_ids = [], [current[pair] for pair in removed]
+    with transaction.atomic(savepoint=False):
+        if added:
+            # rows inserted by a concurrent write meanwhile are kept
+            PartnerShip.objects.bulk_create(
+                [
+                    PartnerShip(company_id=company_id, company_inviter_id=inviter_id)
+                    for company_id, inviter_id in sorted(added)
+                ],
+                ignore_conflicts=True,
+            )
+            # ids of ignored inserts are not returned
+            added_ids = [
+                pk
+                for pk, company_id, inviter_id in rows.all()
+                if (company_id, inviter_id) in added
+            ]
+        if removed:
+            delete_partnerships(removed_ids)
+        if added or removed:
+            partnerships_bulk_changed.send(
+                sender=PartnerShip,
+                added=added,
+                removed=removed,
+                added_ids=added_ids,
+                removed_ids=removed_ids,
+            )
+    return added, removed
+
+
+def add_partners(company, partner_ids, symmetric=True):
+    """
+	Add companies of partner_ids to the partners of company, return
+	(company_id, company_inviter_id) pairs of inserted rows
+
+	Unlike partners.add(), which inserts the mirrored rows of symmetrical
+	partners without a signal, rows of both directions are inserted with one
+	bulk insert and reach the change log, counters and graph.
+	"""
+
+    return assign_partners(company, partner_ids, symmetric, keep=True)[0]
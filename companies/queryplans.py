@@ -0,0 +1,123 @@
+import re
+from collections import namedtuple
+from itertools import chain
+from django.db import connections
+from django.db.models import Q
+from django_filters import ChoiceFilter, DateTimeFilter
+from companies.views import (
+    ProfessionViewSet,
+    EmployeeViewSet,
+    CompanyViewSet,
+    PartnerShipView,
+)
+
+# viewsets whose declared filters, search and ordering fields are checked
+CHECKED_VIEWSETS = (ProfessionViewSet, EmployeeViewSet, CompanyViewSet, PartnerShipView)
+
+# patterns of EXPLAIN output, which mean that a whole table is read
+FULL_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(\w+)(?:\s+AS \w+)?\s*$"),
+}
+
+PlanFinding = namedtuple(
+    "PlanFinding", ("model", "params", "ordering", "table", "plan")
+)
+
+
+def sample_value(queryset, field_name, filter_field):
+    """
+	Take a value of field_name from the seeded data in the form a client sends
+	"""
+
+    if isinstance(filter_field, ChoiceFilter):
+        return next((value for value, _ in filter_field.field.choices if value), None)
+
+    value = (
+        queryset.order_by()
+        .exclude(**{f"{field_name}__isnull": True})
+        .values_list(field_name, flat=True)
+        .first()
+    )
+    if value is None:
+        return None
+    if isinstance(filter_field, DateTimeFilter):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def filter_combinations(viewset, vendor):
+    """
+	Yield (query params, search Q, ordering) of every combination to explain
+
+	Each declared filter is combined with the default ordering and with each of
+	ordering_fields. Prefix searches are checked only on PostgreSQL, because
+	LIKE of SQLite ignores ordinary indexes.
+	"""
+
+    queryset = viewset.queryset
+    filterset_class = viewset.filter_class
+    orderings = (None, *viewset.ordering_fields)
+
+    for name, filter_field in filterset_class.base_filters.items():
+        value = sample_value(queryset, filter_field.field_name, filter_field)
+        if value is None:
+            continue
+        for ordering in orderings:
+            yield {name: value}, Q(), ordering
+
+    if vendor != "postgresql":
+        return
+
+    for search_field in viewset.search_fields:
+        if not search_field.startswith("^"):
+            continue
+        field_name = search_field[1:]
+        value = sample_value(queryset, field_name, None)
+        if value:
+            search = Q(**{f"{field_name}__istartswith": value[:3]})
+            for ordering in orderings:
+                yield {}, search, ordering
+
+
+def full_scans(plan, vendor):
+    """
+	Return names of tables which the plan reads sequentially
+	"""
+
+    pattern = FULL_SCAN_PATTERNS.get(vendor)
+    if pattern is None:
+        return set()
+    return set(chain.from_iterable(pattern.findall(line) for line in plan.splitlines()))
+
+
+def check_query_plans(viewsets=CHECKED_VIEWSETS, using="default"):
+    """
+	EXPLAIN filter combinations of viewsets and report sequential scans
+
+	Only scans of the filtered table are reported, small joined tables are
+	allowed to be read whole. The database should be seeded beforehand.
+	"""
+
+    vendor = connections[using].vendor
+    findings = []
+
+    for viewset in viewsets:
+        model = viewset.queryset.model
+        table = model._meta.db_table
+
+        for params, search, ordering in filter_combinations(viewset, vendor):
+            filterset = viewset.filter_class(
+                data=params, queryset=model.objects.using(using).all()
+            )
+            queryset = filterset.qs.filter(search)
+            if ordering:
+                queryset = queryset.order_by(ordering)
+
+            plan = queryset.explain()
+            if table in full_scans(plan, vendor):
+                findings.append(
+                    PlanFinding(model.__name__, params, ordering, table, plan)
+                )
+
+    return findings
@@ -0,0 +1,141 @@
+import io
+import math
+from decimal import Decimal
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # JSON goes through the json module of the standard library
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is offered only when msgpack is installed
+    msgpack = None
+
+# orjson writes floats from 1e16 and below 1e-4 unlike the json module, as
+# 1e16, 2.5e-7 or 0.00001, which have these marks once digits become 0, the
+# check may also match strings and is faster than a regular expression
+ZERO_DIGITS = bytes.maketrans(b"123456789E", b"000000000e")
+DIFFERENT_FLOAT_MARKS = (b"0e", b"0.0000")
+# orjson reads integers beyond 64 bits, which have 19 digits and more, as floats
+LONG_INTEGER_MARK = b"0" * 19
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+def has_non_finite(data):
+    """
+	Return whether data holds NaN or infinite numbers, which orjson writes as
+	null while JSONRenderer rejects them or writes NaN and Infinity
+	"""
+
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, Decimal):
+        return not data.is_finite()
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+	JSONRenderer which encodes with orjson, byte for byte as JSONRenderer does
+
+	Values orjson does not know, dates included, go through the encoder of
+	JSONRenderer. Output which orjson may write differently, non-finite
+	numbers, indented output and settings other than compact unicode JSON are
+	rendered by JSONRenderer.
+	"""
+
+    def can_encode(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None or not self.can_encode(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            rendered = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            # integers over 64 bits, keys which are not strings and the like
+            return super().render(data, accepted_media_type, renderer_context)
+        zeroed = rendered.translate(ZERO_DIGITS)
+        if any(mark in zeroed for mark in DIFFERENT_FLOAT_MARKS):
+            return super().render(data, accepted_media_type, renderer_context)
+        # non-finite numbers became null, data is searched for them only then
+        if b"null" in rendered and has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in rendered:
+                rendered = rendered.replace(separator, escaped)
+        return rendered
+
+
+class FastJSONParser(JSONParser):
+    """
+	JSONParser which decodes with orjson, bodies orjson rejects or may read
+	differently are parsed by JSONParser, which also reports their errors
+	"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        body = stream.read() if stream is not None else b""
+        if (
+            orjson is not None
+            and encoding.lower() in ("utf-8", "utf8")
+            and LONG_INTEGER_MARK not in body.translate(ZERO_DIGITS)
+        ):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+	Renders data as MessagePack, values without a MessagePack type are
+	converted as JSONRenderer converts them
+	"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=JSONRenderer.encoder_class().default)
+
+
+class MessagePackParser(BaseParser):
+    """
+	Parses MessagePack bodies, maps with keys which are not strings included
+	"""
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
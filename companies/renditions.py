@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from PIL import Image
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Now
+from rest_framework import serializers
+from companies.cache import bump_versions
+from companies.changes import record_changes
+from companies.models import Company, Employee, Change
+
+logger = logging.getLogger(__name__)
+
+# name: (longest side in pixels, format)
+RENDITIONS = {
+    "thumbnail": (128, "JPEG"),
+    "thumbnail_webp": (128, "WEBP"),
+    "medium_webp": (512, "WEBP"),
+}
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+DONE_MARKER = ".done"  # written after every rendition of an image
+
+# image field: field with digest of its content
+IMAGE_FIELDS = {
+    Company: {"logo": "logo_digest"},
+    Employee: {"photo": "photo_digest"},
+}
+
+
+def file_digest(file):
+    """
+	Return sha256 of content of a FieldFile or "" if there is no readable file
+	"""
+
+    if not file:
+        return ""
+    digest = hashlib.sha256()
+    try:
+        file.open("rb")
+        for chunk in file.chunks():
+            digest.update(chunk)
+    except OSError:
+        return ""
+    finally:
+        # an upload is still read when the instance is saved
+        if file._committed:
+            file.close()
+    return digest.hexdigest()
+
+
+def rendition_path(digest, name=None):
+    """
+	Return directory of renditions of content with digest or path of one of them
+	"""
+
+    path = os.path.join(settings.MEDIA_ROOT, "renditions", digest[:2], digest)
+    if name is None:
+        return path
+    return os.path.join(path, f"{name}.{EXTENSIONS[RENDITIONS[name][1]]}")
+
+
+def rendition_urls(digest):
+    return {
+        name: f"{settings.MEDIA_URL}renditions/{digest[:2]}/{digest}/"
+        f"{name}.{EXTENSIONS[format]}"
+        for name, (_, format) in RENDITIONS.items()
+    }
+
+
+def render(source, target):
+    """
+	Write every rendition of the image at path source, or in bytes source, into
+	directory target, runs in worker processes
+	"""
+
+    os.makedirs(target, exist_ok=True)
+    largest = max(size for size, _ in RENDITIONS.values())
+    with Image.open(source if isinstance(source, str) else BytesIO(source)) as image:
+        # JPEG originals are decoded right at a reduced scale
+        image.draft("RGB", (largest, largest))
+        image.load()
+        for name, (size, format) in RENDITIONS.items():
+            rendition = image.copy()
+            rendition.thumbnail((size, size))
+            if format == "JPEG" and rendition.mode not in ("RGB", "L"):
+                rendition = rendition.convert("RGB")
+            path = os.path.join(target, f"{name}.{EXTENSIONS[format]}")
+            # readers never see a partly written file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            rendition.save(temporary, format, quality=80)
+            os.replace(temporary, path)
+    open(os.path.join(target, DONE_MARKER), "w").close()
+
+
+def image_source(file):
+    try:
+        return file.path
+    except NotImplementedError:
+        # storages without local paths send the content to workers
+        with file.open("rb"):
+            return file.read()
+
+
+class RenditionQueue:
+    """
+	Renders images in a pool of RENDITION_WORKERS processes, each content once
+
+	Renditions are stored by digest of the content, so an upload of bytes which
+	were rendered before, for any image, costs only a check of the directory.
+	With RENDITION_WORKERS = 0 images are rendered right away.
+	"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = {}  # digest: future of its rendering
+
+    def is_rendered(self, digest):
+        return os.path.exists(os.path.join(rendition_path(digest), DONE_MARKER))
+
+    def submit(self, digest, file):
+        """
+		Render image file with content of digest unless it is already done or
+		queued, return future of the rendering or None
+		"""
+
+        if not digest or self.is_rendered(digest):
+            return None
+        with self.lock:
+            if digest in self.pending:
+                return self.pending[digest]
+            if not settings.RENDITION_WORKERS:
+                render(image_source(file), rendition_path(digest))
+                return None
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(settings.RENDITION_WORKERS)
+            future = self.executor.submit(
+                render, image_source(file), rendition_path(digest)
+            )
+            self.pending[digest] = future
+        # outside the lock, a callback of a finished future runs right away
+        future.add_done_callback(lambda done: self.finish(digest, done))
+        return future
+
+    def finish(self, digest, future):
+        with self.lock:
+            self.pending.pop(digest, None)
+        if future.exception() is not None:
+            logger.warning(
+                "Rendering of image %s failed", digest, exc_info=future.exception()
+            )
+
+
+queue = RenditionQueue()
+
+
+def build_renditions():
+    """
+	Digest images of every row and render missing renditions, return
+	{model name: number of rows whose digest changed}
+	"""
+
+    changed, futures = {}, []
+    for model, fields in IMAGE_FIELDS.items():
+        changed[model._meta.verbose_name_plural] = 0
+        for field, digest_field in fields.items():
+            rows = model._default_manager.order_by().only("pk", field, digest_field)
+            for row in rows.iterator(chunk_size=1000):
+                file = getattr(row, field)
+                digest = file_digest(file)
+                if digest != getattr(row, digest_field):
+                    # validators of cached representations change with it
+                    with transaction.atomic():
+                        model._default_manager.filter(pk=row.pk).update(
+                            **{digest_field: digest, "updated_at": Now()}
+                        )
+                        record_changes(model, [row.pk], Change.UPDATE)
+                    changed[model._meta.verbose_name_plural] += 1
+                futures.append(queue.submit(digest, file))
+        if changed[model._meta.verbose_name_plural]:
+            bump_versions(model)
+
+    for future in futures:
+        if future is not None:
+            future.exception()  # waits, failures are logged by the queue
+    return changed
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """
+	Absolute urls of renditions of an image by name, null for no image
+
+	Urls depend only on the digest of the content, a rendition of a new image
+	is available shortly after its upload, the original stays at its field.
+	"""
+
+    def __init__(self, digest_field, **kwargs):
+        self.digest_field = digest_field
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        digest = getattr(instance, self.digest_field)
+        if not digest:
+            return None
+        request = self.context.get("request")
+        urls = rendition_urls(digest)
+        if request is None:
+            return urls
+        return {name: request.build_absolute_uri(url) for name, url in urls.items()}
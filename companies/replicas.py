@@ -0,0 +1,92 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+# replica which reads of the request being handled go to, None for default
+current_replica = ContextVar("current_replica", default=None)
+
+DEFAULTS = {"ALIASES": {}, "STICKY_SECONDS": 5, "CACHE": "default"}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "READ_REPLICAS", {})}
+
+
+def client_key(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        client = f"user:{user.pk}"
+    else:
+        client = BaseThrottle().get_ident(request)
+    return f"replica-sticky:{client}"
+
+
+def choose_replica(request, config=None):
+    """
+	Return a replica alias chosen by weight for reads of a safe request, or
+	None when reads go to default
+	"""
+
+    config = config or get_config()
+    aliases = config["ALIASES"]
+    if not aliases or request.method not in SAFE_METHODS:
+        return None
+    # clients see their own writes until replicas have caught up
+    if caches[config["CACHE"]].get(client_key(request)):
+        return None
+    return random.choices(list(aliases), weights=list(aliases.values()))[0]
+
+
+def stick_to_primary(request, config=None):
+    config = config or get_config()
+    if config["ALIASES"]:
+        caches[config["CACHE"]].set(
+            client_key(request), True, timeout=config["STICKY_SECONDS"]
+        )
+
+
+class ReplicaRouter:
+    """
+	Sends reads of requests which ReplicaReadMixin handles on a replica to it,
+	writes of rows read from replicas and every other query to default
+	"""
+
+    def db_for_read(self, model, **hints):
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in get_config()["ALIASES"]:
+            return DEFAULT_DB_ALIAS  # rows read from a replica change on default
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the rows of the primary
+        databases = {DEFAULT_DB_ALIAS, *get_config()["ALIASES"]}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+	Reads safe requests from a replica of READ_REPLICAS chosen by weight
+
+	After a successful write a client reads from default for STICKY_SECONDS,
+	which should be longer than the replication lag, so it sees its changes.
+	"""
+
+    def dispatch(self, request, *args, **kwargs):
+        config = get_config()
+        token = current_replica.set(choose_replica(request, config))
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            current_replica.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            stick_to_primary(request, config)
+        return response
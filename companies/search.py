@@ -0,0 +1,212 @@
+import re
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from companies.models import Company, PartnerShip
+
+COMPANY_TABLE = Company._meta.db_table
+PARTNERSHIP_TABLE = PartnerShip._meta.db_table
+
+
+class SearchBackend:
+    """
+	Maintained full-text index over tagline and description of companies and
+	joint products of partnerships each company takes part in
+	"""
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def create_index(self):
+        raise NotImplementedError
+
+    def drop_index(self):
+        raise NotImplementedError
+
+    def index(self, company_ids):
+        """
+		Rebuild documents of given companies, missing companies are removed
+		"""
+
+        raise NotImplementedError
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {COMPANY_TABLE}")
+            ids = [row[0] for row in cursor.fetchall()]
+        self.index(ids)
+
+    def search(self, queryset, text):
+        """
+		Return matching companies annotated with search_rank, higher is better
+		"""
+
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+	Weighted tsvector documents in a table with a GIN index
+	"""
+
+    table = "companies_company_search"
+    config = "english"
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {self.table} ("
+                f"company_id integer PRIMARY KEY REFERENCES {COMPANY_TABLE} (id) "
+                "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX {self.table}_document_idx ON {self.table} "
+                "USING GIN (document)"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, company_ids):
+        company_ids = list(company_ids)
+        if not company_ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE company_id = ANY(%s)", [company_ids]
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table} (company_id, document) "
+                "SELECT c.id, "
+                "setweight(to_tsvector(%(config)s, c.tagline), 'A') || "
+                "setweight(to_tsvector(%(config)s, c.description), 'B') || "
+                "setweight(to_tsvector(%(config)s, "
+                "coalesce(string_agg(p.joint_products, ' '), '')), 'C') "
+                f"FROM {COMPANY_TABLE} c LEFT JOIN {PARTNERSHIP_TABLE} p "
+                "ON p.company_id = c.id OR p.company_inviter_id = c.id "
+                "WHERE c.id = ANY(%(ids)s) GROUP BY c.id",
+                {"config": self.config, "ids": company_ids},
+            )
+
+    def search(self, queryset, text):
+        query = "plainto_tsquery(%s, %s)"
+        matches = RawSQL(
+            f"SELECT company_id FROM {self.table} WHERE document @@ {query}",
+            (self.config, text),
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, {query}) FROM {self.table} "
+            f"WHERE company_id = {COMPANY_TABLE}.id",
+            (self.config, text),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+	FTS5 shadow table whose rowid is id of company, ranked by bm25
+	"""
+
+    table = "companies_company_fts"
+    # bm25 weights of tagline, description and joint_products columns
+    weights = (10.0, 5.0, 1.0)
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {self.table} "
+                "USING fts5(tagline, description, joint_products)"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, company_ids):
+        company_ids = list(company_ids)
+        # stay below the limit of variables in one statement
+        for start in range(0, len(company_ids), 500):
+            batch = company_ids[start : start + 500]
+            placeholders = ", ".join(["%s"] * len(batch))
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                    batch,
+                )
+                cursor.execute(
+                    f"INSERT INTO {self.table} "
+                    "(rowid, tagline, description, joint_products) "
+                    "SELECT c.id, c.tagline, c.description, "
+                    "coalesce(group_concat(p.joint_products, ' '), '') "
+                    f"FROM {COMPANY_TABLE} c LEFT JOIN {PARTNERSHIP_TABLE} p "
+                    "ON p.company_id = c.id OR p.company_inviter_id = c.id "
+                    f"WHERE c.id IN ({placeholders}) GROUP BY c.id",
+                    batch,
+                )
+
+    def search(self, queryset, text):
+        # quoted terms keep FTS5 query syntax out of user input
+        terms = re.findall(r"\w+", text)
+        query = " ".join(f'"{term}"' for term in terms) or '""'
+        weights = ", ".join(str(weight) for weight in self.weights)
+
+        matches = RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", (query,)
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}, {weights}) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = {COMPANY_TABLE}.id",
+            (query,),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using="default"):
+    """
+	Return backend from FULL_TEXT_SEARCH_BACKEND or the one of the database
+	"""
+
+    path = getattr(settings, "FULL_TEXT_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)(using)
+
+    backend_class = SEARCH_BACKENDS.get(connections[using].vendor)
+    return backend_class(using) if backend_class else None
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+	Filter companies by full-text search in tagline, description and joint
+	products, results are ordered by rank unless ordering is given
+	"""
+
+    search_param = "text"
+    ordering_param = "ordering"
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "").strip()
+        if not text:
+            return queryset
+
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return queryset.none()
+
+        queryset = backend.search(queryset, text)
+        if not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by("-search_rank", "pk")
+        return queryset
@@ -1,9 +1,38 @@
+from django.db import transaction
 from rest_framework import serializers
+from companies.embed import EmbedSerializerMixin
 from companies.models import Profession, Company, Employee, PartnerShip
+from companies.partners import PartnerLinkField, assign_partners
+from companies.renditions import RenditionsField
+from companies.sparse import SparseFieldsMixin
 from crm.settings import DATETIME_FORMAT
 
 
-class ProfessionSerializer(serializers.ModelSerializer):
+class FormattedDateTimeField(serializers.DateTimeField):
+    """
+	DateTimeField which formats each distinct value once per serializer
+
+	Dates of a list repeat a lot and strftime is slow, the formatted values
+	are kept for the rows of one response, at most max_formatted of them.
+	"""
+
+    max_formatted = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formatted = {}  # value: representation
+
+    def to_representation(self, value):
+        representation = self.formatted.get(value)
+        if representation is None:
+            if len(self.formatted) >= self.max_formatted:
+                self.formatted.clear()
+            representation = super().to_representation(value)
+            self.formatted[value] = representation
+        return representation
+
+
+class ProfessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent list of professions
 	"""
@@ -17,7 +46,7 @@ class ProfessionSerializer(serializers.ModelSerializer):
         fields = ("name", "url")
 
 
-class ProfessionEmployeeSerializer(serializers.ModelSerializer):
+class ProfessionEmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent employee model in profession model
 	"""
@@ -29,30 +58,39 @@ class ProfessionEmployeeSerializer(serializers.ModelSerializer):
         read_only=True, slug_field="name"
     )  # name of related company to this employee
 
+    related_fields = {"company": ("company",)}
+
     class Meta:
         model = Employee
         fields = ("name", "company", "url")
 
 
-class DetailProfessionSerializer(serializers.ModelSerializer):
+class DetailProfessionSerializer(
+    SparseFieldsMixin, EmbedSerializerMixin, serializers.ModelSerializer
+):
     """
 	Serializer for represent detail information of profession
 	"""
 
-    employees = ProfessionEmployeeSerializer(
-        many=True, read_only=True
-    )  # represent all employees related to this profession
     number_of_employees = serializers.IntegerField(
         source="count_employees", read_only=True
     )
     # number of employees that are belong to this profession
+    employees_url = serializers.HyperlinkedIdentityField(
+        view_name="companies:profession-employees", lookup_url_kwarg="profession_pk"
+    )  # url to paginated employees of this profession
+
+    # ?embed=employees adds employees related to this profession
+    embeddable = {
+        "employees": ("employees", ProfessionEmployeeSerializer, ("company",)),
+    }
 
     class Meta:
         model = Profession
-        fields = ("name", "description", "number_of_employees", "employees")
+        fields = ("name", "description", "number_of_employees", "employees_url")
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent list of employees
 	"""
@@ -67,12 +105,19 @@ class EmployeeSerializer(serializers.ModelSerializer):
         read_only=True, slug_field="name"
     )  # name of related company to this employee
 
+    related_fields = {"profession": ("profession",), "company": ("company",)}
+    # ?expand=profession,company shows them instead of their names
+    expandable_fields = {
+        "profession": ("companies.serializers.ProfessionSerializer", ("profession",)),
+        "company": ("companies.serializers.CompanySerializer", ("company",)),
+    }
+
     class Meta:
         model = Employee
         fields = ("name", "profession", "company", "url")
 
 
-class DetailEmployeeSerializer(serializers.ModelSerializer):
+class DetailEmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent detail information of employee
 	"""
@@ -83,12 +128,21 @@ class DetailEmployeeSerializer(serializers.ModelSerializer):
     company = serializers.HyperlinkedRelatedField(
         queryset=Company.objects.all(), view_name="companies:company-detail"
     )  # name of related company to this employee
-    hired_date = serializers.DateTimeField(
+    hired_date = FormattedDateTimeField(
         format=DATETIME_FORMAT
     )  # hired date with new format
-    promotion_date = serializers.DateTimeField(
+    promotion_date = FormattedDateTimeField(
         format=DATETIME_FORMAT
     )  # promotion date with new format
+    photo_renditions = RenditionsField(
+        digest_field="photo_digest"
+    )  # urls of thumbnails and webp variants of the photo
+
+    # ?expand=profession,company shows them instead of their urls
+    expandable_fields = {
+        "profession": ("companies.serializers.ProfessionSerializer", ("profession",)),
+        "company": ("companies.serializers.CompanySerializer", ("company",)),
+    }
 
     class Meta:
         model = Employee
@@ -97,6 +151,7 @@ class DetailEmployeeSerializer(serializers.ModelSerializer):
             "age",
             "gender",
             "photo",
+            "photo_renditions",
             "hired_date",
             "company",
             "profession",
@@ -107,7 +162,7 @@ class DetailEmployeeSerializer(serializers.ModelSerializer):
         )
 
 
-class PartnerShipSerializer(serializers.ModelSerializer):
+class PartnerShipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent list of partnerships
 	"""
@@ -119,12 +174,14 @@ class PartnerShipSerializer(serializers.ModelSerializer):
         view_name="companies:partnership-detail"
     )  # url to detail page for partnership
 
+    related_fields = {"info": ("company", "company_inviter")}
+
     class Meta:
         model = PartnerShip
         fields = ("info", "url")
 
 
-class DetailPartnerShipSerializer(serializers.ModelSerializer):
+class DetailPartnerShipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent detail information of partnerships
 	"""
@@ -141,6 +198,16 @@ class DetailPartnerShipSerializer(serializers.ModelSerializer):
     )
     # name of company, which starts partnerships with company
 
+    related_fields = {"info": ("company", "company_inviter")}
+    # ?expand=company,company_inviter shows them instead of their urls
+    expandable_fields = {
+        "company": ("companies.serializers.CompanySerializer", ("company",)),
+        "company_inviter": (
+            "companies.serializers.CompanySerializer",
+            ("company_inviter",),
+        ),
+    }
+
     class Meta:
         model = PartnerShip
         fields = (
@@ -152,7 +219,7 @@ class DetailPartnerShipSerializer(serializers.ModelSerializer):
         )
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent list of companies
 	"""
@@ -160,7 +227,7 @@ class CompanySerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(
         view_name="companies:company-detail"
     )  # url to detail page for company
-    year_of_foundation = serializers.DateTimeField(
+    year_of_foundation = FormattedDateTimeField(
         format=DATETIME_FORMAT
     )  # date of foundation with new format
     number_of_employees = serializers.IntegerField(
@@ -184,7 +251,7 @@ class CompanySerializer(serializers.ModelSerializer):
         )
 
 
-class CompanyEmployeeSerializer(serializers.ModelSerializer):
+class CompanyEmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
 	Serializer for represent employee model in company model
 	"""
@@ -196,42 +263,65 @@ class CompanyEmployeeSerializer(serializers.ModelSerializer):
         read_only=True, slug_field="name"
     )  # name of related profession to this employee
 
+    related_fields = {"profession": ("profession",)}
+
     class Meta:
         model = Employee
         fields = ("name", "profession", "url")
 
 
-class DetailCompanySerializer(serializers.ModelSerializer):
+class DetailCompanySerializer(
+    SparseFieldsMixin, EmbedSerializerMixin, serializers.ModelSerializer
+):
     """
 	Serializer for represent detail information of company
 	"""
 
-    employees = CompanyEmployeeSerializer(
-        many=True, read_only=True
-    )  # represent all employees related to this company
-    partners = serializers.HyperlinkedRelatedField(
+    partners = PartnerLinkField(
         queryset=Company.objects.all(),
         many=True,
         view_name="companies:company-detail",
         write_only=True,
     )
     # represent companies that are partners to this company
-    year_of_foundation = serializers.DateTimeField(
+    logo_renditions = RenditionsField(
+        digest_field="logo_digest"
+    )  # urls of thumbnails and webp variants of the logo
+    year_of_foundation = FormattedDateTimeField(
         format=DATETIME_FORMAT
     )  # date of foundation with new format
-    partnerships = PartnerShipSerializer(many=True, read_only=True)
     number_of_employees = serializers.IntegerField(
         source="count_employees", read_only=True
     )  # number of employees that are belong to this company
     number_of_partners = serializers.IntegerField(
         source="count_partners", read_only=True
     )  # number of company that have partnership with this company
+    employees_url = serializers.HyperlinkedIdentityField(
+        view_name="companies:company-employees", lookup_url_kwarg="company_pk"
+    )  # url to paginated employees of this company
+    partnerships_url = serializers.HyperlinkedIdentityField(
+        view_name="companies:company-partnerships", lookup_url_kwarg="company_pk"
+    )  # url to paginated partnerships invited by this company
+
+    # partnerships are written in both directions, as partners.set() does
+    symmetric_partners = True
+
+    # ?embed=employees,partnerships adds related employees and partnerships
+    embeddable = {
+        "employees": ("employees", CompanyEmployeeSerializer, ("profession",)),
+        "partnerships": (
+            "partnerships",
+            PartnerShipSerializer,
+            ("company", "company_inviter"),
+        ),
+    }
 
     class Meta:
         model = Company
         fields = (
             "name",
             "logo",
+            "logo_renditions",
             "tagline",
             "type_of_company",
             "description",
@@ -242,6 +332,30 @@ class DetailCompanySerializer(serializers.ModelSerializer):
             "partners",
             "number_of_employees",
             "number_of_partners",
-            "partnerships",
-            "employees",
+            "employees_url",
+            "partnerships_url",
+        )
+
+    def create(self, validated_data):
+        partner_ids = validated_data.pop("partners", None)
+        with transaction.atomic():
+            company = super().create(validated_data)
+            if partner_ids is not None:
+                self.assign_partners(company, partner_ids)
+        return company
+
+    def update(self, instance, validated_data):
+        partner_ids = validated_data.pop("partners", None)
+        with transaction.atomic():
+            company = super().update(instance, validated_data)
+            if partner_ids is not None:
+                self.assign_partners(company, partner_ids)
+        return company
+
+    def assign_partners(self, company, partner_ids):
+        added, removed = assign_partners(
+            company, partner_ids, symmetric=self.symmetric_partners
         )
+        if added or removed:
+            # the counter was recounted in the database
+            company.refresh_from_db(fields=("partners_count", "updated_at"))
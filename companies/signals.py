@@ -0,0 +1,381 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.models.signals import (
+    post_init,
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
+from django.dispatch import Signal, receiver
+from companies.analytics import (
+    EmployeeFacts,
+    employee_facts,
+    change_summaries,
+    move_company,
+)
+from companies.cache import bump_versions, forget_names
+from companies.changes import record_changes
+from companies.counters import change_counter, recount_employees, recount_partners
+from companies.graph import snapshot as graph_snapshot
+from companies.models import Profession, Company, Employee, PartnerShip, Change
+from companies.renditions import IMAGE_FIELDS, file_digest, queue as rendition_queue
+from companies.search import get_search_backend
+
+# sent by bulk writes, which bypass post_save, with ids of companies and
+# professions whose employees were created, updated or moved, with ids of
+# created and updated employees and with EmployeeFacts of updated employees
+# before (previous) and of all after (saved)
+employees_bulk_saved = Signal()
+# sent by bulk writes of partnerships, which bypass post_save and post_delete,
+# with (company_id, company_inviter_id) pairs and with ids of inserted and
+# deleted rows
+partnerships_bulk_changed = Signal()
+
+
+@receiver(post_init, sender=Employee)
+@receiver(post_init, sender=PartnerShip)
+def remember_counted_relations(sender, instance, **kwargs):
+    # __dict__ is used so that deferred fields are not loaded
+    instance._counted_company_id = instance.__dict__.get("company_id")
+    instance._counted_profession_id = instance.__dict__.get("profession_id")
+
+
+@receiver(post_save, sender=Employee)
+def count_saved_employee(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    for model, attname in ((Company, "company_id"), (Profession, "profession_id")):
+        counted = None if created else getattr(instance, f"_counted_{attname}")
+        current = getattr(instance, attname)
+        if counted != current:
+            change_counter(model, counted, "employees_count", -1)
+            change_counter(model, current, "employees_count", 1)
+
+    remember_counted_relations(sender, instance)
+
+
+@receiver(post_delete, sender=Employee)
+def count_deleted_employee(sender, instance, **kwargs):
+    change_counter(Company, instance.company_id, "employees_count", -1)
+    change_counter(Profession, instance.profession_id, "employees_count", -1)
+
+
+@receiver(post_save, sender=PartnerShip)
+def count_saved_partnership(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    counted = None if created else instance._counted_company_id
+    if counted != instance.company_id:
+        change_counter(Company, counted, "partners_count", -1)
+        change_counter(Company, instance.company_id, "partners_count", 1)
+
+    remember_counted_relations(sender, instance)
+    touch_company_inviter(instance)
+
+
+@receiver(post_delete, sender=PartnerShip)
+def count_deleted_partnership(sender, instance, **kwargs):
+    change_counter(Company, instance.company_id, "partners_count", -1)
+    touch_company_inviter(instance)
+
+
+def touch_company_inviter(partnership):
+    # detail of the inviter embeds its partnerships, see ConditionalGetMixin
+    Company.objects.filter(pk=partnership.company_inviter_id).update(updated_at=Now())
+
+
+@receiver(m2m_changed, sender=Company.partners.through)
+def count_added_partners(sender, instance, action, pk_set, **kwargs):
+    # partners.add() and partners.set() insert rows through bulk_create, so
+    # post_save is not sent for them
+    if action != "post_add" or not pk_set:
+        return
+
+    change_counter(Company, instance.pk, "partners_count", len(pk_set))
+    # inviters of the inserted rows
+    Company.objects.filter(pk__in=pk_set).update(updated_at=Now())
+
+    if Company._meta.get_field("partners").remote_field.symmetrical:
+        # mirrored rows are inserted right after this signal without one
+        mirrored = PartnerShip.objects.filter(
+            company__in=pk_set, company_inviter=instance
+        ).values_list("company_id", flat=True)
+        Company.objects.filter(pk__in=pk_set - set(mirrored)).update(
+            partners_count=F("partners_count") + 1, updated_at=Now()
+        )
+        record_changes(Company, pk_set - set(mirrored), Change.UPDATE)
+
+
+@receiver(post_save, sender=Profession)
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=PartnerShip)
+@receiver(post_delete, sender=Profession)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=PartnerShip)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_versions(sender)
+    # bump once more after commit, a response built from the old rows could be
+    # cached under the new version while the transaction was open
+    transaction.on_commit(lambda: bump_versions(sender))
+
+
+@receiver(post_save, sender=Profession)
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Profession)
+@receiver(post_delete, sender=Company)
+def invalidate_cached_names(sender, **kwargs):
+    # names label groups of analytics, see group_names
+    forget_names(sender)
+    transaction.on_commit(lambda: forget_names(sender))
+
+
+@receiver(m2m_changed, sender=Company.partners.through)
+def invalidate_cached_partners(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_cached_responses(PartnerShip)
+
+
+@receiver(employees_bulk_saved)
+def count_bulk_saved_employees(sender, company_ids, profession_ids, **kwargs):
+    recount_employees(company_ids, profession_ids)
+    invalidate_cached_responses(Employee)
+
+
+@receiver(partnerships_bulk_changed)
+def count_bulk_changed_partnerships(sender, added=(), removed=(), **kwargs):
+    # recounting touches inviters as well, which embed their partnerships
+    recount_partners({company_id for pair in (*added, *removed) for company_id in pair})
+    invalidate_cached_responses(PartnerShip)
+
+
+@receiver(post_init, sender=Employee)
+def remember_summarized_facts(sender, instance, **kwargs):
+    instance._summarized_facts = employee_facts(instance)
+
+
+@receiver(pre_save, sender=Employee)
+@receiver(pre_delete, sender=Employee)
+def load_summarized_facts(sender, instance, raw=False, **kwargs):
+    # a partially loaded employee is read before its row is overwritten
+    if raw or instance._state.adding or instance._summarized_facts is not None:
+        return
+    row = (
+        Employee.objects.filter(pk=instance.pk)
+        .values_list(*EmployeeFacts._fields)
+        .first()
+    )
+    instance._summarized_facts = row and EmployeeFacts(*row)
+
+
+@receiver(post_save, sender=Employee)
+def summarize_saved_employee(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = None if created else instance._summarized_facts
+    current = EmployeeFacts(
+        *(getattr(instance, field) for field in EmployeeFacts._fields)
+    )
+    if previous != current:
+        change_summaries(removed=[previous], added=[current])
+    instance._summarized_facts = current
+
+
+@receiver(post_delete, sender=Employee)
+def summarize_deleted_employee(sender, instance, **kwargs):
+    change_summaries(removed=[instance._summarized_facts])
+
+
+@receiver(employees_bulk_saved)
+def summarize_bulk_saved_employees(sender, previous=(), saved=(), **kwargs):
+    change_summaries(removed=previous, added=saved)
+
+
+@receiver(post_init, sender=Company)
+def remember_summarized_country(sender, instance, **kwargs):
+    instance._summarized_country = instance.__dict__.get("country")
+
+
+@receiver(post_save, sender=Company)
+def summarize_moved_company(sender, instance, created, raw=False, **kwargs):
+    country = instance._summarized_country
+    if not raw and not created and country is not None and country != instance.country:
+        move_company(instance.pk, country, instance.country)
+    instance._summarized_country = instance.country
+
+
+def index_companies(company_ids, using):
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.index(company_ids)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def index_company(sender, instance, raw=False, using="default", **kwargs):
+    if not raw:
+        index_companies([instance.pk], using)
+
+
+@receiver(post_save, sender=PartnerShip)
+@receiver(post_delete, sender=PartnerShip)
+def index_partnership(sender, instance, raw=False, using="default", **kwargs):
+    # joint products are a part of documents of both companies
+    if not raw:
+        index_companies({instance.company_id, instance.company_inviter_id}, using)
+
+
+@receiver(m2m_changed, sender=Company.partners.through)
+def index_added_partners(sender, instance, action, pk_set, using="default", **kwargs):
+    if action == "post_add" and pk_set:
+        index_companies({instance.pk, *pk_set}, using)
+
+
+@receiver(partnerships_bulk_changed)
+def index_bulk_changed_partnerships(sender, added=(), removed=(), **kwargs):
+    index_companies(
+        {company_id for pair in (*added, *removed) for company_id in pair}, "default"
+    )
+
+
+@receiver(post_init, sender=PartnerShip)
+def remember_graphed_pair(sender, instance, **kwargs):
+    instance._graphed_pair = (
+        instance.__dict__.get("company_id"),
+        instance.__dict__.get("company_inviter_id"),
+    )
+
+
+@receiver(post_save, sender=PartnerShip)
+@receiver(post_delete, sender=PartnerShip)
+def graph_partnership(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    graph_snapshot.record(
+        {instance._graphed_pair, (instance.company_id, instance.company_inviter_id)}
+    )
+    remember_graphed_pair(sender, instance)
+
+
+@receiver(m2m_changed, sender=Company.partners.through)
+def graph_changed_partners(sender, instance, action, pk_set, **kwargs):
+    if action == "pre_clear":
+        # partners are gone by post_clear, which carries no pk_set
+        instance._cleared_partners = set(
+            PartnerShip.objects.filter(company=instance).values_list(
+                "company_inviter_id", flat=True
+            )
+        ) | set(
+            PartnerShip.objects.filter(company_inviter=instance).values_list(
+                "company_id", flat=True
+            )
+        )
+    elif action == "post_clear":
+        graph_snapshot.record(
+            {(instance.pk, partner) for partner in instance._cleared_partners}
+        )
+    elif action in ("post_add", "post_remove") and pk_set:
+        graph_snapshot.record({(instance.pk, partner) for partner in pk_set})
+
+
+@receiver(partnerships_bulk_changed)
+def graph_bulk_changed_partnerships(sender, added=(), removed=(), **kwargs):
+    graph_snapshot.record({*added, *removed})
+
+
+@receiver(post_init, sender=Company)
+@receiver(post_init, sender=Employee)
+def remember_image_names(sender, instance, **kwargs):
+    # __dict__ holds the stored name until the field is accessed
+    instance._image_names = {
+        field: getattr(
+            instance.__dict__.get(field), "name", instance.__dict__.get(field)
+        )
+        for field in IMAGE_FIELDS[sender]
+    }
+
+
+@receiver(pre_save, sender=Company)
+@receiver(pre_save, sender=Employee)
+def digest_images(sender, instance, raw=False, **kwargs):
+    instance._new_images = []
+    if raw:
+        return
+    for field, digest_field in IMAGE_FIELDS[sender].items():
+        if field not in instance.__dict__:
+            continue  # deferred and so unchanged
+        file = getattr(instance, field)
+        if (
+            not instance._state.adding
+            and file._committed
+            and file.name == instance._image_names[field]
+        ):
+            continue
+        digest = file_digest(file)
+        setattr(instance, digest_field, digest)
+        if digest:
+            instance._new_images.append((digest, file))
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Employee)
+def render_images(sender, instance, raw=False, **kwargs):
+    for digest, file in instance._new_images:
+        # the upload is stored by now, workers read it after commit
+        transaction.on_commit(
+            lambda digest=digest, file=file: rendition_queue.submit(digest, file)
+        )
+    remember_image_names(sender, instance)
+
+
+@receiver(post_save, sender=Profession)
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=PartnerShip)
+def log_saved_row(sender, instance, created, raw=False, using="default", **kwargs):
+    if not raw:
+        action = Change.CREATE if created else Change.UPDATE
+        record_changes(sender, [instance.pk], action, using)
+
+
+@receiver(post_delete, sender=Profession)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=PartnerShip)
+def log_deleted_row(sender, instance, using="default", **kwargs):
+    # rows removed by partners.remove() and partners.clear() get post_delete
+    record_changes(sender, [instance.pk], Change.DELETE, using)
+
+
+@receiver(m2m_changed, sender=Company.partners.through)
+def log_added_partners(sender, instance, action, pk_set, using="default", **kwargs):
+    # mirrored rows of symmetrical partners are inserted after this signal
+    # without one, companies.partners.add_partners logs them as well
+    if action == "post_add" and pk_set:
+        record_changes(
+            PartnerShip,
+            PartnerShip.objects.using(using)
+            .filter(company=instance, company_inviter__in=pk_set)
+            .values_list("pk", flat=True),
+            Change.CREATE,
+            using,
+        )
+
+
+@receiver(employees_bulk_saved)
+def log_bulk_saved_employees(sender, created_ids=(), updated_ids=(), **kwargs):
+    record_changes(Employee, created_ids, Change.CREATE)
+    record_changes(Employee, updated_ids, Change.UPDATE)
+
+
+@receiver(partnerships_bulk_changed)
+def log_bulk_changed_partnerships(sender, added_ids=(), removed_ids=(), **kwargs):
+    record_changes(PartnerShip, added_ids, Change.CREATE)
+    record_changes(PartnerShip, removed_ids, Change.DELETE)
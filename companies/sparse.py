@@ -0,0 +1,147 @@
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from companies.instrumentation import timed
+
+FIELDS_QUERY_PARAM = "fields"
+EXPAND_QUERY_PARAM = "expand"
+
+
+def split_param(request, name):
+    """
+	Return set of comma separated values of a query parameter or None if absent
+	"""
+
+    if request is None or name not in request.query_params:
+        return None
+    value = request.query_params[name]
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+def reject_unknown(name, values, known):
+    unknown = values - set(known)
+    if unknown:
+        raise ValidationError(
+            {
+                name: [
+                    f"Unknown {', '.join(sorted(unknown))}, "
+                    f"choose from: {', '.join(known)}."
+                ]
+            }
+        )
+
+
+class SparseFieldsMixin:
+    """
+	Limits the representation to fields named in ?fields= and replaces fields
+	named in ?expand= with nested representations of related objects
+
+	Only the serializer of the view is affected, nested and embedded ones keep
+	all their fields. optional_fields are returned only when named in ?fields=.
+	"""
+
+    optional_fields = ("id",)
+    # name of field: relations it reads, which are joined only if it is shown
+    related_fields = {}
+    # name of field: (dotted path of serializer class, relations it reads)
+    expandable_fields = {}
+
+    @classmethod
+    def get_output_fields(cls, request):
+        requested = split_param(request, FIELDS_QUERY_PARAM)
+        # writes validate and return every field
+        if requested is None or request.method not in SAFE_METHODS:
+            return list(cls.Meta.fields)
+
+        known = (*cls.Meta.fields, *cls.optional_fields)
+        reject_unknown(FIELDS_QUERY_PARAM, requested, known)
+        return [name for name in known if name in requested]
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        requested = split_param(request, EXPAND_QUERY_PARAM)
+        # expanded fields are read-only, writes keep the related fields
+        if not requested or request.method not in SAFE_METHODS:
+            return set()
+
+        reject_unknown(EXPAND_QUERY_PARAM, requested, tuple(cls.expandable_fields))
+        return requested & set(cls.get_output_fields(request))
+
+    @classmethod
+    def get_select_related(cls, request):
+        """
+		Return relations that fields shown for the request read
+		"""
+
+        expanded = cls.get_expanded_fields(request)
+        relations = set()
+        for name in cls.get_output_fields(request):
+            if name in expanded:
+                relations.update(cls.expandable_fields[name][1])
+            else:
+                relations.update(cls.related_fields.get(name, ()))
+        return sorted(relations)
+
+    def is_sparse(self):
+        if self.context.get("embedded"):
+            return False
+        parent = getattr(self, "parent", None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_field_names(self, declared_fields, info):
+        field_names = super().get_field_names(declared_fields, info)
+        if not self.is_sparse():
+            return field_names
+        return self.get_output_fields(self.context.get("request"))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.is_sparse():
+            for name in self.get_expanded_fields(self.context.get("request")):
+                serializer_class = import_string(self.expandable_fields[name][0])
+                fields[name] = serializer_class(read_only=True)
+        return fields
+
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
+
+class SparseQuerysetMixin:
+    """
+	Joins only relations read by the fields a client asked for and leaves
+	updated_at of relations which are not shown out of validators of details
+	"""
+
+    def get_select_related(self):
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, "get_select_related"):
+            return []
+        return serializer_class.get_select_related(self.request)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        related = self.get_select_related()
+        return queryset.select_related(*related) if related else queryset
+
+    def drop_hidden_changes(self, paths):
+        model = self.queryset.model
+        related = self.get_select_related()
+        kept = []
+        for path in paths:
+            relation, separator, _ = path.partition("__")
+            field = model._meta.get_field(relation) if separator else None
+            if field is not None and field.many_to_one:
+                if not any(
+                    name == relation or name.startswith(f"{relation}__")
+                    for name in related
+                ):
+                    continue
+            kept.append(path)
+        return kept
+
+    def get_detail_change_fields(self):
+        return self.drop_hidden_changes(super().get_detail_change_fields())
@@ -1,3 +1,1866 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from companies import urls as companies_urls
+from companies.analytics import rebuild_summaries
+from companies.bulk import EmployeeBulkLoader
+from companies.budgets import CASES, check_budgets, load_budgets, measure, seed_data
+from companies.cache import CachedResponseMixin, metrics
+from companies.generate import DataGenerator
+from companies.graph import PartnerGraph, snapshot as graph_snapshot
+from companies.instrumentation import metrics as request_metrics
+from companies.models import (
+    Profession,
+    Company,
+    Employee,
+    PartnerShip,
+    EmployeeSummary,
+    Change,
+)
+from companies.partners import add_partners, assign_partners
+from companies.queryplans import check_query_plans
+from companies.renditions import rendition_path
+from companies.renderers import FastJSONParser, FastJSONRenderer, msgpack
+from companies.replicas import ReplicaRouter
+from companies.search import get_search_backend
+from companies.serializers import DetailCompanySerializer, FormattedDateTimeField
+from companies.throttling import (
+    CacheThrottleStore,
+    SQLiteThrottleStore,
+    get_throttle_store,
+)
+from companies.views import EmployeeViewSet
+from crm.asgi import application as asgi_application
+from crm.settings import DATETIME_FORMAT
 
-# Create your tests here.
+# tests clear counters of anonymous requests, so they get a store of their own
+throttle_dir = tempfile.TemporaryDirectory()
+throttle_settings = override_settings(
+    API_THROTTLE_STORE={
+        "BACKEND": "companies.throttling.SQLiteThrottleStore",
+        "OPTIONS": {"path": os.path.join(throttle_dir.name, "throttle.sqlite3")},
+    }
+)
+
+
+def setUpModule():
+    throttle_settings.enable()
+
+
+def tearDownModule():
+    throttle_settings.disable()
+    throttle_dir.cleanup()
+
+
+def server_timing(response):
+    """
+	Return {name: (duration, description)} of the Server-Timing header
+	"""
+
+    entries = {}
+    for entry in response["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        params = dict(param.split("=", 1) for param in params)
+        entries[name] = (params.get("dur"), params.get("desc", "").strip('"'))
+    return entries
+
+
+def create_company(name, **kwargs):
+    fields = {
+        "logo": "companies/logos/logo.png",
+        "tagline": f"{name} tagline",
+        "type_of_company": "IT",
+        "description": f"{name} description",
+        "year_of_foundation": timezone.now(),
+        "country": "Ukraine",
+        "phone_number": "+380000000000",
+        "email": "info@example.com",
+    }
+    fields.update(kwargs)
+    return Company.objects.create(name=name, **fields)
+
+
+def create_profession(name, **kwargs):
+    fields = {"description": f"{name} description"}
+    fields.update(kwargs)
+    return Profession.objects.create(name=name, **fields)
+
+
+def create_employee(name, company, profession, **kwargs):
+    fields = {
+        "age": 30,
+        "gender": Employee.MALE,
+        "photo": "employees/photos/photo.png",
+        "salary": 1000,
+        "promotion_date": timezone.now(),
+        "phone_number": "+380000000000",
+        "email": "employee@example.com",
+    }
+    fields.update(kwargs)
+    return Employee.objects.create(
+        name=name, company=company, profession=profession, **fields
+    )
+
+
+class APITestCase(TestCase):
+    """
+	Base test case with seeded companies, professions, employees and partnerships
+	"""
+
+    companies = 6
+    professions = 3
+    employees_per_company = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        professions = [
+            create_profession(f"Profession {index}") for index in range(cls.professions)
+        ]
+        companies = [
+            create_company(f"Company {index}") for index in range(cls.companies)
+        ]
+
+        for company_index, company in enumerate(companies):
+            for index in range(cls.employees_per_company):
+                create_employee(
+                    f"Employee {company_index}-{index}",
+                    company,
+                    professions[index % len(professions)],
+                )
+
+        for inviter, company in zip(companies, companies[1:]):
+            PartnerShip.objects.create(company=company, company_inviter=inviter)
+
+        cls.company = companies[1]
+        cls.profession = professions[0]
+        cls.employee = cls.company.employees.first()
+        cls.partnership = PartnerShip.objects.first()
+
+    def setUp(self):
+        # anonymous requests are throttled through the shared store
+        get_throttle_store().clear()
+        caches["api"].clear()
+        metrics.reset()
+        self.client = APIClient()
+
+
+class QueryCountTests(APITestCase):
+    """
+	Every page and detail page costs a constant number of SQL queries
+	"""
+
+    # details pay one aggregate query for ETag and Last-Modified, lists none
+
+    def assertConstantQueries(self, url, number):
+        with self.assertNumQueries(number):
+            response = self.client.get(url, {"limit": 8})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_company_list(self):
+        response = self.assertConstantQueries(reverse("companies:company-list"), 2)
+        company = response.data["results"][1]
+        self.assertEqual(company["number_of_employees"], self.employees_per_company)
+        self.assertEqual(company["number_of_partners"], 1)
+
+    def test_company_detail(self):
+        response = self.assertConstantQueries(
+            reverse("companies:company-detail", args=(self.company.pk,)), 2
+        )
+        self.assertNotIn("employees", response.data)
+        self.assertEqual(response.data["number_of_partners"], 1)
+
+    def test_company_detail_with_embeds(self):
+        url = reverse("companies:company-detail", args=(self.company.pk,))
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {"embed": "employees,partnerships"})
+        self.assertEqual(len(response.data["employees"]), self.employees_per_company)
+        self.assertEqual(len(response.data["partnerships"]), 1)
+
+    def test_employee_list(self):
+        response = self.assertConstantQueries(reverse("companies:employee-list"), 2)
+        self.assertEqual(len(response.data["results"]), 8)
+
+    def test_employee_detail(self):
+        self.assertConstantQueries(
+            reverse("companies:employee-detail", args=(self.employee.pk,)), 2
+        )
+
+    def test_profession_list(self):
+        self.assertConstantQueries(reverse("companies:profession-list"), 2)
+
+    def test_profession_detail(self):
+        response = self.assertConstantQueries(
+            reverse("companies:profession-detail", args=(self.profession.pk,)), 2
+        )
+        self.assertEqual(
+            response.data["number_of_employees"], self.profession.employees.count()
+        )
+
+    def test_partnership_list(self):
+        self.assertConstantQueries(reverse("companies:partnership-list"), 2)
+
+    def test_partnership_detail(self):
+        self.assertConstantQueries(
+            reverse("companies:partnership-detail", args=(self.partnership.pk,)), 2
+        )
+
+
+class NestedRouteTests(APITestCase):
+    """
+	Related lists are paginated under their parent and embedded only on request
+	"""
+
+    def test_company_employees(self):
+        url = reverse("companies:company-employees", args=(self.company.pk,))
+        response = self.client.get(url, {"limit": 2})
+        self.assertEqual(response.data["count"], self.employees_per_company)
+        self.assertEqual(len(response.data["results"]), 2)
+
+        response = self.client.get(url, {"min_age": 31})
+        self.assertEqual(response.data["count"], 0)
+
+    def test_profession_employees(self):
+        url = reverse("companies:profession-employees", args=(self.profession.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.data["count"], self.profession.employees.count())
+
+    def test_company_partnerships(self):
+        url = reverse("companies:company-partnerships", args=(self.company.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.data["count"], self.company.partnerships.count())
+
+    def test_missing_parent(self):
+        url = reverse("companies:company-employees", args=(0,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_links_in_detail(self):
+        response = self.client.get(
+            reverse("companies:profession-detail", args=(self.profession.pk,))
+        )
+        self.assertTrue(
+            response.data["employees_url"].endswith(
+                reverse("companies:profession-employees", args=(self.profession.pk,))
+            )
+        )
+
+    def test_embed_below_first_level_is_ignored(self):
+        company = Company.objects.get(pk=self.company.pk)
+        request = APIRequestFactory().get("/", {"embed": "employees"})
+        context = {"request": Request(request)}
+        self.assertIn(
+            "employees", DetailCompanySerializer(company, context=context).data
+        )
+        nested = DetailCompanySerializer(company, context={**context, "embedded": True})
+        self.assertNotIn("employees", nested.data)
+
+        # companies in the change feed are nested representations
+        cursor = self.client.get(reverse("companies:change-head")).data["cursor"]
+        company.save()
+        response = self.client.get(
+            reverse("companies:change-list"), {"cursor": cursor, "embed": "employees"}
+        )
+        self.assertNotIn("employees", response.data["results"][0]["data"])
+
+    def test_embed_is_capped(self):
+        url = reverse("companies:company-detail", args=(self.company.pk,))
+        with mock.patch.object(DetailCompanySerializer, "embed_limit", 2):
+            response = self.client.get(url, {"embed": "employees"})
+        self.assertEqual(len(response.data["employees"]), 2)
+        self.assertEqual(
+            response.data["number_of_employees"], self.employees_per_company
+        )
+
+    def test_unknown_embed(self):
+        url = reverse("companies:company-detail", args=(self.company.pk,))
+        self.assertEqual(self.client.get(url, {"embed": "salaries"}).status_code, 400)
+
+
+class SparseFieldsTests(APITestCase):
+    """
+	Only requested fields are serialized and only their relations are joined
+	"""
+
+    def test_requested_fields(self):
+        response = self.client.get(
+            reverse("companies:company-list"), {"fields": "id,name", "limit": 2}
+        )
+        self.assertEqual(
+            response.data["results"][0],
+            {"id": Company.objects.first().pk, "name": Company.objects.first().name},
+        )
+
+    def test_unrequested_relations_are_not_joined(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("companies:partnership-list"), {"fields": "url"}
+            )
+        self.assertEqual(set(response.data["results"][0]), {"url"})
+        self.assertFalse(
+            any("JOIN" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_expand(self):
+        response = self.client.get(
+            reverse("companies:employee-detail", args=(self.employee.pk,)),
+            {"expand": "company"},
+        )
+        self.assertEqual(response.data["company"]["name"], self.company.name)
+        self.assertTrue(response.data["profession"].startswith("http"))
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            reverse("companies:profession-list"), {"fields": "name,salary"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ValuesListTests(APITestCase):
+    """
+	Lists built from values() render exactly like the list serializers
+	"""
+
+    def test_output_equals_serializers(self):
+        cases = (
+            ("companies:company-list", (), {}),
+            ("companies:company-list", (), {"fields": "id,year_of_foundation"}),
+            ("companies:employee-list", (), {"ordering": "-age", "limit": 8}),
+            ("companies:employee-list", (), {"cursor": ""}),
+            ("companies:profession-list", (), {}),
+            ("companies:partnership-list", (), {}),
+            ("companies:company-employees", (self.company.pk,), {}),
+        )
+        for name, args, params in cases:
+            with self.subTest(name=name, params=params):
+                url = reverse(name, args=args)
+                fast = self.client.get(url, params)
+                get_throttle_store().clear()
+                caches["api"].clear()
+                with mock.patch("companies.values.get_columns", return_value=None):
+                    slow = self.client.get(url, params)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark", "serialization", rows=10, repeat=1, stdout=out)
+        self.assertIn("serialization employee: 10 rows", out.getvalue())
+
+
+class RendererTests(APITestCase):
+    """
+	orjson renders and parses JSON exactly as JSONRenderer and JSONParser do,
+	MessagePack is negotiated when msgpack is installed
+	"""
+
+    def assertSameJSON(self, data, **context):
+        self.assertEqual(
+            FastJSONRenderer().render(data, renderer_context=context),
+            JSONRenderer().render(data, renderer_context=context),
+        )
+
+    def test_responses_are_unchanged(self):
+        for name in ("company-list", "employee-list", "partnership-list"):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(f"companies:{name}"))
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_values_json_writes_differently(self):
+        values = (
+            [1.5, 0.0001, 1e16, 1e-05, -2.5e-07, 1.2345678901234568e17],
+            {"line": "a\u2028b\u2029c", "text": "ÿ 😀 \x00"},
+            {"date": timezone.now(), "utc": timezone.now().date()},
+            {
+                "decimal": Decimal("1.10"),
+                "uuid": uuid.uuid4(),
+                "lazy": gettext_lazy("x"),
+            },
+            {"big": 2**70, 1: "key which is no string"},
+        )
+        for data in values:
+            with self.subTest(data=data):
+                self.assertSameJSON(data)
+        self.assertSameJSON({"a": [1, 2]}, indent=4)
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_non_finite_numbers(self):
+        for value in (float("nan"), float("inf"), -float("inf"), Decimal("NaN")):
+            with self.subTest(value=value):
+                with self.assertRaisesMessage(ValueError, "not JSON compliant"):
+                    FastJSONRenderer().render({"value": [value], "other": None})
+
+        class LenientRenderer(FastJSONRenderer):
+            strict = False
+
+        self.assertEqual(LenientRenderer().render([float("nan"), None]), b"[NaN,null]")
+        self.assertSameJSON({"value": 1.5, "other": None})
+
+    def test_parser(self):
+        for body in (
+            b'{"a": [1, 2.5, "\\u00ff"]}',
+            b'{"big": 100000000000000000000000}',
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(
+                    FastJSONParser().parse(BytesIO(body)),
+                    JSONParser().parse(BytesIO(body)),
+                )
+        with self.assertRaisesMessage(ParseError, "JSON parse error"):
+            FastJSONParser().parse(BytesIO(b"{broken"))
+
+        response = self.client.patch(
+            reverse("companies:profession-detail", args=[self.profession.pk]),
+            '{"description": "Parsed"}',
+            content_type="application/json",
+        )
+        self.assertEqual(response.data["description"], "Parsed")
+
+    def test_dates_are_formatted_once(self):
+        date = timezone.now()
+        field = FormattedDateTimeField(format=DATETIME_FORMAT)
+        with mock.patch.object(
+            serializers.DateTimeField, "to_representation", return_value="formatted"
+        ) as to_representation:
+            self.assertEqual(
+                [field.to_representation(date) for _ in range(3)], ["formatted"] * 3
+            )
+        self.assertEqual(to_representation.call_count, 1)
+        self.assertEqual(
+            FormattedDateTimeField(format=DATETIME_FORMAT).to_representation(date),
+            serializers.DateTimeField(format=DATETIME_FORMAT).to_representation(date),
+        )
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        url = reverse("companies:profession-detail", args=[self.profession.pk])
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content)["name"], self.profession.name
+        )
+
+        response = self.client.patch(
+            url,
+            msgpack.packb({"description": "Packed"}),
+            content_type="application/msgpack",
+        )
+        self.assertEqual(response.data["description"], "Packed")
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark", "rendering", rows=10, repeat=1, stdout=out)
+        self.assertIn("rendering employee: 10 rows", out.getvalue())
+        self.assertIn("rendering dates", out.getvalue())
+
+
+class NameFilterTests(APITestCase):
+    """
+	Filters by related names resolve through an indexed lookup to foreign keys
+	"""
+
+    def get_names(self, params):
+        response = self.client.get(
+            reverse("companies:employee-list"), {"limit": 8, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [employee["name"] for employee in response.data["results"]]
+
+    def test_name_and_id_match(self):
+        by_name = self.get_names({"company_name": self.company.name})
+        by_id = self.get_names({"company_id": self.company.pk})
+        self.assertEqual(by_name, by_id)
+        self.assertEqual(len(by_name), self.employees_per_company)
+
+    def test_name_is_looked_up(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_names({"profession_name": self.profession.name})
+        # the name, count and page
+        lookup, *rest = [query["sql"] for query in queries]
+        self.assertIn('"companies_profession"."name" = ', lookup)
+        self.assertEqual(len(rest), 2)
+        for sql in rest:
+            self.assertIn('WHERE "companies_employee"."profession_id" = ', sql)
+
+    def test_unknown_name(self):
+        response = self.client.get(
+            reverse("companies:employee-list"), {"company_name": "Missing"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_rename_invalidates_choices(self):
+        self.get_names({"company_name": self.company.name})
+        self.company.name = "Renamed"
+        self.company.save()
+        self.assertEqual(len(self.get_names({"company_name": "Renamed"})), 4)
+
+
+class CounterTests(APITestCase):
+    """
+	Stored counters follow every write of employees and partnerships
+	"""
+
+    def assertCounters(self, company, employees, partners):
+        company.refresh_from_db()
+        self.assertEqual(company.employees_count, employees)
+        self.assertEqual(company.partners_count, partners)
+        self.assertEqual(company.employees.count(), employees)
+        self.assertEqual(company.partners.count(), partners)
+
+    def test_counters_are_seeded(self):
+        self.assertCounters(self.company, self.employees_per_company, 1)
+        self.profession.refresh_from_db()
+        self.assertEqual(
+            self.profession.employees_count, self.profession.employees.count()
+        )
+
+    def test_employee_reassignment_and_deletion(self):
+        other = create_company("Other company")
+        employee = Employee.objects.get(pk=self.employee.pk)
+        employee.company = other
+        employee.save()
+
+        self.assertCounters(other, 1, 0)
+        self.assertCounters(self.company, self.employees_per_company - 1, 1)
+
+        employee.delete()
+        self.assertCounters(other, 0, 0)
+
+    def test_partners_set_and_remove(self):
+        other = create_company("Other company")
+        self.company.partners.add(other)
+        self.assertCounters(self.company, self.employees_per_company, 2)
+        self.assertCounters(other, 0, 1)
+
+        self.company.partners.remove(other)
+        self.assertCounters(self.company, self.employees_per_company, 1)
+
+    def test_filters_read_counters(self):
+        response = self.client.get(
+            reverse("companies:company-list"),
+            {
+                "min_number_of_employees": self.employees_per_company,
+                "number_of_partners": 0,
+            },
+        )
+        self.assertEqual(response.data["count"], 1)
+
+    def test_rebuild_counters_command(self):
+        Company.objects.update(employees_count=0, partners_count=0)
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertCounters(self.company, self.employees_per_company, 1)
+
+
+class PartnerAssignmentTests(APITestCase):
+    """
+	Partners written through the company detail are diffed and applied in bulk
+	with counters, graph and caches following
+	"""
+
+    def setUp(self):
+        super().setUp()
+        self.others = [create_company(f"Partner {index}") for index in range(6)]
+        self.url = reverse("companies:company-detail", args=[self.company.pk])
+        patcher = mock.patch(
+            "companies.graph.transaction.on_commit", lambda callback: callback()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assign(self, companies):
+        return self.client.patch(
+            self.url,
+            {
+                "partners": [
+                    reverse("companies:company-detail", args=[company.pk])
+                    for company in companies
+                ]
+            },
+            format="json",
+        )
+
+    def pairs(self):
+        return set(
+            PartnerShip.objects.filter(
+                Q(company=self.company) | Q(company_inviter=self.company)
+            ).values_list("company_id", "company_inviter_id")
+        )
+
+    def test_symmetric_assignment(self):
+        with graph_snapshot.locked():
+            pass  # built before the write, which then updates it
+        response = self.assign(self.others[:3])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["number_of_partners"], 3)
+        expected = {(self.company.pk, other.pk) for other in self.others[:3]}
+        expected |= {(b, a) for a, b in expected}
+        self.assertEqual(self.pairs(), expected)
+        for company in (self.company, *self.others[:3]):
+            company.refresh_from_db()
+            self.assertEqual(
+                company.partners_count, company.partners.count(), company.name
+            )
+        with graph_snapshot.locked() as graph:
+            self.assertEqual(
+                set(graph.partners(self.company.pk)),
+                {other.pk for other in self.others[:3]},
+            )
+
+        # the company invited by it in the seeded chain lost its partnership
+        response = self.client.get(reverse("companies:company-list"), {"limit": 20})
+        counts = {
+            row["name"]: row["number_of_partners"] for row in response.data["results"]
+        }
+        self.assertEqual(counts["Company 2"], 0)
+        self.assertEqual(counts["Partner 0"], 1)
+
+    def test_queries_do_not_grow_with_partners(self):
+        with CaptureQueriesContext(connection) as few:
+            self.assign(self.others[:2])
+        with CaptureQueriesContext(connection) as many:
+            self.assign(self.others[2:])
+        self.assertEqual(len(few), len(many))
+        deletes = [
+            query["sql"]
+            for query in many
+            if query["sql"].startswith('DELETE FROM "companies_partnership"')
+        ]
+        self.assertEqual(len(deletes), 1)
+
+    def test_one_way_assignment(self):
+        invited = set(
+            PartnerShip.objects.filter(company_inviter=self.company).values_list(
+                "company_id", "company_inviter_id"
+            )
+        )
+        with mock.patch.object(DetailCompanySerializer, "symmetric_partners", False):
+            self.assign(self.others[:2])
+
+        # only rows in which the company is the partner change
+        expected = {(self.company.pk, other.pk) for other in self.others[:2]}
+        self.assertEqual(self.pairs(), expected | invited)
+
+    def test_unknown_partner(self):
+        response = self.client.patch(
+            self.url,
+            {"partners": [reverse("companies:company-detail", args=[0])]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("partners", response.data)
+
+
+class KeysetPaginationTests(APITestCase):
+    """
+	Cursor pages follow the ordering of offset pages without gaps or repeats
+	"""
+
+    def walk(self, params, expected):
+        names = []
+        url, params = reverse("companies:employee-list"), {"cursor": "", **params}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            names.extend(employee["name"] for employee in response.data["results"])
+            url, params = response.data["next"], None
+        self.assertEqual(names, list(expected.values_list("name", flat=True)))
+
+    def test_composite_meta_ordering(self):
+        self.walk({"limit": 8}, Employee.objects.all())
+
+    def test_user_selected_ordering(self):
+        Employee.objects.filter(name__endswith="-1").update(salary=2000)
+        self.walk(
+            {"limit": 8, "ordering": "-salary"},
+            Employee.objects.order_by("-salary", "pk"),
+        )
+        self.walk(
+            {"limit": 8, "ordering": "company__name,-hired_date"},
+            Employee.objects.order_by("company__name", "-hired_date", "pk"),
+        )
+
+    def test_previous_link(self):
+        first = self.client.get(
+            reverse("companies:employee-list"), {"cursor": "", "limit": 5}
+        )
+        second = self.client.get(first.data["next"])
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(previous.data["results"], first.data["results"])
+        self.assertIsNone(previous.data["previous"])
+
+    def test_page_costs_single_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse("companies:employee-list"), {"cursor": ""})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("companies:employee-list"), {"cursor": "broken"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(APITestCase):
+    """
+	Declared filters and ordering fields are served by indexes
+	"""
+
+    def test_filters_use_indexes(self):
+        self.assertEqual(check_query_plans(), [])
+
+    def test_missing_index_is_reported(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX employee_salary_idx")
+
+        findings = check_query_plans(viewsets=(EmployeeViewSet,))
+        self.assertTrue(findings)
+        salary_filters = {"salary", "min_salary", "max_salary"}
+        self.assertTrue(
+            all(set(finding.params) <= salary_filters for finding in findings)
+        )
+
+
+class ResponseCacheTests(APITestCase):
+    """
+	Cached responses are reused until a write bumps the version of their model
+	"""
+
+    def test_repeated_request_is_served_from_cache(self):
+        url = reverse("companies:company-list")
+        self.assertEqual(self.client.get(url, {"limit": 3})["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"limit": 3})
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(metrics.snapshot()["company"], {"hits": 1, "misses": 1})
+
+    def test_query_string_is_normalized(self):
+        url = reverse("companies:employee-list")
+        self.client.get(f"{url}?limit=3&ordering=age")
+        response = self.client.get(f"{url}?ordering=age&limit=3")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_formats_are_cached_apart(self):
+        url = reverse("companies:company-list")
+        accepts = ("application/json", "text/html", "application/json; indent=4")
+        for accept in accepts:
+            response = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(response["X-Cache"], "MISS")
+        for accept in accepts:
+            response = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(response["X-Cache"], "HIT")
+            self.assertTrue(response["Content-Type"].startswith(accept.split(";")[0]))
+        self.assertIn(b"\n    ", response.content)
+
+    def test_write_of_related_model_invalidates(self):
+        url = reverse("companies:company-detail", args=(self.company.pk,))
+        self.client.get(url)
+
+        create_employee("New employee", self.company, self.profession)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(
+            response.data["number_of_employees"], self.employees_per_company + 1
+        )
+
+    def test_unrelated_write_keeps_cache(self):
+        url = reverse("companies:partnership-list")
+        self.client.get(url)
+
+        self.profession.save()
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+
+class ConditionalGetTests(APITestCase):
+    """
+	Matching validators short-circuit to 304 and writes change them
+	"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("companies:company-detail", args=(self.company.pk,))
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn("Last-Modified", response)
+
+        # a conditional request skips the serializer and its prefetches
+        caches["api"].clear()
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        not_modified = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_cached_response_answers_conditional_request(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_embedded_write_changes_etag(self):
+        embed = {"embed": "employees"}
+        etag = self.client.get(self.url, embed)["ETag"]
+
+        employee = Employee.objects.get(pk=self.employee.pk)
+        employee.name = "Renamed employee"
+        employee.save()
+        self.assertEqual(
+            self.client.get(self.url, embed, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_list_etag_follows_deletion(self):
+        url = reverse("companies:partnership-list")
+        etag = self.client.get(url)["ETag"]
+
+        PartnerShip.objects.filter(pk=self.partnership.pk).delete()
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+    def test_list_is_not_modified_by_date(self):
+        url = reverse("companies:profession-list")
+        response = self.client.get(url)
+        self.assertNotIn("Last-Modified", response)
+
+        since = http_date(time.time() + 60)
+        Profession.objects.filter(pk=self.profession.pk).delete()
+        for clear in (False, True):
+            if clear:
+                caches["api"].clear()
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(
+                self.profession.name, [row["name"] for row in response.data["results"]]
+            )
+
+    def test_list_validators_read_no_rows(self):
+        url = reverse("companies:employee-list")
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get(url, {"cursor": ""})["ETag"]
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+        # without a cached response only the version is read
+        uncached = mock.patch.object(
+            CachedResponseMixin,
+            "get_cached_response",
+            lambda self, handler, request, *args, **kwargs: handler(request, *args),
+        )
+        with uncached, self.assertNumQueries(0):
+            response = self.client.get(url, {"cursor": ""}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class AnalyticsTests(APITestCase):
+    """
+	Summary tables follow writes of employees and serve the analytics endpoint
+	"""
+
+    url = reverse("companies:analytics-list")
+
+    def snapshot(self):
+        return {
+            (summary.dimension, summary.key): (
+                summary.headcount,
+                summary.salary_sum,
+                summary.salary_min,
+                summary.salary_max,
+                summary.salary_sketch,
+                summary.ages,
+            )
+            for summary in EmployeeSummary.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        maintained = self.snapshot()
+        rebuild_summaries()
+        self.assertEqual(maintained, self.snapshot())
+
+    def test_writes_match_rebuild(self):
+        other = Company.objects.exclude(pk=self.company.pk).first()
+        employee = create_employee(
+            "Rich employee", self.company, self.profession, salary=90000, age=50
+        )
+        self.assertMatchesRebuild()
+
+        employee.company = other
+        employee.gender = Employee.FEMALE
+        employee.save()
+        self.assertMatchesRebuild()
+
+        # the maximum of the company is gone with its only holder
+        employee.delete()
+        self.assertMatchesRebuild()
+
+        other.country = "Poland"
+        other.save()
+        self.assertMatchesRebuild()
+
+        self.client.post(
+            reverse("companies:employee-bulk"),
+            json.dumps({"name": self.employee.name, "salary": 10, "age": 20}),
+            content_type="application/x-ndjson",
+        )
+        self.assertMatchesRebuild()
+
+    def test_concurrent_insert_of_group(self):
+        bulk_create = EmployeeSummary.objects.bulk_create
+
+        def insert_concurrently(summaries, **kwargs):
+            # another transaction inserts the new groups first
+            bulk_create(
+                [EmployeeSummary(dimension=s.dimension, key=s.key) for s in summaries]
+            )
+            return bulk_create(summaries, **kwargs)
+
+        profession = create_profession("New profession")
+        with mock.patch.object(
+            EmployeeSummary.objects, "bulk_create", insert_concurrently
+        ):
+            create_employee("New employee", self.company, profession)
+        self.assertMatchesRebuild()
+
+    def test_group_by_company(self):
+        response = self.client.get(self.url, {"group_by": "company"})
+        group = response.data["results"][1]
+        self.assertEqual(group["group"], self.company.name)
+        self.assertEqual(group["headcount"], self.employees_per_company)
+        self.assertEqual(group["salary"]["mean"], 1000)
+        self.assertEqual(group["salary"]["percentiles"]["50"], 1000)
+        self.assertEqual(group["age"], {"30": self.employees_per_company})
+
+    def test_percentiles(self):
+        for salary in range(1, 101):
+            create_employee(
+                f"Ranked {salary}", self.company, self.profession, salary=salary
+            )
+        response = self.client.get(
+            self.url, {"group_by": "company", "percentiles": "50,90"}
+        )
+        percentiles = response.data["results"][1]["salary"]["percentiles"]
+        # ranks 52 and 93 of 1..100 and four salaries of 1000
+        self.assertAlmostEqual(percentiles["50"], 52, delta=52 * 0.02)
+        self.assertAlmostEqual(percentiles["90"], 93, delta=93 * 0.02)
+
+    def test_constant_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"group_by": "gender"})
+        self.assertEqual(
+            response.data["results"][0]["headcount"], Employee.objects.count()
+        )
+
+    def test_total_is_merged_from_genders(self):
+        create_employee(
+            "Rich employee",
+            self.company,
+            self.profession,
+            salary=90000,
+            age=50,
+            gender=Employee.FEMALE,
+        )
+        self.assertFalse(EmployeeSummary.objects.filter(dimension="all").exists())
+        with self.assertNumQueries(1):
+            total = self.client.get(self.url).data["results"][0]
+        self.assertEqual(total["headcount"], Employee.objects.count())
+        self.assertEqual(total["salary"]["max"], 90000)
+        self.assertEqual(total["salary"]["min"], 1000)
+        self.assertEqual(total["age"]["50"], 1)
+
+    def test_summaries_are_locked_in_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            create_employee("New employee", self.company, self.profession)
+        # SQLite has no FOR UPDATE, the order shows in the locking query
+        self.assertTrue(
+            any(
+                'ORDER BY "companies_employeesummary"."dimension" ASC' in query["sql"]
+                for query in queries
+            )
+        )
+
+    def test_invalid_parameters(self):
+        self.assertEqual(
+            self.client.get(self.url, {"group_by": "age"}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(self.url, {"percentiles": "101"}).status_code, 400
+        )
+
+
+class GraphTests(APITestCase):
+    """
+	Graph endpoints answer from the snapshot, which follows partnership writes
+	"""
+
+    def setUp(self):
+        super().setUp()
+        self.chain = list(Company.objects.order_by("pk").values_list("pk", flat=True))
+        # test cases never commit, callbacks run right away instead
+        patcher = mock.patch(
+            "companies.graph.transaction.on_commit", lambda callback: callback()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f"companies:graph-{name}"), params)
+
+    def neighbours(self, company, hops=1):
+        response = self.get("neighbours", company=company, hops=hops)
+        return {company["id"]: company["hops"] for company in response.data["results"]}
+
+    def test_neighbours(self):
+        first, second, third = self.chain[:3]
+        self.assertEqual(self.neighbours(first, hops=2), {second: 1, third: 2})
+        response = self.get("neighbours", company=second)
+        self.assertEqual(response.data["company"]["name"], self.company.name)
+
+    def test_path(self):
+        response = self.get("path", source=self.chain[0], target=self.chain[-1])
+        self.assertEqual(response.data["hops"], len(self.chain) - 1)
+        self.assertEqual(
+            [company["id"] for company in response.data["results"]], self.chain
+        )
+
+        response = self.get(
+            "path", source=self.chain[0], target=self.chain[-1], max_hops=2
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_components_and_degrees(self):
+        response = self.get("components", sample=2)
+        self.assertEqual(response.data["results"][0]["size"], len(self.chain))
+        self.assertEqual(len(response.data["results"][0]["companies"]), 2)
+
+        response = self.get("degrees", limit=2)
+        self.assertEqual(
+            [
+                (company["id"], company["partners"])
+                for company in response.data["results"]
+            ],
+            [(self.chain[1], 2), (self.chain[2], 2)],
+        )
+
+    def test_follows_writes(self):
+        first, second, third = self.chain[:3]
+        self.assertEqual(self.neighbours(first), {second: 1})
+
+        partnership = PartnerShip.objects.create(
+            company_id=first, company_inviter_id=third
+        )
+        self.assertEqual(self.neighbours(first), {second: 1, third: 1})
+
+        partnership.company_id = self.chain[-1]
+        partnership.save()
+        self.assertEqual(self.neighbours(first), {second: 1})
+        self.assertIn(self.chain[-1], self.neighbours(third))
+
+        partnership.delete()
+        self.assertNotIn(self.chain[-1], self.neighbours(third))
+
+        company = Company.objects.get(pk=first)
+        company.partners.remove(second)
+        self.assertEqual(self.neighbours(first), {})
+        company.partners.add(third)
+        self.assertEqual(self.neighbours(first), {third: 1})
+        company.partners.clear()
+        self.assertEqual(self.neighbours(first), {})
+
+        get_throttle_store().clear()  # many requests for the anonymous throttle
+        response = self.get("list")
+        self.assertEqual(response.data["partnerships"], PartnerShip.objects.count())
+
+    def test_follows_writes_of_other_processes(self):
+        first, _, third = self.chain[:3]
+        self.neighbours(first)
+        # a process with a cache of its own neither bumps the version nor
+        # updates the graph of this process
+        with mock.patch.object(graph_snapshot, "record"):
+            PartnerShip.objects.create(company_id=first, company_inviter_id=third)
+        self.assertNotIn(third, self.neighbours(first))
+
+        with override_settings(PARTNER_GRAPH_MAX_AGE=0):
+            self.assertIn(third, self.neighbours(first))
+
+    def test_unknown_company(self):
+        unknown = self.chain[-1] + 1
+        self.assertEqual(self.get("neighbours", company=unknown).status_code, 404)
+        response = self.get("path", source=unknown, target=unknown)
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get("neighbours").status_code, 400)
+        self.assertEqual(
+            self.get("neighbours", company=self.chain[0], hops=9).status_code, 400
+        )
+        self.assertEqual(self.get("degrees", limit="many").status_code, 400)
+
+    def test_overlay_matches_rebuild(self):
+        graph = PartnerGraph([(1, 2), (2, 3), (3, 4)])
+        graph.compact_minimum = 2
+        graph.set_edges({(1, 2): False, (1, 4): True})
+        self.assertEqual(graph.components(), {1: [1, 2, 3, 4]})
+        self.assertEqual(graph.shortest_path(1, 3), [1, 4, 3])
+
+        graph.set_edges({(5, 6): True})  # folds the overlay into the arrays
+        self.assertEqual(graph.overlay_size, 0)
+        self.assertEqual(graph.edge_count, 4)
+        self.assertEqual(
+            graph.degree_ranking(3),
+            PartnerGraph([(2, 3), (3, 4), (1, 4), (5, 6)]).degree_ranking(3),
+        )
+
+
+@override_settings(ROOT_URLCONF="crm.async_urls")
+class AsyncViewTests(TransactionTestCase):
+    """
+	The ASGI URLconf serves list and retrieve through async views
+	"""
+
+    def setUp(self):
+        get_throttle_store().clear()
+        caches["api"].clear()
+        self.company = create_company("Async company")
+
+    def test_routes(self):
+        for url in (
+            reverse("companies:company-list"),
+            reverse("companies:company-detail", args=[self.company.pk]),
+            reverse("companies:company-employees", args=[self.company.pk]),
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+        url = reverse("companies:employee-bulk")
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(url).func))
+
+    async def test_list_and_retrieve(self):
+        client = AsyncClient()
+        response = await client.get(reverse("companies:company-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["count"], 1)
+        # queries of the view run in a pool thread count for the request
+        self.assertNotEqual(server_timing(response)["db"][1], "0 queries")
+        self.assertGreater(float(server_timing(response)["view"][0]), 0)
+
+        response = await client.get(
+            reverse("companies:company-detail", args=[self.company.pk])
+        )
+        self.assertEqual(json.loads(response.content)["name"], self.company.name)
+
+        # writes on the same route keep running synchronously
+        response = await client.delete(
+            reverse("companies:company-detail", args=[self.company.pk])
+        )
+        self.assertEqual(response.status_code, 204)
+
+    async def test_export_streams_under_asgi(self):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_application(
+            {
+                "type": "http",
+                "method": "GET",
+                "path": reverse("companies:company-export"),
+                "query_string": b"export_format=ndjson",
+                "headers": [(b"host", b"testserver")],
+            },
+            receive,
+            send,
+        )
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual(json.loads(body)["name"], self.company.name)
+
+
+@skipUnless(
+    {"replica_1", "replica_2"} <= set(settings.DATABASES),
+    "needs replica aliases, e.g. of crm.settings_sqlite",
+)
+@override_settings(
+    READ_REPLICAS={"ALIASES": {"replica_1": 0, "replica_2": 1}, "STICKY_SECONDS": 5}
+)
+class ReplicaTests(APITestCase):
+    """
+	Safe requests read from replicas chosen by weight, writes and reads of
+	clients which just wrote go to default
+
+	Replica test databases are not replicated from default, which shows where
+	a request read from.
+	"""
+
+    databases = {"default", "replica_1", "replica_2"}
+    url = reverse("companies:profession-list")
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()  # clients sticking to default
+        Profession.objects.using("replica_2").bulk_create(
+            [Profession(name="Replicated", description="Replicated")]
+        )
+
+    def names(self, response):
+        return [row["name"] for row in response.data["results"]]
+
+    def test_reads_from_replica(self):
+        cache = caches["api"]
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            response = self.client.get(self.url)
+        self.assertEqual(self.names(response), ["Replicated"])
+        # responses of a lagging replica are cached for the sticky window
+        self.assertEqual(cache_set.call_args[0][2], 5)
+
+        response = self.client.get(reverse("companies:company-list"))
+        self.assertEqual(response.data["count"], 0)
+
+    def test_sticks_to_default_after_write(self):
+        response = self.client.post(
+            self.url, {"name": "Written", "description": "Written"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Profession.objects.using("default").filter(name="Written"))
+
+        response = self.client.get(self.url, {"limit": 10})
+        self.assertIn("Written", self.names(response))
+        self.assertEqual(len(self.names(response)), self.professions + 1)
+
+        caches["default"].clear()  # the sticky window is over
+        caches["api"].clear()  # the response read from default is still valid
+        response = self.client.get(self.url, {"limit": 10})
+        self.assertEqual(self.names(response), ["Replicated"])
+
+    def test_export_streams_from_replica(self):
+        Company.objects.using("replica_2").bulk_create(
+            [
+                Company(
+                    name="Replicated company",
+                    tagline="Replicated",
+                    type_of_company="IT",
+                    description="Replicated",
+                    year_of_foundation=timezone.now(),
+                    country="Ukraine",
+                )
+            ]
+        )
+        response = self.client.get(reverse("companies:company-export"))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("Replicated company,"))
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Profession))
+        replicated = Profession.objects.using("replica_2").get()
+        self.assertEqual(
+            router.db_for_write(Profession, instance=replicated), "default"
+        )
+        self.assertTrue(router.allow_relation(self.profession, replicated))
+
+
+class InstrumentationTests(APITestCase):
+    """
+	Every request reports its queries and timings in Server-Timing and per-route
+	histograms, slow ones are logged with their slowest statements
+	"""
+
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("companies:company-list"))
+
+        entries = server_timing(response)
+        counts = [
+            query for query in queries if query["sql"].startswith("SELECT COUNT(")
+        ]
+        self.assertEqual(entries["db"][1], f"{len(queries)} queries")
+        self.assertEqual(entries["count"][1], f"{len(counts)} queries")
+        self.assertEqual(entries["size"][1], f"{len(response.content)} bytes")
+        for name in ("total", "view", "serialize", "throttle"):
+            self.assertGreater(float(entries[name][0]), 0)
+
+    def test_route_histograms(self):
+        url = reverse("companies:company-detail", args=[self.company.pk])
+        responses = [self.client.get(url) for _ in range(2)]
+        self.client.get("/api/v1/unknown/")
+
+        snapshot = request_metrics.snapshot()
+        detail = snapshot["GET companies:company-detail"]
+        self.assertEqual(detail["total_ms"]["count"], 2)
+        # the second response comes from the cache without queries
+        self.assertEqual(
+            [server_timing(response)["db"][1] for response in responses],
+            [f"{detail['queries']['sum']} queries", "0 queries"],
+        )
+        self.assertEqual(sum(detail["size"]["buckets"].values()), 2)
+        self.assertEqual(snapshot["GET unresolved"]["total_ms"]["count"], 1)
+
+    def test_route_metrics_view(self):
+        url = reverse("route-metrics")
+        self.client.get(reverse("companies:company-list"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["GET companies:company-list"]["total_ms"]["count"], 1
+        )
+
+    @override_settings(
+        PERFORMANCE_INSTRUMENTATION={"SLOW_REQUEST_MS": 0, "SLOW_QUERIES": 2}
+    )
+    def test_slow_request_log(self):
+        with self.assertLogs("companies.instrumentation", "WARNING") as logs:
+            self.client.get(reverse("companies:employee-list"))
+
+        (message,) = logs.output
+        self.assertIn("GET /api/v1/employees/", message)
+        self.assertEqual(message.count("ms SELECT"), 2)
+
+
+class ThrottleTests(APITestCase):
+    """
+	Sliding window limits per scope shared through the throttle store
+	"""
+
+    def check_store(self, store):
+        store.clear()
+        start = 600.0  # start of a window of 60 seconds
+        for second in range(3):
+            self.assertEqual(store.hit("anon:1", 3, 60, start + second), (True, 0))
+        allowed, wait = store.hit("anon:1", 3, 60, start + 3)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+        self.assertTrue(store.hit("anon:2", 3, 60, start + 3)[0])
+
+        # the previous window counts by its share of the sliding window
+        self.assertFalse(store.hit("anon:1", 3, 60, start + 61)[0])
+        self.assertTrue(store.hit("anon:1", 3, 60, start + 90)[0])
+        self.assertFalse(store.hit("anon:1", 3, 60, start + 95)[0])
+        self.assertTrue(store.hit("anon:1", 3, 60, start + 300)[0])
+
+        store.reject("anon")
+        store.reject("anon")
+        self.assertEqual(store.rejections(["anon", "graph"]), {"anon": 2, "graph": 0})
+
+    def test_sqlite_store(self):
+        self.check_store(get_throttle_store())
+        self.assertIsInstance(get_throttle_store(), SQLiteThrottleStore)
+
+    def test_cache_store(self):
+        self.check_store(CacheThrottleStore())
+
+        # the alias may be shared with cached responses and versions
+        store = CacheThrottleStore("api")
+        caches["api"].set("response", "kept")
+        store.hit("anon:1", 1, 60)
+        store.clear()
+        self.assertEqual(caches["api"].get("response"), "kept")
+        self.assertTrue(store.hit("anon:1", 1, 60)[0])
+
+    def test_scopes(self):
+        url = reverse("companies:profession-list")
+        for _ in range(8):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        # other scopes have their own limits
+        response = self.client.get(reverse("companies:company-list"))
+        self.assertEqual(response.status_code, 200)
+
+        out = StringIO()
+        call_command("throttle_stats", stdout=out)
+        self.assertIn("professions: 8/minute, 1 rejected", out.getvalue())
+
+
+class RenditionTests(APITestCase):
+    """
+	Uploaded logos and photos are rendered once per content
+	"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name, RENDITION_WORKERS=0)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        # test cases never commit, callbacks run right away instead
+        patcher = mock.patch(
+            "companies.signals.transaction.on_commit", lambda callback: callback()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        image = BytesIO()
+        Image.new("RGB", (800, 400), "red").save(image, "PNG")
+        self.content = image.getvalue()
+        self.digest = hashlib.sha256(self.content).hexdigest()
+
+    def upload(self):
+        return SimpleUploadedFile("logo.png", self.content, "image/png")
+
+    def test_bulk_photos_are_rendered(self):
+        name = default_storage.save("employees/photos/bulk.png", self.upload())
+        row = {
+            "name": "Bulk employee",
+            "age": 25,
+            "salary": 500,
+            "promotion_date": "2020-01-01T00:00:00Z",
+            "company": self.company.name,
+            "profession": self.profession.name,
+            "phone_number": "+380000000000",
+            "email": "bulk@example.com",
+        }
+        loader = EmployeeBulkLoader()
+        loader.load([{**row, "photo": name}, {**row, "name": self.employee.name}])
+        loader.load([{**row, "name": self.employee.name, "photo": name}])
+
+        digests = Employee.objects.filter(
+            name__in=[row["name"], self.employee.name]
+        ).values_list("photo_digest", flat=True)
+        self.assertEqual(list(digests), [self.digest, self.digest])
+        self.assertTrue(os.path.exists(rendition_path(self.digest, "thumbnail")))
+
+    def test_upload_is_rendered(self):
+        company = create_company("Rendered", logo=self.upload())
+        self.assertEqual(company.logo_digest, self.digest)
+        with Image.open(rendition_path(self.digest, "thumbnail")) as thumbnail:
+            self.assertEqual(thumbnail.size, (128, 64))
+        with Image.open(rendition_path(self.digest, "medium_webp")) as medium:
+            self.assertEqual((medium.format, medium.size), ("WEBP", (512, 256)))
+
+        response = self.client.get(
+            reverse("companies:company-detail", args=[company.pk])
+        )
+        url = response.data["logo_renditions"]["thumbnail_webp"]
+        self.assertTrue(url.startswith("http://testserver/media/renditions/"))
+        self.assertTrue(url.endswith(f"{self.digest}/thumbnail_webp.webp"))
+
+        response = self.client.get(
+            reverse("companies:employee-detail", args=[self.employee.pk])
+        )
+        self.assertIsNone(response.data["photo_renditions"])
+
+    def test_identical_content_is_rendered_once(self):
+        create_company("First", logo=self.upload())
+        with mock.patch("companies.renditions.render") as render:
+            employee = create_employee(
+                "Same photo", self.company, self.profession, photo=self.upload()
+            )
+            employee.photo = self.upload()
+            employee.save()
+        render.assert_not_called()
+        self.assertEqual(employee.photo_digest, self.digest)
+
+    def test_build_command_uses_worker_processes(self):
+        company = create_company("Unrendered", logo=self.upload())
+        Company.objects.filter(pk=company.pk).update(logo_digest="")
+        os.remove(os.path.join(rendition_path(self.digest), ".done"))
+
+        with override_settings(RENDITION_WORKERS=1):
+            call_command("build_renditions", stdout=StringIO())
+        company.refresh_from_db()
+        self.assertEqual(company.logo_digest, self.digest)
+        self.assertTrue(
+            os.path.exists(os.path.join(rendition_path(self.digest), ".done"))
+        )
+
+
+class BudgetTests(TestCase):
+    """
+	Every route stays within the query budgets of companies/budgets.json, time
+	budgets depend on the machine and are checked by check_budgets command
+	"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_data(companies=20, professions=5, employees=200, partnerships=40)
+
+    def setUp(self):
+        get_throttle_store().clear()
+        caches["api"].clear()
+
+    def test_query_budgets(self):
+        # queries of bulk writes depend on groups of analytics they touch
+        cases = [name for name in CASES if name != "employee-bulk"]
+        violations = check_budgets(
+            measure(cases, repeat=1), load_budgets(), metrics=("queries",)
+        )
+        self.assertEqual(violations, [])
+
+    def test_every_route_has_a_case(self):
+        names = {pattern.name for pattern in companies_urls.urlpatterns}
+        cases = {url_name for url_name, _, _ in CASES.values()}
+        self.assertEqual(names - cases, set())
+
+    def test_exceeded_budget(self):
+        measurements = measure(["company-detail"], repeat=1)
+        violations = check_budgets(measurements, {"company-detail": {"queries": 1}})
+        self.assertEqual(violations, ["company-detail: queries 2 over budget 1"])
+        self.assertEqual(check_budgets(measurements, {}), ["company-detail: no budget"])
+
+
+class GenerateTests(TestCase):
+    """
+	Generated data is reproducible, skewed and keeps names and partnerships
+	unique, also when run again
+	"""
+
+    def generate(self, seed=0):
+        return DataGenerator(seed, batch_size=50).generate(
+            companies=40, professions=10, employees=400, partnerships=100
+        )
+
+    def test_generated_data(self):
+        create_company("Company 3")
+        timings = self.generate()
+
+        self.assertEqual(timings["employees"][0], 400)
+        self.assertEqual(Company.objects.count(), 41)
+        self.assertTrue(Company.objects.filter(name="Company 40").exists())
+        pairs = {
+            frozenset(pair)
+            for pair in PartnerShip.objects.values_list("company", "company_inviter")
+        }
+        self.assertEqual(len(pairs), 100)
+        # every generated row is logged as created for the change feed
+        self.assertEqual(timings["changes"][0], 10 + 40 + 400 + 100)
+        self.assertEqual(Change.objects.filter(model="employee").count(), 400)
+        largest = Company.objects.order_by("-employees_count").first()
+        self.assertGreater(largest.employees_count, 400 / 40 * 5)
+        self.assertEqual(
+            largest.employees_count, Employee.objects.filter(company=largest).count()
+        )
+
+    def test_reproducible_and_repeatable(self):
+        self.generate()
+        salaries = list(Employee.objects.order_by("pk").values_list("salary"))
+        self.generate()
+
+        self.assertEqual(Employee.objects.count(), 800)
+        self.assertEqual(
+            list(Employee.objects.order_by("pk").values_list("salary")[400:]),
+            salaries,
+        )
+
+
+class BulkEmployeeTests(APITestCase):
+    """
+	Streamed uploads create and update employees and report errors per row
+	"""
+
+    url = reverse("companies:employee-bulk")
+
+    def test_ndjson_upload(self):
+        rows = [
+            {
+                "name": "Bulk employee",
+                "age": 25,
+                "salary": 500,
+                "promotion_date": "2020-01-01T00:00:00Z",
+                "company": self.company.name,
+                "profession": self.profession.name,
+                "phone_number": "+380000000000",
+                "email": "bulk@example.com",
+            },
+            {"name": self.employee.name, "salary": 100},
+            "not an object",
+        ]
+        body = "\n".join(json.dumps(row) for row in rows) + "\n{broken"
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["error_count"], 3)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4, 2])
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.employees_count, self.employees_per_company + 1)
+
+    def test_csv_upload_updates_by_name(self):
+        other = create_company("Other company")
+        body = (
+            "name,age,salary,promotion_date,company,profession,phone_number,email\n"
+            f"{self.employee.name},40,9000,2021-01-01T00:00:00Z,"
+            f"{other.name},{self.profession.name},+380,csv@example.com\n"
+            "Unknown,40,9000,2021-01-01T00:00:00Z,"
+            f"Unknown,{self.profession.name},+380,csv@example.com\n"
+        )
+        response = self.client.post(self.url, body, content_type="text/csv")
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+        employee = Employee.objects.get(pk=self.employee.pk)
+        self.assertEqual((employee.salary, employee.company), (9000, other))
+        other.refresh_from_db()
+        self.assertEqual(other.employees_count, 1)
+
+    def test_unsupported_media_type(self):
+        response = self.client.post(self.url, "{}", content_type="application/xml")
+        self.assertEqual(response.status_code, 415)
+
+
+class ChangeFeedTests(APITestCase):
+    """
+	Writes of rows, single and bulk, are logged in their transaction and read
+	back from the feed after a cursor
+	"""
+
+    url = reverse("companies:change-list")
+
+    def setUp(self):
+        super().setUp()
+        self.cursor = self.client.get(reverse("companies:change-head")).data["cursor"]
+        patcher = mock.patch(
+            "companies.graph.transaction.on_commit", lambda callback: callback()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def feed(self, **params):
+        params.setdefault("cursor", self.cursor)
+        return self.client.get(self.url, params)
+
+    def changed(self, response):
+        return {
+            (row["model"], row["id"], row["action"]) for row in response.data["results"]
+        }
+
+    def test_saves_and_deletes(self):
+        profession = create_profession("Feed profession")
+        profession.description = "Changed"
+        profession.save()
+        employee_pk = self.employee.pk
+        self.employee.delete()
+
+        response = self.feed()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["more"])
+        results = {(row["model"], row["id"]): row for row in response.data["results"]}
+        # the latest change of a row supersedes earlier ones
+        self.assertEqual(results[("profession", profession.pk)]["action"], "update")
+        self.assertEqual(
+            results[("profession", profession.pk)]["data"]["description"], "Changed"
+        )
+        tombstone = results[("employee", employee_pk)]
+        self.assertEqual((tombstone["action"], tombstone["data"]), ("delete", None))
+        # counters of the company of the employee changed
+        self.assertEqual(results[("company", self.company.pk)]["action"], "update")
+
+        # nothing is left behind the cursor of the page
+        response = self.feed(cursor=response.data["cursor"])
+        self.assertEqual(response.data["results"], [])
+
+    def test_pages_and_models(self):
+        for index in range(3):
+            create_profession(f"Feed profession {index}")
+
+        response = self.feed(limit=2, models="profession")
+        self.assertTrue(response.data["more"])
+        self.assertEqual(len(response.data["results"]), 2)
+        response = self.feed(cursor=response.data["cursor"], models="profession")
+        self.assertFalse(response.data["more"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            response.data["results"][0]["data"]["name"], "Feed profession 2"
+        )
+
+        for params in ({"cursor": "x"}, {"limit": 0}, {"models": "unknown"}):
+            self.assertEqual(self.feed(**params).status_code, 400, params)
+
+    def test_rolled_back_writes_are_not_logged(self):
+        try:
+            with transaction.atomic():
+                create_profession("Rolled back")
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(self.feed().data["results"], [])
+
+    def test_bulk_writes(self):
+        others = [create_company(f"Feed partner {index}") for index in range(2)]
+        removed = PartnerShip.objects.get(company=self.company)
+        self.cursor = self.client.get(reverse("companies:change-head")).data["cursor"]
+
+        assign_partners(self.company, [company.pk for company in others])
+        body = (
+            "name,age,salary,promotion_date,company,profession,phone_number,email\n"
+            f"Feed employee,40,9000,2021-01-01T00:00:00Z,"
+            f"{self.company.name},{self.profession.name},+380,csv@example.com\n"
+        )
+        self.client.post(
+            reverse("companies:employee-bulk"), body, content_type="text/csv"
+        )
+
+        changed = self.changed(self.feed(limit=100))
+        added = PartnerShip.objects.filter(
+            Q(company=self.company, company_inviter__in=others)
+            | Q(company__in=others, company_inviter=self.company)
+        )
+        for pk in added.values_list("pk", flat=True):
+            self.assertIn(("partnership", pk, "create"), changed)
+        self.assertIn(("partnership", removed.pk, "delete"), changed)
+        employee = Employee.objects.get(name="Feed employee")
+        self.assertIn(("employee", employee.pk, "create"), changed)
+
+    def test_partners_added_through_relation(self):
+        other = create_company("Feed partner")
+        self.cursor = self.client.get(reverse("companies:change-head")).data["cursor"]
+        self.company.partners.add(other)
+
+        added = PartnerShip.objects.get(company=self.company, company_inviter=other)
+        self.assertIn(("partnership", added.pk, "create"), self.changed(self.feed()))
+
+    def test_added_partners(self):
+        others = [create_company(f"Feed partner {index}") for index in range(2)]
+        self.cursor = self.client.get(reverse("companies:change-head")).data["cursor"]
+        add_partners(self.company, [company.pk for company in others])
+        # current partners are kept
+        self.assertEqual(add_partners(self.company, [others[0].pk]), set())
+
+        changed = self.changed(self.feed())
+        pairs = PartnerShip.objects.filter(
+            Q(company=self.company, company_inviter__in=others)
+            | Q(company__in=others, company_inviter=self.company)
+        )
+        self.assertEqual(pairs.count(), 4)
+        for pk in pairs.values_list("pk", flat=True):
+            self.assertIn(("partnership", pk, "create"), changed)
+        self.assertEqual(
+            Company.objects.get(pk=self.company.pk).partners_count,
+            PartnerShip.objects.filter(company=self.company).count(),
+        )
+
+
+class ExportTests(APITestCase):
+    """
+	Exports stream every filtered row without pagination
+	"""
+
+    def test_csv_export_honours_filters(self):
+        response = self.client.get(
+            reverse("companies:employee-export"),
+            {"company_name": self.company.name, "ordering": "name"},
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = list(csv.DictReader(lines))
+
+        self.assertEqual(len(rows), self.employees_per_company)
+        self.assertEqual(
+            [row["name"] for row in rows],
+            list(
+                self.company.employees.order_by("name").values_list("name", flat=True)
+            ),
+        )
+
+    def test_ndjson_export(self):
+        response = self.client.get(
+            reverse("companies:company-export"),
+            {"export_format": "ndjson", "min_number_of_partners": 1},
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(rows), Company.objects.filter(partners_count=1).count())
+        self.assertEqual(rows[0]["number_of_partners"], 1)
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            reverse("companies:company-export"), {"export_format": "xml"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class FullTextSearchTests(APITestCase):
+    """
+	Full-text search over companies is ranked and follows writes
+	"""
+
+    url = reverse("companies:company-list")
+
+    def search(self, text):
+        response = self.client.get(self.url, {"text": text})
+        return [company["name"] for company in response.data["results"]]
+
+    def test_ranked_search(self):
+        create_company("Weak", description="Robotics is mentioned once here")
+        create_company("Strong", tagline="Robotics", description="Robotics company")
+
+        self.assertEqual(self.search("robotics"), ["Strong", "Weak"])
+        self.assertEqual(self.search("robotics (*"), ["Strong", "Weak"])
+
+    def test_index_follows_saves_and_deletes(self):
+        company = create_company("Renamed", tagline="Bakery")
+        self.assertEqual(self.search("bakery"), ["Renamed"])
+
+        company.tagline = "Brewery"
+        company.save()
+        self.assertEqual(self.search("bakery"), [])
+
+        company.delete()
+        self.assertEqual(self.search("brewery"), [])
+
+    def test_joint_products(self):
+        self.partnership.joint_products = "Quantum compiler"
+        self.partnership.save()
+
+        self.assertEqual(
+            sorted(self.search("quantum")),
+            sorted(
+                (self.partnership.company.name, self.partnership.company_inviter.name)
+            ),
+        )
+
+    def test_rebuild_command(self):
+        backend = get_search_backend()
+        backend.drop_index()
+        backend.create_index()
+        self.assertEqual(self.search("description"), [])
+
+        call_command("rebuild_search_index", stdout=StringIO())
+        response = self.client.get(self.url, {"text": "description"})
+        self.assertEqual(response.data["count"], self.companies)
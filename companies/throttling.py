@@ -0,0 +1,279 @@
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle
+from companies.instrumentation import timed
+
+_stores = {}
+
+
+def get_throttle_store():
+    """
+	Return the store configured by API_THROTTLE_STORE
+	"""
+
+    config = settings.API_THROTTLE_STORE
+    key = repr(config)
+    if key not in _stores:
+        _stores[key] = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _stores[key]
+
+
+def window_counts(row, window):
+    """
+	Return counts of the current and previous window from a row counted in
+	row[0], which may be older than the previous window
+	"""
+
+    if row is None or row[0] < window - 1:
+        return 0, 0
+    if row[0] == window - 1:
+        return 0, row[1]
+    return row[1], row[2]
+
+
+def estimate(current, previous, now, duration):
+    """
+	Estimate requests within the last duration, the previous window is
+	weighted by its share of that sliding window
+	"""
+
+    elapsed = now % duration / duration
+    return previous * (1 - elapsed) + current
+
+
+def wait_time(current, previous, limit, now, duration):
+    """
+	Return seconds until one more request fits the limit
+	"""
+
+    elapsed = now % duration
+    if current < limit:
+        if not previous:
+            return 0
+        # the share of the previous window must shrink enough
+        share = 1 - (limit - 1 - current) / previous
+        return max(share * duration - elapsed, 0)
+    # the current window becomes the previous one first
+    share = max(1 - (limit - 1) / current, 0)
+    return duration - elapsed + share * duration
+
+
+class SQLiteThrottleStore:
+    """
+	Sliding window counters in a SQLite file shared by processes of a host
+
+	Every key has one row with counts of its current and previous window. A hit
+	reads and writes that row in one immediate transaction, so concurrent
+	processes never admit more than the limit.
+	"""
+
+    purge_every = 1000  # hits of a connection between deleting idle keys
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # autocommit, transactions are opened explicitly
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS throttle_window (key TEXT PRIMARY KEY, "
+                "window INTEGER NOT NULL, current INTEGER NOT NULL, "
+                "previous INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS throttle_rejection "
+                "(scope TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self.local.connection = connection
+            self.local.hits = 0
+        return connection
+
+    def hit(self, key, limit, duration, now=None):
+        """
+		Count a request if it fits the limit, return (allowed, seconds to wait)
+		"""
+
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window, current, previous FROM throttle_window WHERE key = ?",
+                (key,),
+            ).fetchone()
+            current, previous = window_counts(row, window)
+            allowed = estimate(current, previous, now, duration) + 1 <= limit
+            if allowed:
+                current += 1
+            connection.execute(
+                "INSERT INTO throttle_window VALUES (?, ?, ?, ?) ON CONFLICT (key) "
+                "DO UPDATE SET window = excluded.window, current = excluded.current, "
+                "previous = excluded.previous",
+                (key, window, current, previous),
+            )
+            self.local.hits += 1
+            if self.local.hits % self.purge_every == 0:
+                # keys are per scope and client, windows of idle ones are gone
+                connection.execute(
+                    "DELETE FROM throttle_window WHERE window < ?", (window - 1,)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        if allowed:
+            return True, 0
+        return False, wait_time(current, previous, limit, now, duration)
+
+    def reject(self, scope):
+        self.connection.execute(
+            "INSERT INTO throttle_rejection VALUES (?, 1) ON CONFLICT (scope) "
+            "DO UPDATE SET count = count + 1",
+            (scope,),
+        )
+
+    def rejections(self, scopes):
+        counts = dict(
+            self.connection.execute("SELECT scope, count FROM throttle_rejection")
+        )
+        return {scope: counts.get(scope, 0) for scope in scopes}
+
+    def clear(self):
+        self.connection.execute("DELETE FROM throttle_window")
+        self.connection.execute("DELETE FROM throttle_rejection")
+
+
+class CacheThrottleStore:
+    """
+	Sliding window counters in a Django cache, one key per key and window
+
+	Counts are changed with incr, so limits hold across hosts with a cache
+	whose incr is atomic, such as memcached or redis. Keys carry a generation,
+	which clear() moves on, so other entries of a shared cache alias stay.
+	"""
+
+    generation_key = "throttle-generation"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_prefix(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # an evicted generation must not restart from a value used before
+            generation = time.time_ns()
+            if not self.cache.add(self.generation_key, generation, timeout=None):
+                generation = self.cache.get(self.generation_key, generation)
+        return f"throttle:{generation}"
+
+    def hit(self, key, limit, duration, now=None):
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        prefix = self.get_prefix()
+        current_key = f"{prefix}:{key}:{window}"
+        previous = self.cache.get(f"{prefix}:{key}:{window - 1}", 0)
+        # counted first, so racing requests cannot all see room for one more
+        if self.cache.add(current_key, 1, timeout=2 * duration + 1):
+            current = 1
+        else:
+            try:
+                current = self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, timeout=2 * duration + 1)
+                current = 1
+
+        if estimate(current, previous, now, duration) <= limit:
+            return True, 0
+        try:
+            current = self.cache.decr(current_key)
+        except ValueError:
+            current = 0
+        return False, wait_time(current, previous, limit, now, duration)
+
+    def reject(self, scope):
+        key = f"{self.get_prefix()}-rejected:{scope}"
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+    def rejections(self, scopes):
+        prefix = self.get_prefix()
+        keys = {scope: f"{prefix}-rejected:{scope}" for scope in scopes}
+        counts = self.cache.get_many(keys.values())
+        return {scope: counts.get(key, 0) for scope, key in keys.items()}
+
+    def clear(self):
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.cache.add(self.generation_key, time.time_ns(), timeout=None)
+
+
+class SharedRateThrottle(SimpleRateThrottle):
+    """
+	Limits anonymous requests per throttle_scope of the view, views without a
+	scope or without a rate of their scope use the anon rate
+
+	Counts live in the shared store of API_THROTTLE_STORE, so the limit holds
+	for all worker processes together. Every request costs one read and write
+	of the client's counters instead of rewriting its whole history.
+	"""
+
+    default_scope = "anon"
+
+    def __init__(self):
+        # the rate depends on the view, it is parsed in allow_request
+        self.wait_seconds = None
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(
+            self.scope, self.THROTTLE_RATES.get(self.default_scope)
+        )
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None  # only anonymous requests are throttled
+        return f"{self.scope}:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, "throttle_scope", None) or self.default_scope
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        store = get_throttle_store()
+        with timed("throttle"):
+            allowed, self.wait_seconds = store.hit(
+                key, self.num_requests, self.duration
+            )
+            if not allowed:
+                store.reject(self.scope)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -13,5 +13,29 @@ router.register("employees", views.EmployeeViewSet, basename="employee")
 router.register("companies", views.CompanyViewSet, basename="company")
 # urls for partnership View
 router.register("partnerships", views.PartnerShipView, basename="partnership")
+# urls for analytics of employees
+router.register("analytics", views.EmployeeAnalyticsViewSet, basename="analytics")
+# urls for queries over the graph of partnerships
+router.register("graph", views.PartnerGraphViewSet, basename="graph")
+# urls for the feed of changes of rows
+router.register("changes", views.ChangeFeedViewSet, basename="change")
 
-urlpatterns = router.urls
+# paginated and filterable lists of objects related to one company or profession
+nested_list = {"get": "list"}
+urlpatterns = router.urls + [
+    path(
+        "companies/<int:company_pk>/employees/",
+        views.EmployeeViewSet.as_view(nested_list, basename="employee"),
+        name="company-employees",
+    ),
+    path(
+        "companies/<int:company_pk>/partnerships/",
+        views.PartnerShipView.as_view(nested_list, basename="partnership"),
+        name="company-partnerships",
+    ),
+    path(
+        "professions/<int:profession_pk>/employees/",
+        views.EmployeeViewSet.as_view(nested_list, basename="employee"),
+        name="profession-employees",
+    ),
+]
@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.relations import HyperlinkedIdentityField, SlugRelatedField
+from rest_framework.response import Response
+from companies.instrumentation import timed
+
+# stands for pk while an url is reversed once per request
+PK_PLACEHOLDER = "__pk__"
+# fields which represent values read from database unchanged
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField)
+
+
+def url_template(field):
+    """
+	Return function which builds url of HyperlinkedIdentityField from pk
+	"""
+
+    url = field.to_representation(SimpleNamespace(pk=PK_PLACEHOLDER))
+    prefix, suffix = str(url).split(PK_PLACEHOLDER, 1)
+    return lambda pk: f"{prefix}{pk}{suffix}"
+
+
+def column_of(model, source_attrs):
+    """
+	Return name of the column which is the source of a field or None
+	"""
+
+    if len(source_attrs) != 1:
+        return None
+    for model_field in model._meta.concrete_fields:
+        if source_attrs[0] in (model_field.name, model_field.attname):
+            return source_attrs[0]
+    return None
+
+
+def get_columns(serializer, values_lookups=None):
+    """
+	Return (name, lookups, function) of every field of bound serializer, the
+	function turns values read with values() into representation of the field
+
+	values_lookups gives lookups of fields whose source is not a column, either
+	one lookup or a pair of lookups and a function taking their values. None is
+	returned when a field needs objects, like nested serializers and files.
+	"""
+
+    values_lookups = values_lookups or {}
+    model = serializer.Meta.model
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.FileField)):
+            return None
+
+        lookup = values_lookups.get(name)
+        convert = None if isinstance(field, PLAIN_FIELDS) else field.to_representation
+        if isinstance(lookup, tuple):
+            lookup, convert = tuple(lookup[0]), lookup[1]
+        elif lookup is None and isinstance(field, HyperlinkedIdentityField):
+            lookup, convert = field.lookup_field, url_template(field)
+        elif lookup is None and isinstance(field, SlugRelatedField):
+            lookup, convert = "__".join((*field.source_attrs, field.slug_field)), None
+        elif lookup is None:
+            lookup = column_of(model, field.source_attrs)
+
+        if lookup is None:
+            raise ImproperlyConfigured(
+                f"Add lookup of {serializer.__class__.__name__}.{name} "
+                "to values_lookups"
+            )
+        columns.append((name, lookup, convert))
+    return columns
+
+
+def represent_rows(rows, columns):
+    """
+	Build representations of rows read with values() as the serializer would
+	"""
+
+    results = []
+    with timed("serialize"):
+        for row in rows:
+            item = {}
+            for name, lookups, convert in columns:
+                if isinstance(lookups, tuple):
+                    item[name] = convert(*(row[lookup] for lookup in lookups))
+                    continue
+                value = row[lookups]
+                item[name] = (
+                    value if value is None or convert is None else convert(value)
+                )
+            results.append(item)
+    return results
+
+
+def values_lookups_of(columns):
+    lookups = []
+    for _, column_lookups, _ in columns:
+        if isinstance(column_lookups, tuple):
+            lookups.extend(column_lookups)
+        else:
+            lookups.append(column_lookups)
+    return lookups
+
+
+class ValuesListMixin:
+    """
+	Serves list from dictionaries of values() instead of model instances
+
+	Urls are formatted from one reversed template, related names are read by
+	joins and other fields go through to_representation only when it changes
+	the value, so the output equals the one of the list serializer.
+	"""
+
+    values_lookups = {}  # name of field: lookup(s) if its source is not a column
+
+    def get_values_queryset(self, queryset, columns):
+        """
+		Return values() of queryset with columns and fields used for ordering
+		"""
+
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            return None
+        # keyset pagination reads position of boundary rows by these names
+        ordering = [field.lstrip("-") for field in ordering if field != "?"]
+        lookups = dict.fromkeys((*values_lookups_of(columns), *ordering, "pk"))
+        return queryset.values(*lookups)
+
+    def list(self, request, *args, **kwargs):
+        columns = get_columns(self.get_serializer(), self.values_lookups)
+        if columns is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.get_values_queryset(queryset, columns)
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(represent_rows(page, columns))
+        return Response(represent_rows(rows, columns))
@@ -1,11 +1,46 @@
+from collections import defaultdict
 from rest_framework import viewsets, mixins, generics
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from companies.analytics import DEFAULT_PERCENTILES, summarize
+from companies.asyncviews import AsyncViewSetMixin
+from companies.bulk import EmployeeBulkLoader, read_rows
+from companies.cache import CachedResponseMixin
+from companies.changes import (
+    changes_after,
+    decode_cursor,
+    encode_cursor,
+    head_position,
+    latest_changes,
+    visible_changes,
+)
+from companies.conditional import ConditionalGetMixin
+from companies.embed import NestedViewSetMixin
+from companies.export import ExportMixin
+from companies.graph import snapshot as graph_snapshot
+from companies.instrumentation import metrics as request_metrics
+from companies.replicas import ReplicaReadMixin
+from companies.search import FullTextSearchFilter
+from companies.sparse import SparseQuerysetMixin
+from companies.values import ValuesListMixin
 from companies.customfilters import (
     ProfessionFilter,
     EmployeeFilter,
     CompanyFilter,
     PartnerShipFilter,
 )
-from companies.models import Profession, Employee, Company, PartnerShip
+from companies.models import (
+    Profession,
+    Employee,
+    Company,
+    PartnerShip,
+    EmployeeSummary,
+    Change,
+)
 from companies.serializers import (
     ProfessionSerializer,
     DetailProfessionSerializer,
@@ -18,16 +53,28 @@ from companies.serializers import (
 )
 
 
-class ProfessionViewSet(viewsets.ModelViewSet):
+class ProfessionViewSet(
+    AsyncViewSetMixin,
+    ReplicaReadMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     """
 	ViewSet for profession model
 	"""
 
+    throttle_scope = "professions"
     queryset = Profession.objects.all()
 
     filter_class = ProfessionFilter
     search_fields = ("^name",)
     ordering_fields = ("name",)
+    embed_change_fields = {
+        "employees": ("employees__updated_at", "employees__company__updated_at"),
+    }
 
     def get_serializer_class(self):
         if hasattr(self, "action") and self.action == "list":
@@ -36,12 +83,28 @@ class ProfessionViewSet(viewsets.ModelViewSet):
         return DetailProfessionSerializer
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(
+    AsyncViewSetMixin,
+    ReplicaReadMixin,
+    NestedViewSetMixin,
+    ExportMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     """
 	ViewSet for employee model
 	"""
 
+    throttle_scope = "employees"
     queryset = Employee.objects.all()
+    # list is also routed under companies and professions
+    parent_lookups = {
+        "company_pk": (Company, "company"),
+        "profession_pk": (Profession, "profession"),
+    }
 
     filter_class = EmployeeFilter
     search_fields = ("^name",)
@@ -54,6 +117,30 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         "hired_date",
         "promotion_date",
     )
+    export_fields = (
+        ("name", "name"),
+        ("age", "age"),
+        ("gender", "gender"),
+        ("profession", "profession__name"),
+        ("company", "company__name"),
+        ("salary", "salary"),
+        ("hired_date", "hired_date"),
+        ("promotion_date", "promotion_date"),
+        ("phone_number", "phone_number"),
+        ("email", "email"),
+    )
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+		Create or update employees from a streamed NDJSON or CSV upload
+
+		Rows are matched to existing employees by name, company and profession
+		are given by name. Errors are reported per row number.
+		"""
+
+        result = EmployeeBulkLoader().load(read_rows(request))
+        return Response(result)
 
     def get_serializer_class(self):
         if hasattr(self, "action") and self.action == "list":
@@ -62,16 +149,50 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return DetailEmployeeSerializer
 
 
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(
+    AsyncViewSetMixin,
+    ReplicaReadMixin,
+    ExportMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     """
 	ViewSet for company model
 	"""
 
+    throttle_scope = "companies"
     queryset = Company.objects.all()
 
     filter_class = CompanyFilter
+    # ?text= searches tagline, description and joint products of partnerships
+    filter_backends = (*api_settings.DEFAULT_FILTER_BACKENDS, FullTextSearchFilter)
     search_fields = ("^name", "^type_of_company", "^country")
     ordering_fields = ("name", "year_of_foundation")
+    # updated_at of company is touched by changes of its counters and of
+    # partnerships it has invited
+    embed_change_fields = {
+        "employees": ("employees__updated_at", "employees__profession__updated_at"),
+        "partnerships": ("partnerships__company__updated_at",),
+    }
+    export_fields = (
+        ("name", "name"),
+        ("tagline", "tagline"),
+        ("type_of_company", "type_of_company"),
+        ("description", "description"),
+        ("year_of_foundation", "year_of_foundation"),
+        ("country", "country"),
+        ("phone_number", "phone_number"),
+        ("email", "email"),
+        ("number_of_employees", "employees_count"),
+        ("number_of_partners", "partners_count"),
+    )
+    values_lookups = {
+        "number_of_employees": "employees_count",
+        "number_of_partners": "partners_count",
+    }
 
     def get_serializer_class(self):
         if hasattr(self, "action") and self.action == "list":
@@ -81,20 +202,393 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
 
 class PartnerShipView(
+    AsyncViewSetMixin,
+    ReplicaReadMixin,
+    NestedViewSetMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     viewsets.GenericViewSet,
 ):
 
+    throttle_scope = "partnerships"
     queryset = PartnerShip.objects.all()
+    # list is also routed under companies which have invited the partnerships
+    parent_lookups = {"company_pk": (Company, "company_inviter")}
+    values_lookups = {
+        "info": (("company_inviter__name", "company__name"), PartnerShip.describe)
+    }
 
     filter_class = PartnerShipFilter
     search_fields = ("^company_inviter__name", "^joint_products")
     ordering_fields = ("year_partnership",)
+    detail_change_fields = (
+        "updated_at",
+        "company__updated_at",
+        "company_inviter__updated_at",
+    )
 
     def get_serializer_class(self):
         if hasattr(self, "action") and self.action == "list":
             return PartnerShipSerializer
 
         return DetailPartnerShipSerializer
+
+
+class EmployeeAnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+	ViewSet for salary, headcount and age analytics of employees
+
+	Groups are read from summary tables maintained on every write of employees,
+	so a response costs one row per group whatever the number of employees.
+	"""
+
+    throttle_scope = "analytics"
+    group_by_query_param = "group_by"
+    percentiles_query_param = "percentiles"
+
+    def get_dimension(self, request):
+        dimension = request.query_params.get(
+            self.group_by_query_param, EmployeeSummary.ALL
+        )
+        dimensions = [choice for choice, _ in EmployeeSummary.DIMENSION_CHOICES]
+        if dimension not in dimensions:
+            raise ValidationError(
+                {
+                    self.group_by_query_param: [
+                        f"Choose one of: {', '.join(dimensions)}."
+                    ]
+                }
+            )
+        return dimension
+
+    def get_percentiles(self, request):
+        value = request.query_params.get(self.percentiles_query_param)
+        if not value:
+            return DEFAULT_PERCENTILES
+        try:
+            percentiles = [float(percent) for percent in value.split(",")]
+        except ValueError:
+            percentiles = [-1]
+        if not all(0 <= percent <= 100 for percent in percentiles):
+            raise ValidationError(
+                {
+                    self.percentiles_query_param: [
+                        "Give comma separated numbers from 0 to 100."
+                    ]
+                }
+            )
+        return percentiles
+
+    def list(self, request):
+        dimension = self.get_dimension(request)
+        results = summarize(dimension, self.get_percentiles(request))
+        return Response({"group_by": dimension, "results": results})
+
+
+class PartnerGraphViewSet(viewsets.ViewSet):
+    """
+	ViewSet for multi-hop queries over the graph of partnerships
+
+	Queries run on an in-memory adjacency snapshot which partnership writes
+	update in place, only names of companies in a response are read.
+	"""
+
+    throttle_scope = "graph"
+    max_hops = 4  # for neighbourhoods, which grow fast with hops
+    max_path_hops = 10
+    max_limit = 1000
+
+    def get_int_param(self, request, name, default=None, minimum=1, maximum=None):
+        value = request.query_params.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = None
+        if value is None or value < minimum or (maximum and value > maximum):
+            bounds = f"from {minimum} to {maximum}" if maximum else f"from {minimum}"
+            raise ValidationError({name: [f"Give a whole number {bounds}."]})
+        return value
+
+    def represent_companies(self, request, pks):
+        """
+		Return {pk: company} for pks with names read in one query
+		"""
+
+        names = dict(Company.objects.filter(pk__in=pks).values_list("pk", "name"))
+        return {
+            pk: {
+                "id": pk,
+                "name": names.get(pk),
+                "url": reverse(
+                    "companies:company-detail", kwargs={"pk": pk}, request=request
+                ),
+            }
+            for pk in pks
+        }
+
+    @staticmethod
+    def get_company(companies, pk):
+        """
+		Return the represented company or raise NotFound, graphs have no nodes
+		of companies without partners, so unknown ids are found by names
+		"""
+
+        if companies[pk]["name"] is None:
+            raise NotFound(f"No company with id {pk}.")
+        return companies[pk]
+
+    def list(self, request):
+        with graph_snapshot.locked() as graph:
+            components = graph.components()
+            return Response(
+                {
+                    "companies": sum(len(members) for members in components.values()),
+                    "partnerships": graph.edge_count,
+                    "components": len(components),
+                }
+            )
+
+    @action(detail=False)
+    def neighbours(self, request):
+        company = self.get_int_param(request, "company")
+        hops = self.get_int_param(request, "hops", 1, maximum=self.max_hops)
+        limit = self.get_int_param(request, "limit", 100, maximum=self.max_limit)
+        with graph_snapshot.locked() as graph:
+            distances = graph.neighbourhood(company, hops, limit)
+
+        companies = self.represent_companies(request, [company, *distances])
+        return Response(
+            {
+                "company": self.get_company(companies, company),
+                "results": [
+                    {**companies[pk], "hops": distance}
+                    for pk, distance in distances.items()
+                ],
+            }
+        )
+
+    @action(detail=False)
+    def path(self, request):
+        source = self.get_int_param(request, "source")
+        target = self.get_int_param(request, "target")
+        max_hops = self.get_int_param(
+            request, "max_hops", 6, maximum=self.max_path_hops
+        )
+        with graph_snapshot.locked() as graph:
+            path = graph.shortest_path(source, target, max_hops)
+        if path is None:
+            raise NotFound(f"No partnership path within {max_hops} hops.")
+
+        companies = self.represent_companies(request, path)
+        # a path of one company is found without the graph
+        self.get_company(companies, source)
+        return Response(
+            {"hops": len(path) - 1, "results": [companies[pk] for pk in path]}
+        )
+
+    @action(detail=False)
+    def components(self, request):
+        limit = self.get_int_param(request, "limit", 10, maximum=self.max_limit)
+        sample = self.get_int_param(request, "sample", 5, minimum=0, maximum=100)
+        with graph_snapshot.locked() as graph:
+            largest = sorted(
+                graph.components().values(),
+                key=lambda members: (-len(members), members[0]),
+            )[:limit]
+
+        companies = self.represent_companies(
+            request, [pk for members in largest for pk in members[:sample]]
+        )
+        return Response(
+            {
+                "results": [
+                    {
+                        "size": len(members),
+                        "companies": [companies[pk] for pk in members[:sample]],
+                    }
+                    for members in largest
+                ]
+            }
+        )
+
+    @action(detail=False)
+    def degrees(self, request):
+        limit = self.get_int_param(request, "limit", 10, maximum=100)
+        with graph_snapshot.locked() as graph:
+            ranking = graph.degree_ranking(limit)
+
+        companies = self.represent_companies(request, [pk for pk, _ in ranking])
+        return Response(
+            {
+                "results": [
+                    {**companies[pk], "partners": degree} for pk, degree in ranking
+                ]
+            }
+        )
+
+
+class ChangeFeedViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+	ViewSet for the feed of creates, updates and deletes of professions,
+	companies, employees and partnerships
+
+	A client takes the head cursor, downloads the lists once and then asks for
+	changes after the cursor of its last page. A page holds the latest of its
+	changes of each row with the current detail representation, or a tombstone
+	for a deleted row, so a sync costs as much as what has changed.
+	"""
+
+    throttle_scope = "changes"
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    models_query_param = "models"
+    default_limit = 100
+    max_limit = 1000
+    # label of Change.model: serializer of its rows
+    serializer_classes = {
+        "profession": DetailProfessionSerializer,
+        "company": DetailCompanySerializer,
+        "employee": DetailEmployeeSerializer,
+        "partnership": DetailPartnerShipSerializer,
+    }
+
+    def get_position(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            raise ValidationError(
+                {self.cursor_query_param: ["Give the cursor of the feed head."]}
+            )
+        try:
+            return decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError(
+                {self.cursor_query_param: ["Give a cursor returned by the feed."]}
+            )
+
+    def get_limit(self, request):
+        value = request.query_params.get(self.limit_query_param, self.default_limit)
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            limit = 0
+        if not 1 <= limit <= self.max_limit:
+            raise ValidationError(
+                {
+                    self.limit_query_param: [
+                        f"Give a whole number from 1 to {self.max_limit}."
+                    ]
+                }
+            )
+        return limit
+
+    def get_models(self, request):
+        value = request.query_params.get(self.models_query_param)
+        if not value:
+            return None
+        models = {label.strip() for label in value.split(",") if label.strip()}
+        if not models <= self.serializer_classes.keys():
+            raise ValidationError(
+                {
+                    self.models_query_param: [
+                        f"Choose from: {', '.join(self.serializer_classes)}."
+                    ]
+                }
+            )
+        return models
+
+    def represent_rows(self, request, changes):
+        """
+		Return {(label, pk): representation} of rows of changes which are not
+		deletes, read with one query and serialized at once per model
+		"""
+
+        pks = defaultdict(set)
+        for change in changes:
+            if change.action != Change.DELETE:
+                pks[change.model].add(change.object_id)
+
+        # ?fields= and ?embed= of the request are not for the representations
+        context = {"request": request, "embedded": True}
+        representations = {}
+        for label, ids in pks.items():
+            serializer_class = self.serializer_classes[label]
+            rows = list(
+                serializer_class.Meta.model._default_manager.filter(
+                    pk__in=ids
+                ).select_related(*serializer_class.get_select_related(request))
+            )
+            data = serializer_class(rows, many=True, context=context).data
+            representations.update(
+                ((label, row.pk), item) for row, item in zip(rows, data)
+            )
+        return representations
+
+    def represent_changes(self, request, changes):
+        representations = self.represent_rows(request, changes)
+        results = []
+        for change in changes:
+            data = representations.get((change.model, change.object_id))
+            if change.action != Change.DELETE and data is None:
+                continue  # deleted since, its tombstone comes later
+            url = None
+            if data is not None:
+                url = reverse(
+                    f"companies:{change.model}-detail",
+                    kwargs={"pk": change.object_id},
+                    request=request,
+                )
+            results.append(
+                {
+                    "cursor": encode_cursor((change.txid, change.id)),
+                    "model": change.model,
+                    "id": change.object_id,
+                    "action": change.action,
+                    "changed_at": change.changed_at,
+                    "url": url,
+                    "data": data,
+                }
+            )
+        return results
+
+    def list(self, request):
+        position = self.get_position(request)
+        limit = self.get_limit(request)
+        models = self.get_models(request)
+
+        changes = visible_changes()
+        if models is not None:
+            changes = changes.filter(model__in=models)
+        # one extra change tells whether there is something behind this page
+        page = list(changes_after(position, changes)[: limit + 1])
+        more = len(page) > limit
+        page = page[:limit]
+        if page:
+            position = (page[-1].txid, page[-1].id)
+
+        return Response(
+            {
+                "cursor": encode_cursor(position),
+                "more": more,
+                "results": self.represent_changes(request, latest_changes(page)),
+            }
+        )
+
+    @action(detail=False)
+    def head(self, request):
+        return Response({"cursor": encode_cursor(head_position())})
+
+
+class RouteMetricsView(generics.GenericAPIView):
+    """
+	Per-route histograms of request metrics collected by this process, for staff
+	"""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(request_metrics.snapshot())
@@ -0,0 +1,24 @@
+"""crm URL Configuration of the ASGI entry point
+
+Same routes as crm.urls, list and retrieve of the API are served by async views.
+"""
+
+from django.contrib import admin
+from django.urls import path, include
+from companies import urls as companies_urls
+from companies.asyncviews import asynchronous_patterns
+
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    # url to api with companies
+    path(
+        "api/v1/",
+        include(
+            (
+                asynchronous_patterns(companies_urls.urlpatterns),
+                companies_urls.app_name,
+            ),
+            namespace="companies",
+        ),
+    ),
+]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -47,18 +48,82 @@ INSTALLED_APPS = [
 ]
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "companies.custompagination.LimitOffSetPaginationWithUpperBound",
+    "DEFAULT_PAGINATION_CLASS": "companies.custompagination.LimitOffSetOrKeysetPagination",
     "PAGE_SIZE": 5,
+    # JSON encoded with orjson when it is installed, same bytes as JSONRenderer
+    "DEFAULT_RENDERER_CLASSES": (
+        "companies.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "companies.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.OrderingFilter",
         "rest_framework.filters.SearchFilter",
     ),
-    "DEFAULT_THROTTLE_CLASSES": ("rest_framework.throttling.AnonRateThrottle",),
-    "DEFAULT_THROTTLE_RATES": {"anon": "8/minute"},
+    "DEFAULT_THROTTLE_CLASSES": ("companies.throttling.SharedRateThrottle",),
+    # anonymous requests per throttle_scope of a viewset, anon for the others
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "8/minute",
+        "professions": "8/minute",
+        "employees": "8/minute",
+        "companies": "8/minute",
+        "partnerships": "8/minute",
+        "analytics": "30/minute",
+        "graph": "30/minute",
+        "changes": "30/minute",
+    },
+}
+# application/msgpack is negotiated when msgpack is installed
+if find_spec("msgpack") is not None:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] += (
+        "companies.renderers.MessagePackRenderer",
+    )
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] += (
+        "companies.renderers.MessagePackParser",
+    )
+
+# counters of throttled requests shared by worker processes of a host, use
+# companies.throttling.CacheThrottleStore with a shared cache for many hosts
+API_THROTTLE_STORE = {
+    "BACKEND": "companies.throttling.SQLiteThrottleStore",
+    "OPTIONS": {"path": BASE_DIR / "throttle.sqlite3"},
+}
+
+# per-request timings of companies.instrumentation.PerformanceMiddleware
+PERFORMANCE_INSTRUMENTATION = {
+    "SLOW_REQUEST_MS": 500,  # requests which are logged with slowest queries
+    "SLOW_QUERIES": 5,
+    "MAX_ROUTES": 200,  # of the per-process histograms
 }
 
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # responses of the API, use a shared backend when running several workers,
+    # otherwise writes invalidate responses and the version of the partner
+    # graph only in their own process
+    "api": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "api-responses",
+        "TIMEOUT": 300,
+        # locmem keeps entries in LRU order, so every cull drops exactly one
+        # least recently used response
+        "OPTIONS": {"MAX_ENTRIES": 1000, "CULL_FREQUENCY": 1000},
+    },
+}
+API_CACHE_ALIAS = "api"
+API_CACHE_TIMEOUT = 300
+# seconds after which the partner graph of a process is read again, it follows
+# writes of other processes through the version in the "api" cache only when
+# that cache is shared
+PARTNER_GRAPH_MAX_AGE = 60
+
 MIDDLEWARE = [
+    "companies.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -103,6 +168,17 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = ["companies.replicas.ReplicaRouter"]
+
+# safe requests of the companies API read from these aliases of DATABASES,
+# e.g. {"replica": 1}, and clients read from default for STICKY_SECONDS after
+# a write, STICKY_SECONDS should exceed the replication lag
+READ_REPLICAS = {
+    "ALIASES": {},  # alias: weight
+    "STICKY_SECONDS": 5,
+    "CACHE": "default",  # shared by workers with a shared cache backend
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -138,5 +214,7 @@ STATIC_URL = "/static/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# processes rendering thumbnails of logos and photos, 0 renders in the request
+RENDITION_WORKERS = 2
 
 DATETIME_FORMAT = "%H:%m %d-%m-%Y"  # my convinient format for DateTimeField
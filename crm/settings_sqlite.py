@@ -0,0 +1,26 @@
+"""
+Settings of crm project without a database server, e.g. for
+
+    python manage.py check_budgets --settings crm.settings_sqlite
+"""
+
+from crm.settings import *  # noqa: F401,F403
+from crm.settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+    },
+    # stand-ins for replicas, tests give each alias its own database, so rows
+    # written on default are not replicated, e.g. copies of db.sqlite3 with
+    # READ_REPLICAS = {"ALIASES": {"replica_1": 3, "replica_2": 1}}
+    "replica_1": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.replica_1.sqlite3",
+    },
+    "replica_2": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.replica_2.sqlite3",
+    },
+}
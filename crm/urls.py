@@ -15,9 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from companies.views import RouteMetricsView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # per-route request metrics of this process, for staff only
+    path("api/v1/metrics/", RouteMetricsView.as_view(), name="route-metrics"),
     # url to api with companies
     path("api/v1/", include("companies.urls", namespace="companies")),
 ]